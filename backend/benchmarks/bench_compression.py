@@ -0,0 +1,73 @@
+"""
+Message compression benchmark: storage saved and read-latency cost per codec
+Run (from backend/): python -m benchmarks.bench_compression
+"""
+import os
+import json
+import time
+import statistics
+
+from utilities.compression_utils import (
+    compress_bytes, decompress_bytes, zstandard,
+    CODEC_ZLIB, CODEC_ZSTD, MESSAGE_COMPRESSION_MIN_BYTES
+)
+
+INSTRUCTIONS_DIR = "instructions"
+SHARED_CHATS_FILE = "shared_chats.json"
+ROUNDS = 200
+
+def load_corpus():
+    """Long prose bodies: persona instructions plus real assistant replies"""
+    bodies = []
+    for filename in sorted(os.listdir(INSTRUCTIONS_DIR)):
+        if filename.endswith('.txt'):
+            with open(os.path.join(INSTRUCTIONS_DIR, filename), 'r', encoding='utf-8') as f:
+                bodies.append(f.read())
+
+    if os.path.exists(SHARED_CHATS_FILE):
+        with open(SHARED_CHATS_FILE, 'r', encoding='utf-8') as f:
+            chats = json.load(f)
+        replies = [m['content'] for c in chats.values() for m in c['messages'] if m['role'] == 'assistant']
+        # Stitch short replies into novel-length turns
+        bodies.append("\n\n".join(replies))
+
+    return [b.encode('utf-8') for b in bodies if len(b.encode('utf-8')) >= MESSAGE_COMPRESSION_MIN_BYTES]
+
+def bench_codec(codec, corpus):
+    raw_total = sum(len(b) for b in corpus)
+    blobs = [compress_bytes(b, codec) for b in corpus]
+    stored_total = sum(len(b) for b in blobs)
+
+    encode_times = []
+    decode_times = []
+    for _ in range(ROUNDS):
+        for raw, blob in zip(corpus, blobs):
+            start = time.perf_counter()
+            compress_bytes(raw, codec)
+            encode_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            decompress_bytes(blob, codec)
+            decode_times.append(time.perf_counter() - start)
+
+    return {
+        "codec": codec,
+        "raw_bytes": raw_total,
+        "stored_bytes": stored_total,
+        "saved_pct": round(100 * (1 - stored_total / raw_total), 1),
+        "encode_us_median": round(statistics.median(encode_times) * 1e6, 1),
+        "decode_us_median": round(statistics.median(decode_times) * 1e6, 1),
+        "decode_us_p95": round(statistics.quantiles(decode_times, n=20)[18] * 1e6, 1),
+    }
+
+def main():
+    corpus = load_corpus()
+    print(f"📦 Corpus: {len(corpus)} bodies >= {MESSAGE_COMPRESSION_MIN_BYTES} bytes")
+
+    codecs = [CODEC_ZLIB] + ([CODEC_ZSTD] if zstandard is not None else [])
+    for codec in codecs:
+        result = bench_codec(codec, corpus)
+        print(json.dumps(result))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Response serialization benchmark: time to turn a conversation transcript into
+response bytes, and the bytes on the wire with and without gzip.
+  before - jsonable_encoder + stdlib json (FastAPI's default path)
+  encoder - jsonable_encoder + orjson (default_response_class alone)
+  direct - orjson straight from the rows (fast_json, used by the transcript endpoints)
+Run (from backend/): python -m benchmarks.bench_responses --messages 500
+"""
+import os
+import gzip
+import json
+import time
+import random
+import argparse
+import statistics
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from utilities.http_utils import dumps, orjson, RESPONSE_GZIP_LEVEL
+
+SHARED_CHATS_FILE = "shared_chats.json"
+ROUNDS = 50
+
+def load_replies():
+    """Real message bodies to build transcripts from"""
+    replies = []
+    if os.path.exists(SHARED_CHATS_FILE):
+        with open(SHARED_CHATS_FILE, 'r', encoding='utf-8') as f:
+            chats = json.load(f)
+        replies = [m['content'] for c in chats.values() for m in c['messages'] if m.get('content')]
+    return replies or ["Hello there! " * 40]
+
+def build_transcript(message_count, replies):
+    """A conversation row plus messages shaped like DictCursor rows"""
+    start = datetime(2025, 1, 1, 12, 0, 0)
+    conversation = {
+        'id': 'bench-conversation', 'user_id': 'bench-user', 'persona_name': 'Kira',
+        'title': 'Benchmark transcript', 'model': 'qwen/qwen3-32b', 'is_pinned': 0,
+        'encrypted': 0, 'archived': 0, 'summary': None, 'memory_watermark': 0,
+        'message_count': message_count, 'deleted_at': None,
+        'created_at': start, 'updated_at': start + timedelta(minutes=message_count),
+    }
+    conversation['messages'] = [
+        {
+            'id': f'message-{i}', 'conversation_id': 'bench-conversation',
+            'role': 'user' if i % 2 == 0 else 'assistant', 'content': random.choice(replies),
+            'encrypted': 0, 'created_at': start + timedelta(seconds=30 * i),
+        }
+        for i in range(message_count)
+    ]
+    return conversation
+
+def timed(render, payload):
+    timings = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        body = render(payload)
+        timings.append(time.perf_counter() - start)
+    return body, {
+        "median_ms": round(statistics.median(timings) * 1000, 3),
+        "p95_ms": round(statistics.quantiles(timings, n=20)[18] * 1000, 3),
+    }
+
+def main(args):
+    random.seed(7)
+    payload = build_transcript(args.messages, load_replies())
+    print(f"📦 {args.messages} messages, orjson {'installed' if orjson else 'missing, stdlib fallback'}")
+
+    stdlib = JSONResponse(None)
+    results = {}
+    for name, render in (
+        ("before", lambda p: stdlib.render(jsonable_encoder(p))),
+        ("encoder", lambda p: dumps(jsonable_encoder(p))),
+        ("direct", dumps),
+    ):
+        body, stats = timed(render, payload)
+        results[name] = dict(stats, bytes=len(body))
+
+    body = dumps(payload)
+    compressed, stats = timed(lambda b: gzip.compress(b, RESPONSE_GZIP_LEVEL), body)
+    results["gzip"] = dict(stats, bytes=len(compressed), ratio=round(len(body) / len(compressed), 2))
+    results["speedup"] = round(results["before"]["median_ms"] / results["direct"]["median_ms"], 1)
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=500)
+    main(parser.parse_args())
@@ -0,0 +1,114 @@
+"""
+Full-text search latency benchmark
+Seeds a throwaway user with --messages messages, runs random queries through
+search_user_messages and reports p50/p95. Target: p95 < 100 ms at 100k messages.
+Runs against whichever backend STORAGE_BACKEND selects; so far the target has
+only been measured on SQLite, MySQL FULLTEXT numbers are still to be taken.
+Compressed and archived bodies are not indexed, so seed with
+MESSAGE_COMPRESSION=none or the timings cover only part of the messages.
+Run (from backend/): python -m benchmarks.bench_search --messages 100000
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from utilities import storage
+from utilities.compression_utils import MESSAGE_COMPRESSION
+from utilities.maintenance_utils import purge_conversation, purge_user
+
+BENCH_USER_ID = "bench-search-user"
+INSTRUCTIONS_DIR = "instructions"
+MESSAGES_PER_CONVERSATION = 200
+# Messages written concurrently while seeding
+INSERT_CONCURRENCY = 50
+
+def load_vocabulary():
+    words = []
+    for filename in os.listdir(INSTRUCTIONS_DIR):
+        if filename.endswith('.txt'):
+            with open(os.path.join(INSTRUCTIONS_DIR, filename), 'r', encoding='utf-8') as f:
+                words.extend(w.strip('.,!?*"():').lower() for w in f.read().split())
+    return [w for w in words if len(w) >= 3 and w.isalpha()]
+
+async def cleanup():
+    await storage.mark_user_deleted(BENCH_USER_ID)
+    while True:
+        conversation_ids = await storage.get_deleted_conversation_ids(1000)
+        if not conversation_ids:
+            break
+        for conversation_id in conversation_ids:
+            await purge_conversation(conversation_id)
+    for user_id in await storage.get_purgeable_user_ids(10):
+        await purge_user(user_id)
+
+async def seed(message_count, vocabulary):
+    await cleanup()
+    await storage.create_user(BENCH_USER_ID, "bench-search@example.com", "Search Bench")
+
+    pending = []
+    conversation_id = None
+    for i in range(message_count):
+        if i % MESSAGES_PER_CONVERSATION == 0:
+            title = " ".join(random.choices(vocabulary, k=4))
+            conversation_id = await storage.create_conversation(BENCH_USER_ID, "Kriyan", title, "qwen/qwen3-32b")
+        content = " ".join(random.choices(vocabulary, k=random.randint(10, 120)))
+        pending.append(storage.add_message(conversation_id, random.choice(['user', 'assistant']), content))
+        if len(pending) >= INSERT_CONCURRENCY:
+            await asyncio.gather(*pending)
+            pending = []
+    if pending:
+        await asyncio.gather(*pending)
+
+async def run(args):
+    await storage.init_db_pool()
+    vocabulary = load_vocabulary()
+    if MESSAGE_COMPRESSION != 'none':
+        print(f"⚠️ MESSAGE_COMPRESSION={MESSAGE_COMPRESSION}: compressed bodies are not searchable, "
+              "only the short messages are indexed")
+    try:
+        if not args.skip_seed:
+            start = time.perf_counter()
+            await seed(args.messages, vocabulary)
+            print(f"🌱 Seeded {args.messages} messages in {time.perf_counter() - start:.1f}s")
+
+        # Warm up the buffer pool before timing
+        for _ in range(10):
+            await storage.search_user_messages(BENCH_USER_ID, random.choice(vocabulary), 20, 0)
+
+        timings = []
+        for _ in range(args.queries):
+            query = " ".join(random.choices(vocabulary, k=random.randint(1, 3)))
+            start = time.perf_counter()
+            await storage.search_user_messages(BENCH_USER_ID, query, 21, 0)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        quantiles = statistics.quantiles(timings, n=100)
+        print(json.dumps({
+            "backend": storage.STORAGE_BACKEND,
+            "message_compression": MESSAGE_COMPRESSION,
+            "messages": args.messages,
+            "queries": args.queries,
+            "p50_ms": round(quantiles[49], 2),
+            "p95_ms": round(quantiles[94], 2),
+            "p99_ms": round(quantiles[98], 2),
+        }))
+    finally:
+        if not args.keep:
+            await cleanup()
+        await storage.close_db_pool()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--skip-seed", action="store_true", help="reuse data from a --keep run")
+    parser.add_argument("--keep", action="store_true", help="keep the seeded user afterwards")
+    asyncio.run(run(parser.parse_args()))
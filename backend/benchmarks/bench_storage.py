@@ -0,0 +1,106 @@
+"""
+Storage backend benchmark: latency of the hot db functions
+Runs against whichever backend STORAGE_BACKEND selects, so the numbers for
+MySQL and SQLite are directly comparable.
+Run (from backend/):
+  STORAGE_BACKEND=mysql  python -m benchmarks.bench_storage
+  STORAGE_BACKEND=sqlite SQLITE_PATH=/tmp/bench.db python -m benchmarks.bench_storage
+"""
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from utilities import storage
+from utilities.maintenance_utils import purge_conversation, purge_user
+
+BENCH_USER_ID = "bench-storage-user"
+SHORT_REPLY = "Hey, what's up?"
+LONG_REPLY = ("<em>She leaned back, studying you for a long moment</em>\n\n" + "Well, that's one way to put it. " * 60)
+
+async def timed(results, name, coro):
+    start = time.perf_counter()
+    value = await coro
+    results.setdefault(name, []).append((time.perf_counter() - start) * 1000)
+    return value
+
+def summarize(timings):
+    ordered = sorted(timings)
+    return {
+        "count": len(ordered),
+        "p50_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(ordered[int(len(ordered) * 0.95) - 1], 3),
+        "ops_per_s": round(1000 * len(ordered) / sum(ordered), 1),
+    }
+
+async def cleanup():
+    await storage.mark_user_deleted(BENCH_USER_ID)
+    for conversation_id in await storage.get_deleted_conversation_ids(10_000):
+        await purge_conversation(conversation_id)
+    for user_id in await storage.get_purgeable_user_ids(10):
+        await purge_user(user_id)
+
+async def run(args):
+    await storage.init_db_pool()
+    results = {}
+    try:
+        await cleanup()
+        await storage.create_user(BENCH_USER_ID, "bench-storage@example.com", "Storage Bench")
+
+        conversation_ids = []
+        for i in range(args.conversations):
+            conversation_ids.append(await timed(
+                results, "create_conversation",
+                storage.create_conversation(BENCH_USER_ID, "Kriyan", f"Bench chat {i}", "qwen/qwen3-32b")
+            ))
+
+        for conversation_id in conversation_ids:
+            for turn in range(args.turns):
+                await timed(results, "add_message", storage.add_message(conversation_id, "user", SHORT_REPLY))
+                await timed(results, "add_message_long", storage.add_message(conversation_id, "assistant", LONG_REPLY))
+
+        for _ in range(args.reads):
+            for conversation_id in conversation_ids:
+                await timed(results, "get_conversation", storage.get_conversation(conversation_id))
+                await timed(results, "get_conversation_messages", storage.get_conversation_messages(conversation_id))
+            await timed(results, "get_user_conversations", storage.get_user_conversations(BENCH_USER_ID))
+
+        for i in range(args.memories):
+            await timed(results, "create_memory", storage.create_memory(BENCH_USER_ID, f"User fact number {i}"))
+        for _ in range(args.reads):
+            await timed(results, "get_user_memories", storage.get_user_memories(BENCH_USER_ID))
+            await timed(results, "get_user_settings", storage.get_user_settings(BENCH_USER_ID))
+
+        # Concurrent readers, the pattern the API actually produces
+        start = time.perf_counter()
+        await asyncio.gather(*[
+            storage.get_conversation_messages(conversation_id)
+            for _ in range(args.reads)
+            for conversation_id in conversation_ids
+        ])
+        concurrent_ms = (time.perf_counter() - start) * 1000
+
+        print(json.dumps({
+            "backend": storage.STORAGE_BACKEND,
+            "operations": {name: summarize(timings) for name, timings in results.items()},
+            "concurrent_reads": {
+                "count": args.reads * len(conversation_ids),
+                "total_ms": round(concurrent_ms, 1),
+            },
+        }, indent=2))
+    finally:
+        await cleanup()
+        await storage.close_db_pool()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--conversations", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--reads", type=int, default=20)
+    parser.add_argument("--memories", type=int, default=200)
+    asyncio.run(run(parser.parse_args()))
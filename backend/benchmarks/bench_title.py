@@ -0,0 +1,81 @@
+"""
+Conversation title benchmark: latency and quality of the local extractive titler,
+optionally against the model, on the labelled conversations in fixtures/titles.json.
+Quality is the word-overlap F1 (stemmed content words) with the reference title.
+Run (from backend/): python -m benchmarks.bench_title [--llm]
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from utilities.title_utils import extractive_title, TITLE_MIN_SCORE
+from utilities.minhash_utils import shingles
+
+FIXTURES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "titles.json")
+ROUNDS = 200
+
+def word_f1(title: str, reference: str) -> float:
+    predicted, expected = shingles(title), shingles(reference)
+    overlap = len(predicted & expected)
+    if not overlap:
+        return 0.0
+    precision = overlap / len(predicted)
+    recall = overlap / len(expected)
+    return 2 * precision * recall / (precision + recall)
+
+def summarize(name, timings, scores, extra=None):
+    result = {
+        "titler": name,
+        "conversations": len(scores),
+        "median_us": round(statistics.median(timings) * 1e6, 1),
+        "p95_us": round(statistics.quantiles(timings, n=20)[18] * 1e6, 1),
+        "mean_f1": round(statistics.mean(scores), 3),
+    }
+    result.update(extra or {})
+    print(json.dumps(result))
+
+def bench_extractive(fixtures):
+    timings, scores, fallbacks = [], [], 0
+    for case in fixtures:
+        for _ in range(ROUNDS):
+            start = time.perf_counter()
+            title, score = extractive_title(case["messages"])
+            timings.append(time.perf_counter() - start)
+        scores.append(word_f1(title, case["title"]))
+        if score < TITLE_MIN_SCORE:
+            fallbacks += 1
+        print(f"  {score:6.2f}  {title!r:40} ref={case['title']!r}")
+    summarize("extractive", timings, scores, {"model_fallback_share": round(fallbacks / len(fixtures), 3)})
+
+async def bench_llm(fixtures):
+    # Imported lazily: main builds the app and provider clients on import
+    from main import generate_title, TitleRequest
+
+    timings, scores = [], []
+    for case in fixtures:
+        start = time.perf_counter()
+        response = await generate_title(TitleRequest(messages=case["messages"], quality=True))
+        timings.append(time.perf_counter() - start)
+        scores.append(word_f1(response.title, case["title"]))
+        print(f"  {response.title!r:40} ref={case['title']!r}")
+    summarize("model", timings, scores)
+
+def main(args):
+    with open(FIXTURES_FILE, "r", encoding="utf-8") as f:
+        fixtures = json.load(f)
+    print(f"🏷️ {len(fixtures)} labelled conversations")
+    bench_extractive(fixtures)
+    if args.llm:
+        asyncio.run(bench_llm(fixtures))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--llm", action="store_true", help="also title every conversation with the model")
+    main(parser.parse_args())
@@ -0,0 +1,171 @@
+"""
+Per-turn CPU benchmark: the pure-Python work done on every chat turn, timed
+with timeit and compared against a committed baseline.
+  prompt      - build_prompt for the largest personas, 20 history messages, 8 memories
+  gender      - extract_gender over the largest personas
+  category    - categorize_persona over every persona name
+  asterisks   - convert_asterisks_to_html on 2/8/32 KB replies
+  split       - response_util.split_response on 8/32 KB replies
+  sanitize    - sanitization_utils on names and a 32 KB reply
+Times are normalized by a fixed pure-Python calibration loop so a baseline
+recorded on one machine still means something on another. A case more than
+--threshold slower than the baseline fails the run (exit code 1).
+Run (from backend/):
+  python -m benchmarks.bench_turn
+  python -m benchmarks.bench_turn --save-baseline   # after an intended change
+"""
+import os
+import sys
+import json
+import timeit
+import argparse
+import platform
+from datetime import datetime, timezone
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from main import build_prompt, convert_asterisks_to_html
+from utilities.persona_utils import INSTRUCTIONS_DIR, load_personas, get_persona, categorize_persona, extract_gender
+try:
+    from utilities.response_util import split_response
+except ImportError:  # response_util needs langdetect and aiohttp, the API server doesn't
+    split_response = None
+from utilities.sanitization_utils import sanitize_username, sanitize_prompt
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_FILE = os.path.join(BENCH_DIR, "fixtures", "replies.json")
+BASELINE_FILE = os.path.join(BENCH_DIR, "baselines", "bench_turn.json")
+# Personas benchmarked for prompt assembly and gender detection, largest first
+LARGEST_PERSONAS = 3
+REPLY_SIZES = {"2kb": 2048, "8kb": 8192, "32kb": 32768}
+HISTORY_MESSAGES = 20
+REPEATS = 30
+# Target length of one timed repeat
+REPEAT_SECONDS = 0.01
+# A fixed time so the prompt is identical on every run
+FIXED_NOW = datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+def build_reply(paragraphs, size):
+    """Paragraphs joined in order until the reply reaches size characters"""
+    parts, length, i = [], 0, 0
+    while length < size:
+        parts.append(paragraphs[i % len(paragraphs)])
+        length += len(parts[-1]) + 2
+        i += 1
+    return "\n\n".join(parts)[:size]
+
+def largest_personas():
+    files = [f for f in os.listdir(INSTRUCTIONS_DIR) if f.endswith('.txt')]
+    files.sort(key=lambda f: (-os.path.getsize(os.path.join(INSTRUCTIONS_DIR, f)), f))
+    return [f[:-4] for f in files[:LARGEST_PERSONAS]]
+
+def calibration():
+    """Fixed interpreter-bound work the cases are measured against"""
+    text = "calibration " * 50
+    total = 0
+    for i in range(200):
+        total += len(text.upper().split()) + i
+    return total
+
+def build_cases():
+    with open(FIXTURES_FILE, 'r', encoding='utf-8') as f:
+        fixtures = json.load(f)
+    paragraphs, memories = fixtures["paragraphs"], fixtures["memories"]
+    replies = {label: build_reply(paragraphs, size) for label, size in REPLY_SIZES.items()}
+    history = [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": paragraphs[i % len(paragraphs)]}
+        for i in range(HISTORY_MESSAGES)
+    ]
+
+    load_personas()
+    names = sorted(f[:-4] for f in os.listdir(INSTRUCTIONS_DIR) if f.endswith('.txt'))
+    cases = {"calibration": calibration}
+    for name in largest_personas():
+        entry = get_persona(name)
+        cases[f"prompt[{name}]"] = lambda entry=entry: build_prompt(
+            entry, paragraphs[0], history, memories, now=FIXED_NOW
+        )
+        cases[f"gender[{name}]"] = lambda text=entry["instructions"]: extract_gender(text)
+    cases["category[all]"] = lambda: [categorize_persona(name) for name in names]
+    for label, reply in replies.items():
+        cases[f"asterisks[{label}]"] = lambda reply=reply: convert_asterisks_to_html(reply)
+    if split_response is None:
+        print("Skipping split cases, utilities.response_util can't be imported here", file=sys.stderr)
+    else:
+        for label in ("8kb", "32kb"):
+            cases[f"split[{label}]"] = lambda reply=replies[label]: split_response(reply)
+    cases["sanitize_username[all]"] = lambda: [sanitize_username(name) for name in names]
+    cases["sanitize_prompt[32kb]"] = lambda: sanitize_prompt(replies["32kb"])
+    return cases
+
+def run_cases():
+    """
+    Best time per call in microseconds. Rounds go through every case in turn,
+    so a noisy moment on the machine costs each case one sample at most.
+    """
+    timers = {}
+    for name, func in build_cases().items():
+        timer = timeit.Timer(func)
+        number, elapsed = timer.autorange()
+        timers[name] = (timer, max(1, int(number * REPEAT_SECONDS / elapsed)))
+    best = {name: float('inf') for name in timers}
+    for _ in range(REPEATS):
+        for name, (timer, number) in timers.items():
+            best[name] = min(best[name], timer.timeit(number) / number)
+    results = {name: {"us": round(seconds * 1e6, 3)} for name, seconds in best.items()}
+    unit = results["calibration"]["us"]
+    for result in results.values():
+        result["normalized"] = round(result["us"] / unit, 4)
+    return results
+
+def compare(results, baseline, threshold):
+    """Print every case against the baseline; returns the names that regressed"""
+    regressions = []
+    print(f"{'case':<28}{'baseline':>12}{'now':>12}{'change':>10}")
+    for name, result in results.items():
+        before = baseline["results"].get(name)
+        if name == "calibration" or not before:
+            print(f"{name:<28}{'':>12}{result['us']:>10.2f}us{'new' if not before else '':>10}")
+            continue
+        change = result["normalized"] / before["normalized"] - 1
+        flag = " ⚠️" if change > threshold else ""
+        print(f"{name:<28}{before['us']:>10.2f}us{result['us']:>10.2f}us{change:>+9.1%}{flag}")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+def main(args):
+    results = run_cases()
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(BASELINE_FILE), exist_ok=True)
+        with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+            json.dump({
+                "recorded": datetime.now().isoformat(timespec='seconds'),
+                "host": {"python": platform.python_version(), "machine": platform.machine()},
+                "results": results,
+            }, f, indent=2)
+            f.write("\n")
+        print(json.dumps(results, indent=2))
+        print(f"💾 Baseline saved to {BASELINE_FILE}")
+        return 0
+
+    if not os.path.exists(BASELINE_FILE):
+        print(json.dumps(results, indent=2))
+        print("No baseline yet, record one with --save-baseline")
+        return 0
+    with open(BASELINE_FILE, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline["host"]["python"].rsplit('.', 1)[0] != platform.python_version().rsplit('.', 1)[0]:
+        print(f"⚠️ Baseline was recorded on Python {baseline['host']['python']}, this is {platform.python_version()}")
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"❌ {len(regressions)} cases more than {args.threshold:.0%} slower: {', '.join(regressions)}")
+        return 1
+    print(f"✅ No case more than {args.threshold:.0%} slower than the baseline")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown per case (0.25 = 25%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="record these results as the new baseline")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,250 @@
+"""
+Load driver: replays a weighted mix of /chat, /conversations,
+/conversation/message and /chat/shared traffic against a running backend
+and reports p50/p95/p99 latency, error rate and throughput per endpoint.
+Point the backend at benchmarks/mock_provider.py, or replay recorded
+provider calls (PROVIDER_MODE=replay), so /chat never reaches HackClub or g4f.
+
+Setup creates --users users, each with a seeded conversation, and a few
+shared chats; they are deleted again at the end. Results are written as JSON
+(--output), and --baseline compares against an earlier run.
+
+Run (from backend/):
+  python -m benchmarks.load_test --base-url http://127.0.0.1:8000 --duration 60 --concurrency 32
+  python -m benchmarks.load_test --mix chat=1,conversations=4,message=4,shared=1 --baseline benchmarks/results/before.json
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import statistics
+from datetime import datetime
+from typing import Dict, List
+
+import httpx
+
+SHARED_CHATS_FILE = "shared_chats.json"
+RESULTS_DIR = os.path.join("benchmarks", "results")
+DEFAULT_MIX = "chat=2,conversations=3,message=4,shared=1"
+# Messages seeded into each user's conversation before the run
+SEED_MESSAGES = 20
+SHARED_CHATS = 5
+# History sent with each /chat, like the frontend's recent window
+CHAT_HISTORY = 10
+LOAD_USER_PREFIX = "load-test-user"
+# LoadTest methods the mix can name
+OPERATIONS = ("chat", "conversations", "message", "shared")
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation '{name}', expected one of {sorted(OPERATIONS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def load_transcripts() -> List[List[Dict[str, str]]]:
+    """Real conversations to seed from and replay"""
+    transcripts = []
+    if os.path.exists(SHARED_CHATS_FILE):
+        with open(SHARED_CHATS_FILE, 'r', encoding='utf-8') as f:
+            chats = json.load(f)
+        transcripts = [
+            [{"role": m["role"], "content": m["content"]} for m in c["messages"] if m.get("content")]
+            for c in chats.values()
+        ]
+    return [t for t in transcripts if t] or [[
+        {"role": "user", "content": "hey, how was your day?"},
+        {"role": "assistant", "content": "<em>She stretched, yawning.</em> Long. Yours?"},
+    ]]
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, args):
+        self.client = client
+        self.args = args
+        self.transcripts = load_transcripts()
+        self.persona = args.persona
+        self.users: List[Dict] = []
+        self.share_ids: List[str] = []
+        self.timings: Dict[str, List[float]] = {name: [] for name in OPERATIONS}
+        self.errors: Dict[str, Dict[str, int]] = {name: {} for name in OPERATIONS}
+
+    def _messages(self, count: int) -> List[Dict[str, str]]:
+        transcript = random.choice(self.transcripts)
+        return [transcript[i % len(transcript)] for i in range(count)]
+
+    async def setup(self):
+        if not self.persona:
+            personas = (await self.client.get("/personas")).json()
+            self.persona = personas[0]["name"]
+        for i in range(self.args.users):
+            user_id = f"{LOAD_USER_PREFIX}-{i}"
+            response = await self.client.post(
+                "/user/create", json={"uid": user_id, "email": f"{user_id}@example.com", "displayName": user_id}
+            )
+            response.raise_for_status()
+            response = await self.client.post(
+                "/conversation/create", json={"userId": user_id, "personaName": self.persona, "title": "Load test"}
+            )
+            response.raise_for_status()
+            conversation_id = response.json()["conversationId"]
+            history = self._messages(SEED_MESSAGES)
+            for message in history:
+                await self.client.post(
+                    "/conversation/message", json={"conversationId": conversation_id, **message}
+                )
+            self.users.append({"id": user_id, "conversation_id": conversation_id, "history": history})
+        for transcript in self.transcripts[:SHARED_CHATS]:
+            response = await self.client.post(
+                "/chat/share", json={"messages": transcript, "personaName": self.persona, "title": "Load test"}
+            )
+            response.raise_for_status()
+            self.share_ids.append(response.json()["shareId"])
+
+    async def teardown(self):
+        for share_id in self.share_ids:
+            await self.client.delete(f"/chat/share/{share_id}")
+        for user in self.users:
+            await self.client.delete(f"/user/{user['id']}")
+
+    # ============ OPERATIONS ============
+
+    async def chat(self, user: Dict) -> httpx.Response:
+        return await self.client.post("/chat", json={
+            "persona": self.persona,
+            "message": random.choice(self._messages(4))["content"],
+            "history": user["history"][-CHAT_HISTORY:],
+            "user_id": user["id"],
+        })
+
+    async def conversations(self, user: Dict) -> httpx.Response:
+        return await self.client.get(f"/conversations/{user['id']}")
+
+    async def message(self, user: Dict) -> httpx.Response:
+        message = random.choice(self._messages(2))
+        user["history"].append(message)
+        return await self.client.post(
+            "/conversation/message", json={"conversationId": user["conversation_id"], **message}
+        )
+
+    async def shared(self, user: Dict) -> httpx.Response:
+        return await self.client.get(f"/chat/shared/{random.choice(self.share_ids)}")
+
+    async def worker(self, deadline: float, names: List[str], weights: List[float]):
+        while time.perf_counter() < deadline:
+            name = random.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                response = await getattr(self, name)(random.choice(self.users))
+                outcome = None if response.status_code < 400 else str(response.status_code)
+            except httpx.HTTPError as e:
+                outcome = type(e).__name__
+            self.timings[name].append(time.perf_counter() - start)
+            if outcome:
+                self.errors[name][outcome] = self.errors[name].get(outcome, 0) + 1
+
+    async def run(self) -> float:
+        mix = self.args.mix
+        names, weights = list(mix), list(mix.values())
+        start = time.perf_counter()
+        deadline = start + self.args.duration
+        await asyncio.gather(*(self.worker(deadline, names, weights) for _ in range(self.args.concurrency)))
+        return time.perf_counter() - start
+
+    def report(self, elapsed: float) -> Dict:
+        results = {}
+        for name, timings in self.timings.items():
+            if not timings:
+                continue
+            ordered = sorted(timings)
+            errors = sum(self.errors[name].values())
+            results[name] = {
+                "requests": len(ordered),
+                "errors": self.errors[name],
+                "error_rate": round(errors / len(ordered), 4),
+                "throughput_rps": round(len(ordered) / elapsed, 2),
+                "p50_ms": round(statistics.median(ordered) * 1000, 2),
+                "p95_ms": round(percentile(ordered, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(ordered, 0.99) * 1000, 2),
+            }
+        everything = sorted(t for timings in self.timings.values() for t in timings)
+        if everything:
+            results["total"] = {
+                "requests": len(everything),
+                "throughput_rps": round(len(everything) / elapsed, 2),
+                "p50_ms": round(statistics.median(everything) * 1000, 2),
+                "p95_ms": round(percentile(everything, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(everything, 0.99) * 1000, 2),
+            }
+        return results
+
+def compare(results: Dict, baseline_path: str):
+    """Print the change in p95 and throughput against an earlier run"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)["results"]
+    print(f"📊 Compared with {baseline_path}:")
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        p95 = (current["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0.0
+        rps = (current["throughput_rps"] - before["throughput_rps"]) / before["throughput_rps"] * 100 if before["throughput_rps"] else 0.0
+        print(f"  {name:<14} p95 {before['p95_ms']:>9.2f} -> {current['p95_ms']:>9.2f} ms ({p95:+.1f}%)   "
+              f"throughput {before['throughput_rps']:>8.2f} -> {current['throughput_rps']:>8.2f} rps ({rps:+.1f}%)")
+
+async def main(args):
+    random.seed(args.seed)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        test = LoadTest(client, args)
+        print(f"🧪 Seeding {args.users} users against {args.base_url}")
+        await test.setup()
+        try:
+            print(f"🚀 {args.concurrency} workers for {args.duration:g}s, mix {args.mix_spec}")
+            elapsed = await test.run()
+        finally:
+            await test.teardown()
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec='seconds'),
+        "config": {
+            "base_url": args.base_url, "duration_s": args.duration, "concurrency": args.concurrency,
+            "users": args.users, "mix": args.mix, "persona": test.persona, "seed": args.seed,
+        },
+        "host": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "elapsed_s": round(elapsed, 2),
+        "results": test.report(elapsed),
+    }
+    print(json.dumps(report["results"], indent=2))
+
+    output = args.output or os.path.join(RESULTS_DIR, f"load-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Results saved to {output}")
+    if args.baseline:
+        compare(report["results"], args.baseline)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds of load")
+    parser.add_argument("--concurrency", type=int, default=32, help="simultaneous clients")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--mix", dest="mix_spec", default=DEFAULT_MIX, help="operation=weight,...")
+    parser.add_argument("--persona", default=None, help="persona to chat with (default: first in the catalogue)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request timeout in seconds")
+    parser.add_argument("--output", default=None, help=f"results file (default: {RESULTS_DIR}/load-<time>.json)")
+    parser.add_argument("--baseline", default=None, help="earlier results file to compare with")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    args.mix = parse_mix(args.mix_spec)
+    asyncio.run(main(args))
@@ -0,0 +1,155 @@
+"""
+Mock OpenAI-compatible chat provider for load tests. Serves
+POST /v1/chat/completions (plain or streamed) with configurable latency,
+token rate and injected errors, and GET /stats with what it served.
+Replies are real persona replies from shared_chats.json.
+
+Latency is the time to the first token:
+  none | fixed:SECONDS | uniform:LOW:HIGH | lognormal:MEDIAN:SIGMA
+then tokens arrive at --tokens-per-s.
+
+Run (from backend/):
+  python -m benchmarks.mock_provider --port 9100 --latency lognormal:0.8:0.5 --tokens-per-s 40 --error-rate 0.02
+and start the backend against it, without the g4f fallback:
+  USE_HACKCLUB=true HACKCLUB_API_KEY=mock HACKCLUB_BASE_URL=http://127.0.0.1:9100/v1 \
+  PROVIDER_FALLBACK=false uvicorn main:app --port 8000
+"""
+import os
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from collections import Counter
+from typing import Callable, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+SHARED_CHATS_FILE = "shared_chats.json"
+# How long an injected timeout hangs, longer than the backend's 60s client timeout
+TIMEOUT_SECONDS = 90.0
+# Rough characters per token, same estimate as the prompt size metrics
+CHARS_PER_TOKEN = 4
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """Seconds-to-first-token sampler from a latency spec"""
+    kind, *params = spec.split(':')
+    values = [float(p) for p in params]
+    if kind == 'none':
+        return lambda: 0.0
+    if kind == 'fixed' and len(values) == 1:
+        return lambda: values[0]
+    if kind == 'uniform' and len(values) == 2:
+        return lambda: random.uniform(values[0], values[1])
+    if kind == 'lognormal' and len(values) == 2:
+        median, sigma = values
+        return lambda: median * random.lognormvariate(0.0, sigma)
+    raise argparse.ArgumentTypeError(f"Invalid latency '{spec}', see --help")
+
+def load_replies() -> List[str]:
+    replies = []
+    if os.path.exists(SHARED_CHATS_FILE):
+        with open(SHARED_CHATS_FILE, 'r', encoding='utf-8') as f:
+            chats = json.load(f)
+        replies = [
+            m['content'] for c in chats.values() for m in c['messages']
+            if m.get('role') == 'assistant' and m.get('content')
+        ]
+    return replies or ["<em>She glanced up, smiling.</em> Hey. What's up? " * 4]
+
+def create_app(args) -> FastAPI:
+    app = FastAPI(title="Mock chat provider")
+    first_token = parse_latency(args.latency)
+    replies = load_replies()
+    stats = Counter()
+
+    def completion(model: str, content: str, prompt_chars: int) -> dict:
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_chars // CHARS_PER_TOKEN,
+                "completion_tokens": len(content) // CHARS_PER_TOKEN,
+                "total_tokens": (prompt_chars + len(content)) // CHARS_PER_TOKEN,
+            },
+        }
+
+    async def stream(model: str, content: str):
+        # One chunk per token-sized slice, paced at the token rate
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        for start in range(0, len(content), CHARS_PER_TOKEN):
+            chunk = {
+                "id": completion_id, "object": "chat.completion.chunk", "model": model,
+                "choices": [{"index": 0, "delta": {"content": content[start:start + CHARS_PER_TOKEN]}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(1.0 / args.tokens_per_s)
+        yield "data: [DONE]\n\n"
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "mock")
+        prompt_chars = sum(len(str(m.get("content", ""))) for m in body.get("messages", []))
+        stats["requests"] += 1
+        stats["prompt_chars"] += prompt_chars
+
+        roll = random.random()
+        if roll < args.timeout_rate:
+            stats["timeouts"] += 1
+            await asyncio.sleep(TIMEOUT_SECONDS)
+            return JSONResponse({"error": {"message": "Upstream timeout", "type": "timeout"}}, status_code=504)
+        roll -= args.timeout_rate
+        if roll < args.rate_limit_rate:
+            stats["rate_limited"] += 1
+            return JSONResponse({"error": {"message": "Rate limit reached", "type": "rate_limit"}}, status_code=429)
+        roll -= args.rate_limit_rate
+        if roll < args.error_rate:
+            stats["errors"] += 1
+            await asyncio.sleep(first_token())
+            return JSONResponse({"error": {"message": "Injected failure", "type": "server_error"}}, status_code=500)
+
+        content = random.choice(replies)
+        await asyncio.sleep(first_token())
+        if body.get("stream"):
+            stats["streamed"] += 1
+            return StreamingResponse(stream(model, content), media_type="text/event-stream")
+        await asyncio.sleep(len(content) / CHARS_PER_TOKEN / args.tokens_per_s)
+        stats["completed"] += 1
+        return completion(model, content, prompt_chars)
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "qwen/qwen3-32b", "object": "model", "owned_by": "mock"}]}
+
+    @app.get("/stats")
+    async def get_stats():
+        return dict(stats)
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", default="lognormal:0.8:0.5", help="time to first token, see above")
+    parser.add_argument("--tokens-per-s", type=float, default=40.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share answered with a 429")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help=f"share that hang for {TIMEOUT_SECONDS:.0f}s")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    parse_latency(args.latency)
+    random.seed(args.seed)
+
+    import uvicorn
+    print(f"🧪 Mock provider on http://{args.host}:{args.port}/v1 (latency {args.latency}, {args.tokens_per_s:g} tokens/s)")
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
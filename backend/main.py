@@ -1,11 +1,14 @@
-from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi import FastAPI, HTTPException, Depends, Header, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response, PlainTextResponse
 from pydantic import BaseModel
-from typing import List, Dict, Optional
+from typing import Awaitable, Callable, List, Dict, Optional, Union
 import os
 import json
+import asyncio
+import hashlib
+import inspect
 import httpx
 from dotenv import load_dotenv
 import g4f
@@ -13,52 +16,100 @@ from g4f.client import Client
 import secrets
 from datetime import datetime, timedelta
 import re
+import zlib
 from contextlib import asynccontextmanager
 
-# Import database utilities
-from utilities.db_utils import (
+# Load .env before the utilities read their settings from the environment
+load_dotenv()
+
+from utilities.log_utils import setup_logging, get_logger, RequestIdMiddleware, LOG_PROMPTS
+setup_logging()
+logger = get_logger(__name__)
+
+# Import storage functions (MySQL or SQLite, see utilities/storage.py)
+from utilities.storage import (
     init_db_pool, close_db_pool,
-    create_user, get_user, update_user,
-    create_conversation, get_conversation, get_user_conversations, 
+    create_user, get_user, update_user, mark_user_deleted, iter_user_export,
+    create_conversation, get_conversation, get_conversation_version, get_user_conversations, 
     update_conversation, delete_conversation,
-    add_message, get_conversation_messages, delete_conversation_messages,
+    add_message, get_conversation_messages, get_conversation_messages_since, get_last_messages,
+    delete_conversation_messages,
+    search_user_messages,
     create_memory, get_user_memories, update_memory, delete_memory,
     get_user_settings, update_user_settings
 )
-
-load_dotenv()
+from utilities.search_utils import extract_terms, highlight_snippet
+from utilities.memory_utils import (
+    retrieve_memories, rank_memories,
+    index_memory, reindex_memory, unindex_memory, drop_memory_index
+)
+from utilities.memory_filter_utils import (
+    should_extract, should_audit, schedule_audit, get_memory_filter_stats
+)
+from utilities.title_utils import extractive_title, TITLE_QUALITY, TITLE_MIN_SCORE
+from utilities.enrichment_utils import (
+    PLACEHOLDER_TITLES, note_untitled_conversation, note_completed_turn, forget_conversation
+)
+from utilities.maintenance_utils import (
+    start_background_tasks, stop_background_tasks,
+    notify_purge_worker, get_purge_stats
+)
+from utilities.http_utils import (
+    FastJSONResponse, fast_json, SelectiveGZipMiddleware, RESPONSE_GZIP_MIN_BYTES, RESPONSE_GZIP_LEVEL
+)
+from utilities.metrics_utils import MetricsMiddleware, track_provider_call, render_metrics
+from utilities.provider_utils import provider_call
+from utilities.profiling_utils import (
+    run_profile, ProfilerBusy, set_loop_stall_threshold, get_loop_stalls,
+    PROFILE_INTERVAL_MS, PROFILE_MAX_SECONDS, LOOP_STALL_THRESHOLD_MS
+)
+from utilities.persona_utils import (
+    load_personas, save_persona_async,
+    get_persona as get_persona_entry, list_personas, search_personas, get_persona_registry_version,
+    persona_cache_tag
+)
 
 # Lifespan context manager for startup/shutdown
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await init_db_pool()
+    load_personas()
+    background_tasks = start_background_tasks()
+    set_loop_stall_threshold(LOOP_STALL_THRESHOLD_MS)
     yield
     # Shutdown
+    set_loop_stall_threshold(0)
+    await stop_background_tasks(background_tasks)
     await close_db_pool()
 
 # AI Provider Configuration
 USE_HACKCLUB = os.getenv('USE_HACKCLUB', 'false').lower() == 'true'
 HACKCLUB_API_KEY = os.getenv('HACKCLUB_API_KEY', '')
-HACKCLUB_BASE_URL = 'https://ai.hackclub.com/proxy/v1'
+# Any OpenAI-compatible endpoint works (benchmarks/mock_provider.py for load tests)
+HACKCLUB_BASE_URL = os.getenv('HACKCLUB_BASE_URL', 'https://ai.hackclub.com/proxy/v1')
+# Retry failed HackClub calls on g4f; off keeps load tests off the network
+PROVIDER_FALLBACK = os.getenv('PROVIDER_FALLBACK', 'true').lower() == 'true'
 
 # Initialize g4f client (100% FREE - no API keys needed!)
 g4f_client = Client()
 
-print(f"🤖 AI Provider: {'HackClub' if USE_HACKCLUB and HACKCLUB_API_KEY else 'g4f (free)'}")
+logger.info("AI provider selected", extra={"provider": 'hackclub' if USE_HACKCLUB and HACKCLUB_API_KEY else 'g4f'})
 
-app = FastAPI(title="Kriyan Uncensored AI API", lifespan=lifespan)
+app = FastAPI(title="Kriyan Uncensored AI API", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # Validation error handler
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
-    print(f"❌ Validation error for {request.method} {request.url.path}")
-    print(f"   Errors: {exc.errors()}")
+    logger.warning("Validation error", extra={"method": request.method, "path": request.url.path, "errors": exc.errors()})
     return JSONResponse(
         status_code=422,
         content={"detail": exc.errors()}
     )
 
+# Compress large responses (transcripts, exports) for clients that accept gzip
+app.add_middleware(SelectiveGZipMiddleware, minimum_size=RESPONSE_GZIP_MIN_BYTES, compresslevel=RESPONSE_GZIP_LEVEL)
+
 # CORS - Allow frontend to access backend
 app.add_middleware(
     CORSMiddleware,
@@ -75,6 +126,12 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# Outermost, so latency covers compression and CORS too
+app.add_middleware(MetricsMiddleware, routes=app.routes)
+
+# Correlation ID for every log line written while handling a request
+app.add_middleware(RequestIdMiddleware)
+
 # ============ MODELS CONFIGURATION ============
 # Using g4f (GPT4Free) - 100% FREE, no API keys needed!
 AVAILABLE_MODELS = {
@@ -124,92 +181,6 @@ AVAILABLE_MODELS = {
 
 DEFAULT_MODEL = "qwen/qwen3-32b"
 
-# ============ PERSONA SYSTEM ============
-INSTRUCTIONS_DIR = "instructions"
-SUMMARIES_FILE = "summaries.json"
-
-def load_summaries() -> Dict:
-    """Load persona summaries from cache"""
-    if os.path.exists(SUMMARIES_FILE):
-        with open(SUMMARIES_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
-
-def get_persona_instruction(persona_name: str) -> Optional[str]:
-    """Load persona instructions from file"""
-    persona_file = os.path.join(INSTRUCTIONS_DIR, f"{persona_name}.txt")
-    if os.path.exists(persona_file):
-        with open(persona_file, 'r', encoding='utf-8') as f:
-            return f.read()
-    return None
-
-def list_all_personas() -> List[Dict]:
-    """List all available personas with summaries"""
-    summaries = load_summaries()
-    personas = []
-    
-    if not os.path.exists(INSTRUCTIONS_DIR):
-        return personas
-    
-    for filename in os.listdir(INSTRUCTIONS_DIR):
-        if filename.endswith('.txt'):
-            persona_name = filename[:-4]  # Remove .txt
-            personas.append({
-                "name": persona_name,
-                "summary": summaries.get(persona_name, "No description available"),
-                "category": categorize_persona(persona_name)
-            })
-    
-    return personas
-
-def categorize_persona(name: str) -> str:
-    """Categorize persona based on name"""
-    name_lower = name.lower()
-    
-    if any(word in name_lower for word in ['mia', 'khalifa', 'beast', 'sharonraj']):
-        return "Celebrity"
-    elif any(word in name_lower for word in ['yumi', 'lina', 'barbie', 'kira']):
-        return "Anime"
-    elif any(word in name_lower for word in ['therapist', 'interviewer']):
-        return "Professional"
-    elif any(word in name_lower for word in ['badgpt', 'evil', 'shinigami']):
-        return "Dark"
-    elif any(word in name_lower for word in ['developer', 'writer']):
-        return "Assistant"
-    else:
-        return "General"
-
-def extract_gender(persona_instructions: str) -> str:
-    """Extract gender from persona instructions"""
-    # Check for explicit GENDER field first
-    lines = persona_instructions.split('\n')
-    for line in lines[:10]:  # Check first 10 lines
-        if line.strip().upper().startswith('GENDER:'):
-            gender = line.split(':', 1)[1].strip().upper()
-            if gender == 'MALE':
-                return 'male'
-            elif gender == 'FEMALE':
-                return 'female'
-            elif gender == 'NEUTRAL':
-                return 'neutral'
-    
-    # Fallback: analyze text content
-    text_lower = persona_instructions.lower()
-    
-    # Check for explicit gender mentions
-    male_indicators = ['male', 'man', 'boy', 'guy', 'he/him', 'his', 'father', 'boyfriend', 'husband', 'brother', 'son']
-    female_indicators = ['female', 'woman', 'girl', 'lady', 'she/her', 'hers', 'mother', 'girlfriend', 'wife', 'sister', 'daughter']
-    
-    male_count = sum(1 for word in male_indicators if word in text_lower)
-    female_count = sum(1 for word in female_indicators if word in text_lower)
-    
-    if male_count > female_count:
-        return 'male'
-    elif female_count > male_count:
-        return 'female'
-    else:
-        return 'neutral'
-
 # ============ FORMATTING UTILITIES ============
 def convert_asterisks_to_html(text: str) -> str:
     """
@@ -228,7 +199,7 @@ def convert_asterisks_to_html(text: str) -> str:
 # ============ AI GENERATION ============
 async def generate_with_hackclub(messages: List[Dict], temperature: float = 1.2) -> str:
     """Generate response using HackClub API"""
-    try:
+    async def call() -> str:
         async with httpx.AsyncClient() as client:
             response = await client.post(
                 f"{HACKCLUB_BASE_URL}/chat/completions",
@@ -248,8 +219,14 @@ async def generate_with_hackclub(messages: List[Dict], temperature: float = 1.2)
             response.raise_for_status()
             data = response.json()
             return data['choices'][0]['message']['content']
+
+    try:
+        with track_provider_call("hackclub", "qwen/qwen3-32b", messages):
+            return await provider_call("hackclub", "qwen/qwen3-32b", messages, {"temperature": temperature}, call)
     except Exception as e:
-        print(f"HackClub API error: {e}, falling back to g4f")
+        if not PROVIDER_FALLBACK:
+            raise HTTPException(status_code=502, detail=f"HackClub error: {str(e)}")
+        logger.warning("HackClub API error, falling back to g4f", extra={"error": str(e)})
         return await generate_with_g4f("command-r24", messages, temperature)
 
 async def generate_with_g4f(model_id: str, messages: List[Dict], temperature: float = 0.7) -> str:
@@ -259,48 +236,49 @@ async def generate_with_g4f(model_id: str, messages: List[Dict], temperature: fl
         import asyncio
         loop = asyncio.get_event_loop()
         
-        response = await loop.run_in_executor(
-            None,
-            lambda: g4f_client.chat.completions.create(
-                model="command-r24",
-                messages=messages,
-                temperature=temperature,
-                frequency_penalty=0.6,
-                presence_penalty=0.4
+        async def call() -> str:
+            response = await loop.run_in_executor(
+                None,
+                lambda: g4f_client.chat.completions.create(
+                    model="command-r24",
+                    messages=messages,
+                    temperature=temperature,
+                    frequency_penalty=0.6,
+                    presence_penalty=0.4
+                )
             )
-        )
+            return response.choices[0].message.content
         
-        return response.choices[0].message.content.split("💝 Support this free API")[0]
+        with track_provider_call("g4f", "command-r24", messages):
+            content = await provider_call("g4f", "command-r24", messages, {"temperature": temperature}, call)
+        
+        return content.split("💝 Support this free API")[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"g4f error: {str(e)}")
 
-async def generate_response(persona: str, message: str, history: List[Dict], model: str = DEFAULT_MODEL, user_memories: List[str] = []) -> str:
-    """Generate AI response with persona and chat history"""
-    
-    # Get model config
-    model_config = AVAILABLE_MODELS.get(model)
-    if not model_config:
-        raise HTTPException(status_code=400, detail=f"Model '{model}' not found")
-    
-    # Load persona instructions
-    persona_instructions = get_persona_instruction(persona)
-    print(persona_instructions)
-    if not persona_instructions:
-        raise HTTPException(status_code=404, detail=f"Persona '{persona}' not found")
-    
-    # Extract gender from persona
-    gender = extract_gender(persona_instructions)
-    pronouns = "she/her" if gender == "female" else "he/him" if gender == "male" else "they/them"
-    pronoun_subject = "she" if gender == "female" else "he" if gender == "male" else "they"
-    pronoun_object = "her" if gender == "female" else "him" if gender == "male" else "them"
-    print(f"🎭 Detected gender: {gender} (pronouns: {pronouns})")
+async def generate_structured(messages: List[Dict]) -> str:
+    """Low-temperature completion for background tasks (extraction, enrichment)"""
+    if USE_HACKCLUB and HACKCLUB_API_KEY:
+        return await generate_with_hackclub(messages, temperature=0.3)
+    return await generate_with_g4f("command-r24", messages, temperature=0.3)
+
+def build_prompt(
+    persona_entry: Dict,
+    message: str,
+    history: List[Dict],
+    user_memories: List[str] = [],
+    now: Optional[datetime] = None
+) -> List[Dict]:
+    """Messages sent to the model: the system layers for the persona, recent history and the new message"""
+    persona_instructions = persona_entry["instructions"]
     
-    # Get current date and time
-    from datetime import datetime
-    import pytz
+    # Gender and pronouns come from the persona's metadata record
+    gender = persona_entry["gender"]
+    pronouns, pronoun_subject, pronoun_object = persona_entry["pronouns"]
     
     # Get current time in user's timezone (UTC by default, can be customized)
-    now = datetime.now(pytz.UTC)
+    import pytz
+    now = now or datetime.now(pytz.UTC)
     current_datetime = now.strftime("%A, %B %d, %Y at %I:%M %p UTC")
     
     # Build system prompt with ZERO content filtering
@@ -512,18 +490,37 @@ Be natural. Be human. Don't state your name."""},
     ]
     
     # Add conversation history (includes ALL previous messages)
-    print(f"📜 History length: {len(history)}")
     for msg in history[-20:]:  # Last 20 messages for context
         role = msg.get("role", "user")
         content = msg.get("content", "")
         if content:  # Only add non-empty messages
             messages.append({"role": role, "content": content})
-            print(f"  Added to context: {role}: {content[:50]}...")
     
     # Add current message
     messages.append({"role": "user", "content": message})
-    print(f"💬 Current message: {message[:50]}...")
-    print(f"📨 Total messages being sent to AI: {len(messages)}")
+    
+    return messages
+
+async def generate_response(persona: str, message: str, history: List[Dict], model: str = DEFAULT_MODEL, user_memories: List[str] = []) -> str:
+    """Generate AI response with persona and chat history"""
+    
+    # Get model config
+    model_config = AVAILABLE_MODELS.get(model)
+    if not model_config:
+        raise HTTPException(status_code=400, detail=f"Model '{model}' not found")
+    
+    # Load persona instructions
+    persona_entry = get_persona_entry(persona)
+    if not persona_entry:
+        raise HTTPException(status_code=404, detail=f"Persona '{persona}' not found")
+    
+    messages = build_prompt(persona_entry, message, history, user_memories)
+    logger.info("Prompt assembled", extra={
+        "persona": persona, "gender": persona_entry["gender"], "history": len(history), "messages": len(messages),
+        "prompt_chars": sum(len(msg["content"]) for msg in messages), "sample": True
+    })
+    if LOG_PROMPTS:
+        logger.info("Prompt", extra={"persona": persona, "prompt": messages})
     
     # Generate response using HackClub or g4f (both FREE!)
     if USE_HACKCLUB and HACKCLUB_API_KEY:
@@ -544,6 +541,7 @@ class ChatRequest(BaseModel):
     model: Optional[str] = DEFAULT_MODEL
     temperature: Optional[float] = 0.7
     user_memories: Optional[List[str]] = []  # User memories for context
+    user_id: Optional[str] = None  # Lets the server pick relevant stored memories
 
 class ChatResponse(BaseModel):
     reply: str
@@ -559,6 +557,7 @@ class PersonaDetail(BaseModel):
     instructions: str
     summary: str
     category: str
+    version: int
 
 class ModelInfo(BaseModel):
     id: str
@@ -567,6 +566,59 @@ class ModelInfo(BaseModel):
     uncensored: bool
     description: str
 
+# ============ HTTP CACHING ============
+# How long browsers may reuse the model and persona catalogue before revalidating
+CATALOGUE_MAX_AGE_SECONDS = int(os.getenv('CATALOGUE_MAX_AGE_SECONDS', '60'))
+CATALOGUE_CACHE_CONTROL = f"public, max-age={CATALOGUE_MAX_AGE_SECONDS}, must-revalidate"
+# Per-user data: only the browser keeps it, and it always checks back first
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+# The model list only changes with a deploy
+MODELS_CACHE_TAG = hashlib.sha256(json.dumps(AVAILABLE_MODELS, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses weak comparison, so W/"x" matches "x"
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in candidates or any(tag.removeprefix('W/') == etag for tag in candidates)
+
+TagFunction = Callable[[Request], Union[Optional[str], Awaitable[Optional[str]]]]
+
+def conditional_get(tag: TagFunction, cache_control: str = CATALOGUE_CACHE_CONTROL):
+    """
+    Dependency for read endpoints: tag(request), plain or async, returns a
+    value that changes whenever the response would, or None to skip caching.
+    A matching If-None-Match gets a 304 before the endpoint builds anything;
+    otherwise the response carries the ETag and Cache-Control headers.
+    """
+    async def validate(request: Request, response: Response):
+        value = tag(request)
+        if inspect.isawaitable(value):
+            value = await value
+        if value is None:
+            return
+        etag = f'"{value}"'
+        headers = {"ETag": etag, "Cache-Control": cache_control}
+        if _etag_matches(request.headers.get("if-none-match", ""), etag):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+    return Depends(validate)
+
+def _query_tag(request: Request) -> str:
+    """Short hash of the query parameters, so each search or page gets its own ETag"""
+    query = sorted(request.query_params.multi_items())
+    return hashlib.sha256(json.dumps(query).encode('utf-8')).hexdigest()[:12] if query else "all"
+
+async def _conversation_tag(request: Request) -> Optional[str]:
+    """Conversation version from its own row, so a 304 never loads the messages"""
+    version = await get_conversation_version(request.path_params["conversation_id"])
+    if not version:
+        return None
+    state = json.dumps([str(version['updated_at']), version['message_count'], version['title'],
+                        bool(version['is_pinned']), version['memory_watermark']])
+    return f"{version['message_count']}-{hashlib.sha256(state.encode('utf-8')).hexdigest()[:16]}-{_query_tag(request)}"
+
+conversation_conditional_get = conditional_get(_conversation_tag, PRIVATE_CACHE_CONTROL)
+
 # ============ API ENDPOINTS ============
 
 @app.get("/")
@@ -579,7 +631,7 @@ async def root():
         "features": ["uncensored_chat", "50+_personas", "multiple_models"]
     }
 
-@app.get("/models", response_model=List[ModelInfo])
+@app.get("/models", response_model=List[ModelInfo], dependencies=[conditional_get(lambda request: MODELS_CACHE_TAG)])
 async def get_models():
     """Get all available AI models"""
     return [
@@ -593,56 +645,85 @@ async def get_models():
         for model_id, config in AVAILABLE_MODELS.items()
     ]
 
-@app.get("/personas", response_model=List[PersonaInfo])
-async def get_personas():
-    """Get all available personas"""
-    return list_all_personas()
+@app.get("/personas", response_model=List[PersonaInfo], dependencies=[
+    conditional_get(lambda request: f"{persona_cache_tag()}-{_query_tag(request)}")
+])
+async def get_personas(
+    response: Response,
+    q: str = Query("", max_length=200),
+    category: Optional[str] = Query(None, max_length=50),
+    cursor: Optional[str] = Query(None, max_length=500),
+    limit: Optional[int] = Query(None, ge=1, le=200)
+):
+    """
+    Get personas, optionally searched (prefix and typo tolerant), filtered by
+    category and paginated. Without a limit the whole catalogue comes back as
+    before; otherwise X-Next-Cursor carries the cursor of the next page.
+    """
+    response.headers["X-Persona-Version"] = str(get_persona_registry_version())
+    if not (q.strip() or category or cursor or limit):
+        return list_personas()
+    try:
+        personas, next_cursor = search_personas(q, category, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return personas
 
-@app.get("/persona/{name}", response_model=PersonaDetail)
+@app.get("/persona/{name}", response_model=PersonaDetail, dependencies=[
+    conditional_get(lambda request: persona_cache_tag(request.path_params["name"]))
+])
 async def get_persona(name: str):
     """Get specific persona details"""
-    instructions = get_persona_instruction(name)
-    if not instructions:
+    persona = get_persona_entry(name)
+    if not persona:
         raise HTTPException(status_code=404, detail=f"Persona '{name}' not found")
     
-    summaries = load_summaries()
     return PersonaDetail(
         name=name,
-        instructions=instructions,
-        summary=summaries.get(name, "No description available"),
-        category=categorize_persona(name)
+        instructions=persona["instructions"],
+        summary=persona["summary"],
+        category=persona["category"],
+        version=persona["version"]
     )
 
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """Send message and get AI response"""
     try:
-        print(f"🔵 Received chat request: persona={request.persona}, model={request.model}")
-        print(f"🔵 Message: {request.message[:50]}...")
-        if request.user_memories:
-            print(f"🧠 User memories provided: {len(request.user_memories)} memories")
+        logger.info("Chat request", extra={"persona": request.persona, "model": request.model, "sample": True})
+        
+        # Only the memories relevant to this turn go into the prompt
+        user_memories = []
+        if request.user_id:
+            settings = await get_user_settings(request.user_id)
+            if settings and settings.get('memory_enabled'):
+                user_memories = await retrieve_memories(request.user_id, request.message, request.history)
+        elif request.user_memories:
+            user_memories = rank_memories(request.user_memories, request.message, request.history)
         
         reply = await generate_response(
             persona=request.persona,
             message=request.message,
             history=request.history,
             model=request.model,
-            user_memories=request.user_memories or []
+            user_memories=user_memories
         )
         
-        print(f"✅ Generated reply: {reply[:50]}...")
+        logger.info("Chat reply", extra={
+            "persona": request.persona, "memories": len(user_memories), "reply_chars": len(reply), "sample": True
+        })
         
         return ChatResponse(
             reply=reply,
             model_used=request.model
         )
     except HTTPException as he:
-        print(f"❌ HTTP Exception: {he.detail}")
+        logger.warning("Chat failed", extra={"status": he.status_code, "detail": he.detail})
         raise
     except Exception as e:
-        print(f"❌ Unexpected error: {type(e).__name__}: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Chat failed")
         raise HTTPException(status_code=500, detail=f"Error generating response: {str(e)}")
 
 # ============ IMAGE GENERATION ============
@@ -661,22 +742,27 @@ async def generate_image(request: ImageRequest):
         loop = asyncio.get_event_loop()
         
         # g4f image generation
-        response = await loop.run_in_executor(
-            None,
-            lambda: g4f_client.images.generate(
-                model=request.model,
-                prompt=request.prompt,
-                response_format="url"
+        async def call() -> str:
+            response = await loop.run_in_executor(
+                None,
+                lambda: g4f_client.images.generate(
+                    model=request.model,
+                    prompt=request.prompt,
+                    response_format="url"
+                )
             )
-        )
+            return response.data[0].url
         
-        image_url = response.data[0].url
+        prompt = [{"role": "user", "content": request.prompt}]
+        with track_provider_call("g4f-image", request.model, prompt):
+            image_url = await provider_call("g4f-image", request.model, prompt, {}, call)
         return ImageResponse(url=image_url)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Image generation error: {str(e)}")
 
 class TitleRequest(BaseModel):
     messages: List[Dict[str, str]]
+    quality: Optional[bool] = False  # Skip the local titler and ask the model
 
 class TitleResponse(BaseModel):
     title: str
@@ -685,6 +771,12 @@ class TitleResponse(BaseModel):
 async def generate_title(request: TitleRequest):
     """Generate a conversation title based on the messages"""
     try:
+        if not (request.quality or TITLE_QUALITY):
+            # Local keyword title; the model only runs when there is too little to go on
+            title, score = extractive_title(request.messages)
+            if score >= TITLE_MIN_SCORE:
+                return TitleResponse(title=title)
+        
         # Get first few messages to understand the conversation topic
         conversation_preview = ""
         for msg in request.messages[:4]:  # First 4 messages
@@ -703,17 +795,13 @@ async def generate_title(request: TitleRequest):
         if USE_HACKCLUB and HACKCLUB_API_KEY:
             title = await generate_with_hackclub(messages, temperature=0.7)
         else:
-            response = g4f_client.chat.completions.create(
-                model="command-r24",
-                messages=messages
-            )
-            title = response.choices[0].message.content.strip()
+            title = await generate_with_g4f("command-r24", messages)
         # Remove quotes if present
-        title = title.strip('"\'')
+        title = title.strip().strip('"\'')
         
         return TitleResponse(title=title)
     except Exception as e:
-        print(f"Title generation error: {e}")
+        logger.warning("Title generation error", extra={"error": str(e)})
         # Fallback to first user message if AI generation fails
         first_user_msg = next((msg["content"] for msg in request.messages if msg["role"] == "user"), "New Chat")
         title = " ".join(first_user_msg.split()[:6]) + ("..." if len(first_user_msg.split()) > 6 else "")
@@ -730,9 +818,6 @@ class CreatePersonaRequest(BaseModel):
 async def create_persona(request: CreatePersonaRequest):
     """Create a new persona"""
     try:
-        # Create instruction file
-        persona_file = os.path.join(INSTRUCTIONS_DIR, f"{request.name}.txt")
-        
         instructions = f"""CHARACTER: {request.name}
 TAGLINE: {request.tagline}
 DESCRIPTION: {request.description}
@@ -747,22 +832,12 @@ When users chat with you:
 - Keep responses natural and consistent with your character
 """
         
-        with open(persona_file, 'w', encoding='utf-8') as f:
-            f.write(instructions)
-        
-        # Update summaries
-        summaries_file = os.path.join(os.path.dirname(INSTRUCTIONS_DIR), 'summaries.json')
-        summaries = {}
-        if os.path.exists(summaries_file):
-            with open(summaries_file, 'r', encoding='utf-8') as f:
-                summaries = json.load(f)
-        
-        summaries[request.name] = request.tagline
-        
-        with open(summaries_file, 'w', encoding='utf-8') as f:
-            json.dump(summaries, f, indent=2)
+        # Category, gender and pronouns are worked out once, here, not per request
+        await save_persona_async(request.name, instructions, request.tagline, category=request.category)
         
         return {"success": True, "message": f"Persona '{request.name}' created successfully"}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create persona: {str(e)}")
 
@@ -876,7 +951,7 @@ async def get_shared_chat(share_id: str):
         chat["views"] = chat.get("views", 0) + 1
         save_shared_chats(shared_chats)
         
-        return chat
+        return fast_json(chat)
     except HTTPException:
         raise
     except Exception as e:
@@ -952,12 +1027,10 @@ class MemoryExtractionRequest(BaseModel):
 class MemoryExtractionResponse(BaseModel):
     memories: List[str]
 
-@app.post("/extract-memories", response_model=MemoryExtractionResponse)
-async def extract_memories(request: MemoryExtractionRequest):
-    """Analyze conversation and extract user information as memories"""
-    try:
-        # Create a prompt to extract user information
-        system_prompt = """You are a memory extraction assistant. Analyze the conversation and extract key information about the USER (not the AI character).
+async def run_memory_extraction(messages: List[Dict], existing_memories: List[str]) -> List[str]:
+    """Ask the model for new user facts in the given messages"""
+    # Create a prompt to extract user information
+    system_prompt = """You are a memory extraction assistant. Analyze the conversation and extract key information about the USER (not the AI character).
 
 Extract information about:
 - Personal details (name, age, location, occupation, etc.)
@@ -983,40 +1056,52 @@ Format each memory as a standalone statement, like:
 - "User enjoys playing video games and coding"
 
 Existing memories (don't repeat these):
-""" + "\n".join(f"- {mem}" for mem in request.existing_memories)
+""" + "\n".join(f"- {mem}" for mem in existing_memories)
 
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": "Extract memories from this conversation:\n\n" + "\n".join([
-                f"{msg['role']}: {msg['content']}" for msg in request.messages[-10:]  # Last 10 messages
-            ]) + "\n\nReturn ONLY new memories as a JSON array of strings. If no new info, return empty array []"}
-        ]
-        
-        # Use the AI to extract memories
-        if USE_HACKCLUB and HACKCLUB_API_KEY:
-            response = await generate_with_hackclub(messages, temperature=0.3)
-        else:
-            response = await generate_with_g4f("command-r24", messages, temperature=0.3)
-        
-        # Parse the response to extract memory list
-        try:
-            # Try to extract JSON array from response
-            import json
-            # Find JSON array in response
-            start_idx = response.find('[')
-            end_idx = response.rfind(']') + 1
-            if start_idx != -1 and end_idx > start_idx:
-                memories = json.loads(response[start_idx:end_idx])
-                if isinstance(memories, list):
-                    return MemoryExtractionResponse(memories=[m for m in memories if isinstance(m, str) and m.strip()])
-        except:
-            pass
-        
-        # Fallback: no memories extracted
-        return MemoryExtractionResponse(memories=[])
-        
+    prompt_messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": "Extract memories from this conversation:\n\n" + "\n".join([
+            f"{msg['role']}: {msg['content']}" for msg in messages
+        ]) + "\n\nReturn ONLY new memories as a JSON array of strings. If no new info, return empty array []"}
+    ]
+    
+    # Use the AI to extract memories
+    response = await generate_structured(prompt_messages)
+    
+    # Parse the response to extract memory list
+    try:
+        # Find JSON array in response
+        start_idx = response.find('[')
+        end_idx = response.rfind(']') + 1
+        if start_idx != -1 and end_idx > start_idx:
+            memories = json.loads(response[start_idx:end_idx])
+            if isinstance(memories, list):
+                return [m for m in memories if isinstance(m, str) and m.strip()]
+    except:
+        pass
+    
+    # Fallback: no memories extracted
+    return []
+
+@app.post("/extract-memories", response_model=MemoryExtractionResponse, deprecated=True)
+async def extract_memories(request: MemoryExtractionRequest):
+    """
+    Analyze conversation and extract user information as memories.
+
+    Deprecated: memories are now extracted server-side after completed
+    turns. Kept for pages loaded before that change; remove next release.
+    """
+    try:
+        messages = request.messages[-10:]  # Last 10 messages
+        # Most turns reveal nothing new about the user, answer those locally
+        if not should_extract(messages):
+            if should_audit():
+                schedule_audit(messages, request.existing_memories, run_memory_extraction)
+            return MemoryExtractionResponse(memories=[])
+        memories = await run_memory_extraction(messages, request.existing_memories)
+        return MemoryExtractionResponse(memories=memories)
     except Exception as e:
-        print(f"Memory extraction error: {e}")
+        logger.warning("Memory extraction error", extra={"error": str(e)})
         raise HTTPException(status_code=500, detail=f"Memory extraction failed: {str(e)}")
 
 # ============ USER MANAGEMENT API ============
@@ -1042,6 +1127,8 @@ async def create_user_profile(request: UserProfileRequest):
             display_name=request.displayName,
             photo_url=request.photoURL
         )
+        # A deleted account signing back in starts without memories; rebuilt lazily otherwise
+        drop_memory_index(request.uid)
         return {"success": True, "message": "User profile created"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create user: {str(e)}")
@@ -1078,6 +1165,122 @@ async def update_user_profile(user_id: str, request: UserProfileUpdateRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update user: {str(e)}")
 
+@app.delete("/user/{user_id}")
+async def delete_user_profile(user_id: str):
+    """Delete a user and all their data"""
+    try:
+        # Hidden immediately, the purge worker removes the data in batches
+        await mark_user_deleted(user_id)
+        drop_memory_index(user_id)
+        notify_purge_worker()
+        return {"success": True, "message": "User deletion scheduled"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to delete user: {str(e)}")
+
+# ============ DATA EXPORT ============
+EXPORT_CHUNK_BYTES = 64 * 1024
+# Exports streaming at once; each holds a database connection until it finishes
+EXPORT_MAX_CONCURRENT = int(os.getenv('EXPORT_MAX_CONCURRENT', '2'))
+# An export whose client takes longer than this to accept a chunk is aborted
+EXPORT_STALL_SECONDS = float(os.getenv('EXPORT_STALL_SECONDS', '30'))
+
+_export_slots = asyncio.Semaphore(EXPORT_MAX_CONCURRENT)
+
+class ExportResponse(StreamingResponse):
+    """
+    Streams an export while holding one of the export slots, or answers 429
+    when none is free. A client that stops reading would otherwise keep the
+    database cursor open for as long as the connection lives, so the stream
+    is cut after EXPORT_STALL_SECONDS.
+    """
+
+    async def stream_response(self, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        try:
+            async for chunk in self.body_iterator:
+                await asyncio.wait_for(
+                    send({"type": "http.response.body", "body": chunk, "more_body": True}),
+                    timeout=EXPORT_STALL_SECONDS
+                )
+        finally:
+            # Drops the database connection right away, also when the client is gone
+            await self.body_iterator.aclose()
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def __call__(self, scope, receive, send):
+        # Taken here rather than in the endpoint, so nothing between the two can leak a slot
+        if _export_slots.locked():
+            await self.body_iterator.aclose()
+            response = JSONResponse(
+                {"detail": "Too many exports in progress, try again shortly"},
+                status_code=429,
+                headers={"Retry-After": "30"}
+            )
+            await response(scope, receive, send)
+            return
+        await _export_slots.acquire()
+        try:
+            await super().__call__(scope, receive, send)
+        except asyncio.TimeoutError:
+            logger.warning("Export aborted, client stopped reading", extra={"stall_seconds": EXPORT_STALL_SECONDS})
+        finally:
+            _export_slots.release()
+
+def _export_json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+async def _export_ndjson(user_id: str):
+    """Encode export records as NDJSON, yielded in chunks of ~EXPORT_CHUNK_BYTES"""
+    buffer = []
+    size = 0
+    async for record in iter_user_export(user_id):
+        line = (json.dumps(record, default=_export_json_default, ensure_ascii=False) + "\n").encode('utf-8')
+        buffer.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield b"".join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b"".join(buffer)
+
+async def _gzip_stream(chunks):
+    """Gzip a byte stream incrementally"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+@app.get("/user/{user_id}/export")
+async def export_user_data(user_id: str, gzip: bool = False):
+    """Stream all of a user's conversations, messages and memories as NDJSON"""
+    try:
+        user = await get_user(user_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to export user data: {str(e)}")
+    
+    body = _export_ndjson(user_id)
+    filename = f"kriyan-export-{user_id}.ndjson"
+    media_type = "application/x-ndjson"
+    if gzip:
+        body = _gzip_stream(body)
+        filename += ".gz"
+        media_type = "application/gzip"
+    
+    return ExportResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 # ============ CONVERSATION MANAGEMENT API ============
 
 class ConversationCreateRequest(BaseModel):
@@ -1101,7 +1304,6 @@ class MessageRequest(BaseModel):
 async def create_new_conversation(request: ConversationCreateRequest):
     """Create a new conversation"""
     try:
-        print(f"📝 Creating conversation: userId={request.userId}, persona={request.personaName}, model={request.model}")
         conversation_id = await create_conversation(
             user_id=request.userId,
             persona_name=request.personaName,
@@ -1109,28 +1311,40 @@ async def create_new_conversation(request: ConversationCreateRequest):
             model=request.model,
             encrypted=request.encrypted or False
         )
-        print(f"✅ Conversation created: {conversation_id}")
+        logger.info("Conversation created", extra={
+            "conversation_id": conversation_id, "persona": request.personaName, "model": request.model
+        })
+        if request.title.strip() in PLACEHOLDER_TITLES and not request.encrypted:
+            # The post-turn enrichment names it after the first exchange
+            note_untitled_conversation(conversation_id)
         return {"success": True, "conversationId": conversation_id}
     except Exception as e:
-        print(f"❌ Failed to create conversation: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Failed to create conversation")
         raise HTTPException(status_code=500, detail=f"Failed to create conversation: {str(e)}")
 
-@app.get("/conversation/{conversation_id}")
-async def get_conversation_detail(conversation_id: str):
-    """Get conversation with messages"""
+async def load_messages(conversation_id: str, since: Optional[str]) -> List[Dict]:
+    """All messages, or only those after the since message id when the client has the rest"""
+    if not since:
+        return await get_conversation_messages(conversation_id)
+    messages = await get_conversation_messages_since(conversation_id, since)
+    if messages is None:
+        raise HTTPException(status_code=404, detail=f"Message '{since}' not found in this conversation")
+    return messages
+
+@app.get("/conversation/{conversation_id}", dependencies=[conversation_conditional_get])
+async def get_conversation_detail(conversation_id: str, response: Response, since: Optional[str] = None):
+    """Get conversation with messages (only those after ?since=<messageId> in delta mode)"""
     try:
         conversation = await get_conversation(conversation_id)
         if not conversation:
             raise HTTPException(status_code=404, detail="Conversation not found")
         
-        messages = await get_conversation_messages(conversation_id)
+        messages = await load_messages(conversation_id, since)
         
-        return {
+        return fast_json({
             **conversation,
             "messages": messages
-        }
+        }, response)
     except HTTPException:
         raise
     except Exception as e:
@@ -1141,14 +1355,14 @@ async def get_user_conversation_list(user_id: str):
     """Get all conversations for a user"""
     try:
         conversations = await get_user_conversations(user_id)
+        last_messages = await get_last_messages(user_id)
         
-        # Get message counts for each conversation
         for conv in conversations:
-            messages = await get_conversation_messages(conv['id'])
-            conv['messageCount'] = len(messages)
-            # Get last message preview
-            if messages:
-                conv['lastMessage'] = messages[-1]['content'][:100]
+            conv['messageCount'] = conv['message_count']
+            # Last message preview
+            last = last_messages.get(conv['id'])
+            if last:
+                conv['lastMessage'] = last['content'][:100]
         
         return conversations
     except Exception as e:
@@ -1176,6 +1390,8 @@ async def delete_conversation_endpoint(conversation_id: str):
     """Delete a conversation"""
     try:
         await delete_conversation(conversation_id)
+        forget_conversation(conversation_id)
+        notify_purge_worker()
         return {"success": True, "message": "Conversation deleted"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete conversation: {str(e)}")
@@ -1190,19 +1406,84 @@ async def add_conversation_message(request: MessageRequest):
             content=request.content,
             encrypted=request.encrypted or False
         )
+        if message_id is None:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        if request.role == 'assistant' and not request.encrypted:
+            # Title, memories and summary are filled in by one background pass every few turns
+            note_completed_turn(request.conversationId, generate_structured)
         return {"success": True, "messageId": message_id}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to add message: {str(e)}")
 
-@app.get("/conversation/{conversation_id}/messages")
-async def get_conversation_message_list(conversation_id: str):
-    """Get all messages for a conversation"""
+@app.get("/conversation/{conversation_id}/messages", dependencies=[conversation_conditional_get])
+async def get_conversation_message_list(conversation_id: str, response: Response, since: Optional[str] = None):
+    """Get all messages for a conversation (only those after ?since=<messageId> in delta mode)"""
     try:
-        messages = await get_conversation_messages(conversation_id)
-        return messages
+        messages = await load_messages(conversation_id, since)
+        return fast_json(messages, response)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get messages: {str(e)}")
 
+# ============ SEARCH API ============
+
+class SearchResult(BaseModel):
+    conversationId: str
+    messageId: Optional[str] = None
+    title: str
+    personaName: str
+    role: Optional[str] = None
+    matchedIn: str
+    snippet: str
+    score: float
+    createdAt: datetime
+
+class SearchResponse(BaseModel):
+    query: str
+    results: List[SearchResult]
+    nextOffset: Optional[int] = None
+
+@app.get("/search", response_model=SearchResponse)
+async def search_conversations(
+    user_id: str,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=50),
+    offset: int = Query(0, ge=0)
+):
+    """Search a user's conversation titles and messages"""
+    try:
+        terms = extract_terms(q)
+        if not terms:
+            return SearchResponse(query=q, results=[])
+        
+        # Fetch one extra row to know whether there is a next page
+        rows = await search_user_messages(user_id, " ".join(terms), limit + 1, offset)
+        results = [
+            SearchResult(
+                conversationId=row['conversation_id'],
+                messageId=row['message_id'],
+                title=row['title'],
+                personaName=row['persona_name'],
+                role=row['role'],
+                matchedIn=row['matched_in'],
+                snippet=highlight_snippet(row['content'], terms),
+                score=float(row['score']),
+                createdAt=row['created_at']
+            )
+            for row in rows[:limit]
+        ]
+        
+        return SearchResponse(
+            query=q,
+            results=results,
+            nextOffset=offset + limit if len(rows) > limit else None
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+
 # ============ MEMORY MANAGEMENT API ============
 
 class MemoryCreateRequest(BaseModel):
@@ -1215,14 +1496,16 @@ class MemoryUpdateRequest(BaseModel):
 
 @app.post("/memory/create")
 async def create_user_memory(request: MemoryCreateRequest):
-    """Create a new memory"""
+    """Create a new memory, or point at the existing one it near-duplicates"""
     try:
-        memory_id = await create_memory(
+        memory = await create_memory(
             user_id=request.userId,
             content=request.content,
             category=request.category or 'general'
         )
-        return {"success": True, "memoryId": memory_id}
+        if memory['status'] != 'duplicate':
+            index_memory(request.userId, memory['id'], memory['content'])
+        return {"success": True, "memoryId": memory['id'], "status": memory['status']}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create memory: {str(e)}")
 
@@ -1240,6 +1523,7 @@ async def update_user_memory(memory_id: str, request: MemoryUpdateRequest):
     """Update a memory"""
     try:
         await update_memory(memory_id, request.content)
+        reindex_memory(memory_id, request.content)
         return {"success": True, "message": "Memory updated"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update memory: {str(e)}")
@@ -1249,6 +1533,7 @@ async def delete_user_memory(memory_id: str):
     """Delete a memory"""
     try:
         await delete_memory(memory_id)
+        unindex_memory(memory_id)
         return {"success": True, "message": "Memory deleted"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete memory: {str(e)}")
@@ -1285,6 +1570,63 @@ async def update_settings(user_id: str, request: SettingsUpdateRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update settings: {str(e)}")
 
+# ============ MAINTENANCE API ============
+
+@app.get("/maintenance/purge")
+async def get_purge_progress():
+    """Progress of the background purge of deleted conversations and users"""
+    try:
+        return await get_purge_stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get purge stats: {str(e)}")
+
+@app.get("/maintenance/memory-filter")
+async def get_memory_filter_progress():
+    """Skip rate and estimated false negatives of the memory extraction pre-filter"""
+    return get_memory_filter_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Request, provider and storage metrics in the Prometheus text format"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# ============ DEBUG API ============
+
+# Token for the /debug endpoints, sent as X-Admin-Token; unset disables them
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+
+async def require_admin(x_admin_token: str = Header('')):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest(x_admin_token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@app.get("/debug/profile", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+async def get_profile(
+    seconds: float = Query(10.0, gt=0, le=PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(PROFILE_INTERVAL_MS, ge=1, le=1000)
+):
+    """Sample every thread's stack for the given seconds; collapsed stacks for flamegraph.pl or speedscope"""
+    try:
+        profiler = await run_profile(seconds, interval_ms / 1000)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(profiler.collapsed(), headers={
+        "Content-Disposition": f'attachment; filename="profile-{datetime.now():%Y%m%d-%H%M%S}.collapsed"',
+        "X-Profile-Samples": str(profiler.samples),
+    })
+
+@app.get("/debug/loop-stalls", dependencies=[Depends(require_admin)])
+async def get_loop_stall_report():
+    """Recent callbacks that held the event loop past the threshold, with their stacks"""
+    return get_loop_stalls()
+
+@app.put("/debug/loop-stalls", dependencies=[Depends(require_admin)])
+async def set_loop_stall_tracer(threshold_ms: float = Query(..., ge=0, le=60000)):
+    """Start the stall tracer at threshold_ms, or stop it with 0"""
+    set_loop_stall_threshold(threshold_ms)
+    return get_loop_stalls()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -7,9 +7,11 @@ CREATE TABLE IF NOT EXISTS users (
     subscription ENUM('free', 'pro') DEFAULT 'free',
     encryption_key_backup TEXT,
     encryption_key_salt VARCHAR(255),
+    deleted_at TIMESTAMP NULL DEFAULT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-    INDEX idx_email (email)
+    INDEX idx_email (email),
+    INDEX idx_deleted (deleted_at)
 );
 
 -- Conversations table
@@ -21,11 +23,19 @@ CREATE TABLE IF NOT EXISTS conversations (
     model VARCHAR(100) NOT NULL,
     is_pinned BOOLEAN DEFAULT FALSE,
     encrypted BOOLEAN DEFAULT FALSE,
+    archived BOOLEAN DEFAULT FALSE,
+    summary TEXT NULL,
+    memory_watermark INT UNSIGNED NOT NULL DEFAULT 0,
+    message_count INT UNSIGNED NOT NULL DEFAULT 0,
+    deleted_at TIMESTAMP NULL DEFAULT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     INDEX idx_user_updated (user_id, updated_at DESC),
-    INDEX idx_user_created (user_id, created_at DESC)
+    INDEX idx_user_created (user_id, created_at DESC),
+    INDEX idx_archived_updated (archived, updated_at),
+    INDEX idx_deleted (deleted_at),
+    FULLTEXT INDEX ft_title (title)
 );
 
 -- Messages table
@@ -35,9 +45,22 @@ CREATE TABLE IF NOT EXISTS messages (
     role ENUM('user', 'assistant') NOT NULL,
     content TEXT NOT NULL,
     encrypted BOOLEAN DEFAULT FALSE,
+    content_codec ENUM('none', 'zlib', 'zstd') DEFAULT 'none',
+    content_blob MEDIUMBLOB NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE CASCADE,
-    INDEX idx_conversation_created (conversation_id, created_at)
+    INDEX idx_conversation_created (conversation_id, created_at),
+    FULLTEXT INDEX ft_content (content)
+);
+
+-- Archived messages of idle conversations, one compressed JSON payload per conversation
+CREATE TABLE IF NOT EXISTS message_archive (
+    conversation_id VARCHAR(36) PRIMARY KEY,
+    codec ENUM('none', 'zlib', 'zstd') NOT NULL,
+    payload LONGBLOB NOT NULL,
+    message_count INT NOT NULL,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE CASCADE
 );
 
 -- User memories table
@@ -46,12 +69,24 @@ CREATE TABLE IF NOT EXISTS user_memories (
     user_id VARCHAR(128) NOT NULL,
     content TEXT NOT NULL,
     category VARCHAR(100) DEFAULT 'general',
+    minhash VARBINARY(256) NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     INDEX idx_user_updated (user_id, updated_at DESC)
 );
 
+-- LSH buckets of memory MinHash signatures, for near-duplicate lookups
+CREATE TABLE IF NOT EXISTS memory_lsh_buckets (
+    user_id VARCHAR(128) NOT NULL,
+    band TINYINT UNSIGNED NOT NULL,
+    bucket BIGINT NOT NULL,
+    memory_id VARCHAR(36) NOT NULL,
+    PRIMARY KEY (user_id, band, bucket, memory_id),
+    FOREIGN KEY (memory_id) REFERENCES user_memories(id) ON DELETE CASCADE,
+    INDEX idx_memory (memory_id)
+);
+
 -- User settings table
 CREATE TABLE IF NOT EXISTS user_settings (
     user_id VARCHAR(128) PRIMARY KEY,
@@ -61,3 +96,45 @@ CREATE TABLE IF NOT EXISTS user_settings (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
+
+-- ============ UPGRADING EXISTING DATABASES ============
+-- The MySQL backend applies these at startup (COLUMN_MIGRATIONS and
+-- INDEX_MIGRATIONS in db_utils.py); they are kept here for upgrading by hand.
+
+-- Message body compression (content_codec = 'none' keeps old rows readable)
+-- ALTER TABLE messages
+--     ADD COLUMN content_codec ENUM('none', 'zlib', 'zstd') DEFAULT 'none' AFTER encrypted,
+--     ADD COLUMN content_blob MEDIUMBLOB NULL AFTER content_codec;
+
+-- Cold-conversation archive (also create message_archive from above)
+-- ALTER TABLE conversations
+--     ADD COLUMN archived BOOLEAN DEFAULT FALSE AFTER encrypted,
+--     ADD INDEX idx_archived_updated (archived, updated_at);
+
+-- Soft delete with background purge
+-- ALTER TABLE users
+--     ADD COLUMN deleted_at TIMESTAMP NULL DEFAULT NULL AFTER encryption_key_salt,
+--     ADD INDEX idx_deleted (deleted_at);
+-- ALTER TABLE conversations
+--     ADD COLUMN deleted_at TIMESTAMP NULL DEFAULT NULL AFTER archived,
+--     ADD INDEX idx_deleted (deleted_at);
+
+-- Full-text search
+-- ALTER TABLE conversations ADD FULLTEXT INDEX ft_title (title);
+-- ALTER TABLE messages ADD FULLTEXT INDEX ft_content (content);
+
+-- Near-duplicate memory suppression (also create memory_lsh_buckets from above;
+-- existing memories get signatures from the startup backfill)
+-- ALTER TABLE user_memories ADD COLUMN minhash VARBINARY(256) NULL AFTER category;
+
+-- Incremental memory extraction (messages already mined per conversation)
+-- ALTER TABLE conversations ADD COLUMN memory_watermark INT UNSIGNED NOT NULL DEFAULT 0 AFTER archived;
+
+-- Post-turn enrichment (rolling conversation summary)
+-- ALTER TABLE conversations ADD COLUMN summary TEXT NULL AFTER archived;
+
+-- Conditional GETs on conversations (message count is part of the ETag)
+-- ALTER TABLE conversations ADD COLUMN message_count INT UNSIGNED NOT NULL DEFAULT 0 AFTER memory_watermark;
+-- UPDATE conversations SET message_count =
+--     (SELECT COUNT(*) FROM messages WHERE messages.conversation_id = conversations.id)
+--     + COALESCE((SELECT message_count FROM message_archive WHERE message_archive.conversation_id = conversations.id), 0);
@@ -0,0 +1,123 @@
+-- SQLite schema for the embedded storage backend (STORAGE_BACKEND=sqlite)
+-- Mirrors schema.sql; applied automatically by utilities/sqlite_utils.py on startup.
+-- Timestamps are stored as ISO-8601 text with millisecond precision.
+
+-- Users table
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    email TEXT NOT NULL UNIQUE,
+    display_name TEXT,
+    photo_url TEXT,
+    subscription TEXT DEFAULT 'free' CHECK (subscription IN ('free', 'pro')),
+    encryption_key_backup TEXT,
+    encryption_key_salt TEXT,
+    deleted_at TIMESTAMP DEFAULT NULL,
+    created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+    updated_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE INDEX IF NOT EXISTS idx_users_deleted ON users (deleted_at);
+
+-- Conversations table
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    persona_name TEXT NOT NULL,
+    title TEXT NOT NULL,
+    model TEXT NOT NULL,
+    is_pinned BOOLEAN DEFAULT 0,
+    encrypted BOOLEAN DEFAULT 0,
+    archived BOOLEAN DEFAULT 0,
+    summary TEXT,
+    memory_watermark INTEGER NOT NULL DEFAULT 0,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    deleted_at TIMESTAMP DEFAULT NULL,
+    created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+    updated_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE INDEX IF NOT EXISTS idx_conversations_user_updated ON conversations (user_id, updated_at DESC);
+CREATE INDEX IF NOT EXISTS idx_conversations_user_created ON conversations (user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_conversations_archived_updated ON conversations (archived, updated_at);
+CREATE INDEX IF NOT EXISTS idx_conversations_deleted ON conversations (deleted_at);
+
+-- Messages table
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    conversation_id TEXT NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+    role TEXT NOT NULL CHECK (role IN ('user', 'assistant')),
+    content TEXT NOT NULL,
+    encrypted BOOLEAN DEFAULT 0,
+    content_codec TEXT DEFAULT 'none' CHECK (content_codec IN ('none', 'zlib', 'zstd')),
+    content_blob BLOB,
+    created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_created ON messages (conversation_id, created_at);
+
+-- Archived messages of idle conversations, one compressed JSON payload per conversation
+CREATE TABLE IF NOT EXISTS message_archive (
+    conversation_id TEXT PRIMARY KEY REFERENCES conversations(id) ON DELETE CASCADE,
+    codec TEXT NOT NULL CHECK (codec IN ('none', 'zlib', 'zstd')),
+    payload BLOB NOT NULL,
+    message_count INTEGER NOT NULL,
+    archived_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+
+-- User memories table
+CREATE TABLE IF NOT EXISTS user_memories (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    content TEXT NOT NULL,
+    category TEXT DEFAULT 'general',
+    minhash BLOB,
+    created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+    updated_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE INDEX IF NOT EXISTS idx_memories_user_updated ON user_memories (user_id, updated_at DESC);
+
+-- LSH buckets of memory MinHash signatures, for near-duplicate lookups
+CREATE TABLE IF NOT EXISTS memory_lsh_buckets (
+    user_id TEXT NOT NULL,
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    memory_id TEXT NOT NULL REFERENCES user_memories(id) ON DELETE CASCADE,
+    PRIMARY KEY (user_id, band, bucket, memory_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_memory_lsh_memory ON memory_lsh_buckets (memory_id);
+
+-- User settings table
+CREATE TABLE IF NOT EXISTS user_settings (
+    user_id TEXT PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    memory_enabled BOOLEAN DEFAULT 0,
+    theme TEXT DEFAULT 'dark',
+    created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+    updated_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+
+-- Full-text search (external-content FTS5 tables kept in sync by triggers)
+-- They are keyed on rowid, which VACUUM may renumber: after a manual VACUUM run
+--   INSERT INTO conversations_fts (conversations_fts) VALUES ('rebuild');
+--   INSERT INTO messages_fts (messages_fts) VALUES ('rebuild');
+CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts USING fts5 (
+    title, content='conversations', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS conversations_fts_insert AFTER INSERT ON conversations BEGIN
+    INSERT INTO conversations_fts (rowid, title) VALUES (new.rowid, new.title);
+END;
+CREATE TRIGGER IF NOT EXISTS conversations_fts_delete AFTER DELETE ON conversations BEGIN
+    INSERT INTO conversations_fts (conversations_fts, rowid, title) VALUES ('delete', old.rowid, old.title);
+END;
+CREATE TRIGGER IF NOT EXISTS conversations_fts_update AFTER UPDATE OF title ON conversations BEGIN
+    INSERT INTO conversations_fts (conversations_fts, rowid, title) VALUES ('delete', old.rowid, old.title);
+    INSERT INTO conversations_fts (rowid, title) VALUES (new.rowid, new.title);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5 (
+    content, content='messages', content_rowid='rowid'
+);
+-- Per-term document counts, used to skip ranking on near-universal terms
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts_vocab USING fts5vocab (messages_fts, 'row');
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, content) VALUES (new.rowid, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+END;
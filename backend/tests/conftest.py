@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Chosen at import time by the storage and logging modules, so set before any test imports them
+os.environ['STORAGE_BACKEND'] = 'sqlite'
+os.environ['SQLITE_PATH'] = ':memory:'
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,187 @@
+"""
+SQLite backend behaviour the MySQL backend shares: archive and promote,
+soft delete and purge, search paging and memory de-duplication. Each test
+runs against a fresh in-memory database.
+"""
+import asyncio
+
+import httpx
+
+from utilities import sqlite_utils as db
+
+def run(test):
+    """Run an async test body against a fresh in-memory database"""
+    async def body():
+        db._message_count = (0, 0.0)
+        await db.init_db_pool()
+        try:
+            await test()
+        finally:
+            await db.close_db_pool()
+    asyncio.run(body())
+
+async def new_conversation(user_id='u1', title='Chat'):
+    if not await db.get_user(user_id):
+        await db.create_user(user_id, f'{user_id}@example.com', 'Tester')
+    return await db.create_conversation(user_id, 'Kira', title, 'gpt-4o-mini')
+
+async def add_messages(conversation_id, count, text='message'):
+    ids = []
+    for i in range(count):
+        role = 'user' if i % 2 == 0 else 'assistant'
+        ids.append(await db.add_message(conversation_id, role, f'{text} {i}'))
+        # Timestamps have millisecond resolution; ties would fall back to the random ids
+        await asyncio.sleep(0.002)
+    return ids
+
+# ============ ARCHIVE ============
+
+def test_messages_survive_archive_and_promote():
+    async def test():
+        conversation_id = await new_conversation()
+        ids = await add_messages(conversation_id, 5)
+
+        assert await db.archive_conversation(conversation_id) == 4
+        assert [msg['id'] for msg in await db.get_conversation_messages(conversation_id)] == ids
+        # The newest message stays hot for the conversation list
+        last = await db.get_last_messages('u1')
+        assert last[conversation_id]['id'] == ids[-1]
+
+        assert await db.promote_conversation(conversation_id) == 4
+        messages = await db.get_conversation_messages(conversation_id)
+        assert [msg['id'] for msg in messages] == ids
+        assert messages[0]['content'] == 'message 0'
+        assert not (await db.get_conversation(conversation_id))['archived']
+        # Promoting twice is a no-op
+        assert await db.promote_conversation(conversation_id) == 0
+    run(test)
+
+def test_writing_to_an_archived_conversation_promotes_it():
+    async def test():
+        conversation_id = await new_conversation()
+        ids = await add_messages(conversation_id, 3)
+        await db.archive_conversation(conversation_id)
+
+        ids.append(await db.add_message(conversation_id, 'user', 'after archive'))
+        assert [msg['id'] for msg in await db.get_conversation_messages(conversation_id)] == ids
+        conversation = await db.get_conversation(conversation_id)
+        assert not conversation['archived']
+        assert conversation['message_count'] == 4
+    run(test)
+
+def test_archive_without_hot_messages_can_be_promoted():
+    async def test():
+        conversation_id = await new_conversation()
+        assert await db.archive_conversation(conversation_id) == 0
+        assert await db.promote_conversation(conversation_id) == 0
+        assert await db.get_conversation_messages(conversation_id) == []
+    run(test)
+
+# ============ SOFT DELETE AND PURGE ============
+
+def test_deleted_conversation_is_hidden_then_purged():
+    async def test():
+        conversation_id = await new_conversation()
+        await add_messages(conversation_id, 3)
+        await db.archive_conversation(conversation_id)
+        await db.delete_conversation(conversation_id)
+
+        assert await db.get_conversation_messages(conversation_id) == []
+        assert await db.add_message(conversation_id, 'user', 'too late') is None
+        assert await db.get_deleted_conversation_ids(10) == [conversation_id]
+        assert (await db.count_pending_purges())['conversations'] == 1
+
+        assert await db.purge_message_batch(conversation_id, 10) == 1
+        assert await db.purge_message_batch(conversation_id, 10) == 0
+        await db.purge_conversation_row(conversation_id)
+        assert await db.get_deleted_conversation_ids(10) == []
+        assert await db.get_conversation(conversation_id) is None
+    run(test)
+
+def test_deleted_user_is_purged_after_conversations():
+    async def test():
+        conversation_id = await new_conversation()
+        await db.create_memory('u1', 'User lives in Lisbon')
+        await db.mark_user_deleted('u1')
+
+        assert await db.get_user('u1') is None
+        # Conversations go first
+        assert await db.get_purgeable_user_ids(10) == []
+        assert await db.get_deleted_conversation_ids(10) == [conversation_id]
+        await db.purge_message_batch(conversation_id, 10)
+        await db.purge_conversation_row(conversation_id)
+
+        assert await db.get_purgeable_user_ids(10) == ['u1']
+        assert await db.purge_memory_batch('u1', 10) == 1
+        await db.purge_user_row('u1')
+        assert await db.count_pending_purges() == {'conversations': 0, 'users': 0}
+    run(test)
+
+def test_recreated_user_starts_over():
+    async def test():
+        await new_conversation()
+        await db.create_memory('u1', 'User lives in Lisbon')
+        await db.mark_user_deleted('u1')
+
+        await db.create_user('u1', 'u1@example.com', 'Tester Again')
+        user = await db.get_user('u1')
+        assert user['display_name'] == 'Tester Again'
+        assert await db.get_user_memories('u1') == []
+        assert await db.get_user_conversations('u1') == []
+    run(test)
+
+# ============ SEARCH ============
+
+def test_search_pages_with_next_offset():
+    async def test():
+        import main
+        conversation_id = await new_conversation()
+        await add_messages(conversation_id, 5, text='zebra crossing')
+        await add_messages(conversation_id, 3, text='unrelated')
+
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            pages = []
+            offset = 0
+            while offset is not None:
+                response = await client.get('/search', params={'user_id': 'u1', 'q': 'zebra', 'limit': 2, 'offset': offset})
+                assert response.status_code == 200
+                page = response.json()
+                pages.append(page['results'])
+                offset = page['nextOffset']
+
+        assert [len(page) for page in pages] == [2, 2, 1]
+        assert {result['messageId'] for page in pages for result in page} == {
+            msg['id'] for msg in await db.get_conversation_messages(conversation_id) if 'zebra' in msg['content']
+        }
+    run(test)
+
+def test_search_skips_deleted_conversations():
+    async def test():
+        conversation_id = await new_conversation()
+        await add_messages(conversation_id, 2, text='zebra crossing')
+        assert len(await db.search_user_messages('u1', 'zebra', 10, 0)) == 2
+        await db.delete_conversation(conversation_id)
+        assert await db.search_user_messages('u1', 'zebra', 10, 0) == []
+    run(test)
+
+# ============ MEMORIES ============
+
+def test_create_memory_statuses():
+    async def test():
+        await db.create_user('u1', 'u1@example.com', 'Tester')
+        created = await db.create_memory('u1', 'User has a dog named Biscuit')
+        assert created['status'] == 'created'
+
+        duplicate = await db.create_memory('u1', 'user has a dog named biscuit')
+        assert duplicate == {'id': created['id'], 'content': created['content'], 'status': 'duplicate'}
+
+        merged = await db.create_memory('u1', 'User has a dog named Biscuit who is a beagle')
+        assert merged['status'] == 'merged'
+        assert merged['id'] == created['id']
+
+        other = await db.create_memory('u1', 'User works as a nurse in Porto')
+        assert other['status'] == 'created'
+        contents = sorted(memory['content'] for memory in await db.get_user_memories('u1'))
+        assert contents == ['User has a dog named Biscuit who is a beagle', 'User works as a nurse in Porto']
+    run(test)
@@ -11,6 +11,11 @@ from utilities.config_loader import load_current_language, config
 import openai
 import os
 
+from utilities.log_utils import get_logger
+from utilities.provider_utils import provider_call
+
+logger = get_logger(__name__)
+
 current_language = load_current_language()
 internet_access = config['INTERNET_ACCESS']
 
@@ -52,7 +57,7 @@ async def search(prompt):
                                        params={'query': search_query, 'limit': search_results_limit}) as response:
                     search = await response.json()
         except aiohttp.ClientError as e:
-            print(f"An error occurred during the search request: {e}")
+            logger.warning("Search request failed", extra={"error": str(e)})
             return
 
         for index, result in enumerate(search):
@@ -79,23 +84,29 @@ async def generate_response(instructions, search, history, filecontent):
             *history,
             {"role": "system", "name": "search_results", "content": search_results},
         ]
-    response = openai.ChatCompletion.create(
-        model=config['GPT_MODEL'],
-        messages=messages
-    )
-    message = response.choices[0].message.content
-    return message
+
+    async def call():
+        response = openai.ChatCompletion.create(
+            model=config['GPT_MODEL'],
+            messages=messages
+        )
+        return response.choices[0].message.content
+
+    return await provider_call("openai", config['GPT_MODEL'], messages, {}, call)
 
 async def generate_gpt4_response(prompt):
     messages = [
             {"role": "system", "name": "admin_user", "content": prompt},
         ]
-    response = openai.ChatCompletion.create(
-        model='gpt-4',
-        messages=messages
-    )
-    message = response.choices[0].message.content
-    return message
+
+    async def call():
+        response = openai.ChatCompletion.create(
+            model='gpt-4',
+            messages=messages
+        )
+        return response.choices[0].message.content
+
+    return await provider_call("openai", 'gpt-4', messages, {}, call)
 
 async def poly_image_gen(session, prompt):
     seed = random.randint(1, 100000)
@@ -0,0 +1,114 @@
+"""
+Message body compression helpers
+"""
+import os
+import zlib
+import json
+from datetime import datetime
+from typing import Optional, Tuple, Dict, Any, List
+
+from utilities.log_utils import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, zlib is always available
+    zstandard = None
+
+# Codec used for new message bodies: 'none', 'zlib' or 'zstd'
+MESSAGE_COMPRESSION = os.getenv('MESSAGE_COMPRESSION', 'none').lower()
+# Bodies shorter than this (in UTF-8 bytes) are stored as plain text
+MESSAGE_COMPRESSION_MIN_BYTES = int(os.getenv('MESSAGE_COMPRESSION_MIN_BYTES', '1024'))
+
+CODEC_NONE = 'none'
+CODEC_ZLIB = 'zlib'
+CODEC_ZSTD = 'zstd'
+
+_ZLIB_LEVEL = 6
+_ZSTD_LEVEL = 9
+
+if MESSAGE_COMPRESSION == CODEC_ZSTD and zstandard is None:
+    logger.warning("MESSAGE_COMPRESSION=zstd but 'zstandard' is not installed, using zlib")
+    MESSAGE_COMPRESSION = CODEC_ZLIB
+
+# Archived conversations are always compressed, with the best codec available
+ARCHIVE_CODEC = CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+
+def compress_bytes(data: bytes, codec: str) -> bytes:
+    """Compress raw bytes with the given codec"""
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=_ZSTD_LEVEL).compress(data)
+    if codec == CODEC_ZLIB:
+        return zlib.compress(data, _ZLIB_LEVEL)
+    return data
+
+def decompress_bytes(data: bytes, codec: str) -> bytes:
+    """Decompress raw bytes written by compress_bytes"""
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Row is zstd-compressed but 'zstandard' is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(data)
+    return data
+
+def encode_content(
+    content: str,
+    encrypted: bool = False,
+    codec: Optional[str] = None
+) -> Tuple[str, Optional[bytes]]:
+    """
+    Encode a message body for storage.
+
+    Returns (codec, blob). When codec is 'none' the body should be stored
+    as-is in the text column and blob is None.
+    """
+    codec = codec or MESSAGE_COMPRESSION
+    # Client-side ciphertext does not compress, so don't spend CPU on it
+    if codec == CODEC_NONE or encrypted:
+        return CODEC_NONE, None
+
+    raw = content.encode('utf-8')
+    if len(raw) < MESSAGE_COMPRESSION_MIN_BYTES:
+        return CODEC_NONE, None
+
+    blob = compress_bytes(raw, codec)
+    if len(blob) >= len(raw):
+        return CODEC_NONE, None
+    return codec, blob
+
+def decode_content(content: Optional[str], codec: Optional[str], blob: Optional[bytes]) -> str:
+    """Decode a stored message body back to text"""
+    if not codec or codec == CODEC_NONE or blob is None:
+        return content or ''
+    return decompress_bytes(bytes(blob), codec).decode('utf-8')
+
+def decode_message_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Replace the storage columns of a messages row with the plain content"""
+    codec = row.pop('content_codec', None)
+    blob = row.pop('content_blob', None)
+    row['content'] = decode_content(row.get('content'), codec, blob)
+    return row
+
+def pack_archive(messages: List[Dict[str, Any]]) -> bytes:
+    """Serialize decoded message rows into a compressed archive payload"""
+    rows = [
+        {
+            'id': msg['id'],
+            'conversation_id': msg['conversation_id'],
+            'role': msg['role'],
+            'content': msg['content'],
+            'encrypted': bool(msg['encrypted']),
+            'created_at': msg['created_at'].isoformat(),
+        }
+        for msg in messages
+    ]
+    return compress_bytes(json.dumps(rows).encode('utf-8'), ARCHIVE_CODEC)
+
+def unpack_archive(archive: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Rebuild message rows from an archive payload"""
+    rows = json.loads(decompress_bytes(bytes(archive['payload']), archive['codec']))
+    for row in rows:
+        row['created_at'] = datetime.fromisoformat(row['created_at'])
+    return rows
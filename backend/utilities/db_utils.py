@@ -2,12 +2,25 @@
 MySQL Database Utilities
 """
 import os
+import time
 import aiomysql
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator
 from contextlib import asynccontextmanager
 import uuid
 from datetime import datetime
 
+from utilities.compression_utils import (
+    encode_content, decode_message_row, pack_archive, unpack_archive,
+    CODEC_NONE, ARCHIVE_CODEC
+)
+from utilities.minhash_utils import (
+    minhash_signature, band_buckets, closest_duplicate, merge_memory_content
+)
+from utilities.metrics_utils import DB_POOL_WAIT_SECONDS
+from utilities.log_utils import get_logger
+
+logger = get_logger(__name__)
+
 # Database configuration from environment
 DB_CONFIG = {
     'host': os.getenv('MYSQL_HOST', 'localhost'),
@@ -19,11 +32,81 @@ DB_CONFIG = {
     'charset': 'utf8mb4',
 }
 
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'schema.sql')
+
+# Columns added after the first release, for databases created before them
+# (the UPGRADING section of schema.sql): (table, column, statements...)
+COLUMN_MIGRATIONS = (
+    ('messages', 'content_codec',
+     """ALTER TABLE messages
+        ADD COLUMN content_codec ENUM('none', 'zlib', 'zstd') DEFAULT 'none' AFTER encrypted,
+        ADD COLUMN content_blob MEDIUMBLOB NULL AFTER content_codec"""),
+    ('conversations', 'archived',
+     """ALTER TABLE conversations
+        ADD COLUMN archived BOOLEAN DEFAULT FALSE AFTER encrypted,
+        ADD INDEX idx_archived_updated (archived, updated_at)"""),
+    ('users', 'deleted_at',
+     """ALTER TABLE users
+        ADD COLUMN deleted_at TIMESTAMP NULL DEFAULT NULL AFTER encryption_key_salt,
+        ADD INDEX idx_deleted (deleted_at)"""),
+    ('conversations', 'deleted_at',
+     """ALTER TABLE conversations
+        ADD COLUMN deleted_at TIMESTAMP NULL DEFAULT NULL AFTER archived,
+        ADD INDEX idx_deleted (deleted_at)"""),
+    ('user_memories', 'minhash', "ALTER TABLE user_memories ADD COLUMN minhash VARBINARY(256) NULL AFTER category"),
+    ('conversations', 'memory_watermark',
+     "ALTER TABLE conversations ADD COLUMN memory_watermark INT UNSIGNED NOT NULL DEFAULT 0 AFTER archived"),
+    ('conversations', 'summary', "ALTER TABLE conversations ADD COLUMN summary TEXT NULL AFTER archived"),
+    ('conversations', 'message_count',
+     "ALTER TABLE conversations ADD COLUMN message_count INT UNSIGNED NOT NULL DEFAULT 0 AFTER memory_watermark",
+     """UPDATE conversations SET message_count =
+        (SELECT COUNT(*) FROM messages WHERE messages.conversation_id = conversations.id)
+        + COALESCE((SELECT message_count FROM message_archive WHERE message_archive.conversation_id = conversations.id), 0)"""),
+)
+# Indexes added after the first release: (table, index, statement)
+INDEX_MIGRATIONS = (
+    ('conversations', 'ft_title', "ALTER TABLE conversations ADD FULLTEXT INDEX ft_title (title)"),
+    ('messages', 'ft_content', "ALTER TABLE messages ADD FULLTEXT INDEX ft_content (content)"),
+)
+
 # Connection pool
 _pool: Optional[aiomysql.Pool] = None
 
+def _schema_statements() -> List[str]:
+    with open(SCHEMA_FILE, 'r', encoding='utf-8') as f:
+        lines = [line for line in f if not line.lstrip().startswith('--')]
+    return [statement.strip() for statement in "".join(lines).split(';') if statement.strip()]
+
+async def _migrate():
+    """Create missing tables, then add the columns and indexes older databases lack"""
+    async with get_db_connection() as cursor:
+        for statement in _schema_statements():
+            await cursor.execute(statement)
+        
+        for table, column, *statements in COLUMN_MIGRATIONS:
+            await cursor.execute(
+                """SELECT 1 FROM information_schema.COLUMNS
+                   WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s""",
+                (table, column)
+            )
+            if not await cursor.fetchone():
+                logger.info("Migrating database", extra={"table": table, "column": column})
+                for statement in statements:
+                    await cursor.execute(statement)
+        
+        for table, index, statement in INDEX_MIGRATIONS:
+            await cursor.execute(
+                """SELECT 1 FROM information_schema.STATISTICS
+                   WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s""",
+                (table, index)
+            )
+            if not await cursor.fetchone():
+                # Builds the index over the whole table, slow on a large one
+                logger.info("Migrating database", extra={"table": table, "index": index})
+                await cursor.execute(statement)
+
 async def init_db_pool():
-    """Initialize database connection pool"""
+    """Initialize database connection pool and bring the schema up to date"""
     global _pool
     if _pool is None:
         _pool = await aiomysql.create_pool(
@@ -31,7 +114,10 @@ async def init_db_pool():
             maxsize=10,
             **DB_CONFIG
         )
-        print(f"✅ MySQL connection pool created: {DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['db']}")
+        logger.info("MySQL connection pool created", extra={
+            "host": DB_CONFIG['host'], "port": DB_CONFIG['port'], "database": DB_CONFIG['db']
+        })
+        await _migrate()
 
 async def close_db_pool():
     """Close database connection pool"""
@@ -40,24 +126,112 @@ async def close_db_pool():
         _pool.close()
         await _pool.wait_closed()
         _pool = None
-        print("✅ MySQL connection pool closed")
+        logger.info("MySQL connection pool closed")
 
 @asynccontextmanager
-async def get_db_connection():
-    """Get database connection from pool"""
+async def _acquire():
+    """Take a connection from the pool, recording how long the wait was"""
     if _pool is None:
         await init_db_pool()
     
+    start = time.perf_counter()
     async with _pool.acquire() as conn:
+        DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - start, backend='mysql')
+        yield conn
+
+@asynccontextmanager
+async def get_db_connection():
+    """Get database connection from pool"""
+    async with _acquire() as conn:
         async with conn.cursor(aiomysql.DictCursor) as cursor:
             yield cursor
             await conn.commit()
 
+@asynccontextmanager
+async def get_db_transaction():
+    """Get a cursor whose statements run in a single transaction"""
+    async with _acquire() as conn:
+        await conn.begin()
+        try:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                yield cursor
+            await conn.commit()
+        except BaseException:
+            await conn.rollback()
+            raise
+
+async def _start_snapshot(conn):
+    # Every read until commit sees the same data, even across statements
+    async with conn.cursor() as cursor:
+        await cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        await cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+
+@asynccontextmanager
+async def get_db_snapshot():
+    """Get a cursor whose reads all come from one consistent snapshot"""
+    async with _acquire() as conn:
+        await _start_snapshot(conn)
+        try:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                yield cursor
+        finally:
+            await conn.commit()
+
+@asynccontextmanager
+async def get_db_stream():
+    """
+    Get an unbuffered server-side cursor reading one consistent snapshot,
+    rows are fetched as they are read. If the reader stops early the
+    connection is dropped, which aborts the query; closing the cursor would
+    first read the rest of the result set.
+    """
+    async with _acquire() as conn:
+        await _start_snapshot(conn)
+        cursor = await conn.cursor(aiomysql.SSDictCursor)
+        try:
+            yield cursor
+        except BaseException:
+            conn.close()
+            raise
+        await cursor.close()
+        await conn.commit()
+
+# Rows pulled from a server-side cursor per round trip
+STREAM_FETCH_SIZE = 500
+
+async def _stream_rows(cursor, query: str, args: tuple) -> AsyncIterator[Dict[str, Any]]:
+    await cursor.execute(query, args)
+    while True:
+        rows = await cursor.fetchmany(STREAM_FETCH_SIZE)
+        if not rows:
+            break
+        for row in rows:
+            yield row
+
 # ============ USER FUNCTIONS ============
 
 async def create_user(user_id: str, email: str, display_name: str, photo_url: Optional[str] = None):
-    """Create a new user"""
-    async with get_db_connection() as cursor:
+    """Create a new user, or start a deleted one over as a new account"""
+    async with get_db_transaction() as cursor:
+        await cursor.execute(
+            "SELECT deleted_at FROM users WHERE id = %s FOR UPDATE",
+            (user_id,)
+        )
+        existing = await cursor.fetchone()
+        if existing and existing['deleted_at']:
+            # Signed back in before the purge finished: nothing of the old account
+            # carries over, its conversations stay deleted for the purge worker
+            await cursor.execute("DELETE FROM user_memories WHERE user_id = %s", (user_id,))
+            await cursor.execute("DELETE FROM user_settings WHERE user_id = %s", (user_id,))
+            await cursor.execute(
+                """UPDATE users SET display_name = %s, photo_url = %s, subscription = 'free',
+                   encryption_key_backup = NULL, encryption_key_salt = NULL, deleted_at = NULL,
+                   created_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                   WHERE id = %s""",
+                (display_name, photo_url, user_id)
+            )
+            return
+        
         await cursor.execute(
             """INSERT INTO users (id, email, display_name, photo_url, subscription)
                VALUES (%s, %s, %s, %s, 'free')
@@ -72,11 +246,25 @@ async def get_user(user_id: str) -> Optional[Dict[str, Any]]:
     """Get user by ID"""
     async with get_db_connection() as cursor:
         await cursor.execute(
-            "SELECT * FROM users WHERE id = %s",
+            "SELECT * FROM users WHERE id = %s AND deleted_at IS NULL",
             (user_id,)
         )
         return await cursor.fetchone()
 
+async def mark_user_deleted(user_id: str):
+    """Hide a user and all their conversations, the purge worker removes the data"""
+    async with get_db_transaction() as cursor:
+        await cursor.execute(
+            "UPDATE users SET deleted_at = CURRENT_TIMESTAMP WHERE id = %s AND deleted_at IS NULL",
+            (user_id,)
+        )
+        await cursor.execute(
+            """UPDATE conversations 
+               SET deleted_at = CURRENT_TIMESTAMP, updated_at = updated_at 
+               WHERE user_id = %s AND deleted_at IS NULL""",
+            (user_id,)
+        )
+
 async def update_user(user_id: str, updates: Dict[str, Any]):
     """Update user profile"""
     if not updates:
@@ -113,7 +301,17 @@ async def get_conversation(conversation_id: str) -> Optional[Dict[str, Any]]:
     """Get conversation by ID"""
     async with get_db_connection() as cursor:
         await cursor.execute(
-            "SELECT * FROM conversations WHERE id = %s",
+            "SELECT * FROM conversations WHERE id = %s AND deleted_at IS NULL",
+            (conversation_id,)
+        )
+        return await cursor.fetchone()
+
+async def get_conversation_version(conversation_id: str) -> Optional[Dict[str, Any]]:
+    """The columns that change whenever the conversation or its messages do, by primary key"""
+    async with get_db_connection() as cursor:
+        await cursor.execute(
+            """SELECT updated_at, message_count, title, is_pinned, memory_watermark
+               FROM conversations WHERE id = %s AND deleted_at IS NULL""",
             (conversation_id,)
         )
         return await cursor.fetchone()
@@ -123,7 +321,7 @@ async def get_user_conversations(user_id: str) -> List[Dict[str, Any]]:
     async with get_db_connection() as cursor:
         await cursor.execute(
             """SELECT * FROM conversations 
-               WHERE user_id = %s 
+               WHERE user_id = %s AND deleted_at IS NULL 
                ORDER BY updated_at DESC""",
             (user_id,)
         )
@@ -141,10 +339,12 @@ async def update_conversation(conversation_id: str, updates: Dict[str, Any]):
         await cursor.execute(query, (*updates.values(), conversation_id))
 
 async def delete_conversation(conversation_id: str):
-    """Delete conversation and its messages"""
+    """Hide a conversation right away, the purge worker removes its messages"""
     async with get_db_connection() as cursor:
         await cursor.execute(
-            "DELETE FROM conversations WHERE id = %s",
+            """UPDATE conversations 
+               SET deleted_at = CURRENT_TIMESTAMP, updated_at = updated_at 
+               WHERE id = %s AND deleted_at IS NULL""",
             (conversation_id,)
         )
 
@@ -155,64 +355,483 @@ async def add_message(
     role: str,
     content: str,
     encrypted: bool = False
-) -> str:
-    """Add a message to a conversation"""
+) -> Optional[str]:
+    """Add a message to a conversation, None if it doesn't exist or was deleted"""
     message_id = str(uuid.uuid4())
+    codec, blob = encode_content(content, encrypted)
     
-    async with get_db_connection() as cursor:
+    # Writing to a cold conversation brings it back to the hot table
+    await promote_conversation(conversation_id)
+    
+    async with get_db_transaction() as cursor:
+        # Update conversation timestamp and message count, locking out a concurrent delete
         await cursor.execute(
-            """INSERT INTO messages (id, conversation_id, role, content, encrypted)
-               VALUES (%s, %s, %s, %s, %s)""",
-            (message_id, conversation_id, role, content, encrypted)
+            """UPDATE conversations SET updated_at = CURRENT_TIMESTAMP,
+               message_count = message_count + 1 WHERE id = %s AND deleted_at IS NULL""",
+            (conversation_id,)
         )
+        if not cursor.rowcount:
+            return None
         
-        # Update conversation timestamp
+        if codec == CODEC_NONE:
+            await cursor.execute(
+                """INSERT INTO messages (id, conversation_id, role, content, encrypted)
+                   VALUES (%s, %s, %s, %s, %s)""",
+                (message_id, conversation_id, role, content, encrypted)
+            )
+        else:
+            # Compressed bodies live in content_blob, content stays empty
+            await cursor.execute(
+                """INSERT INTO messages (id, conversation_id, role, content, encrypted, content_codec, content_blob)
+                   VALUES (%s, %s, %s, '', %s, %s, %s)""",
+                (message_id, conversation_id, role, encrypted, codec, blob)
+            )
+    
+    return message_id
+
+async def get_conversation_messages(conversation_id: str) -> List[Dict[str, Any]]:
+    """Get all messages for a conversation, including archived ones (none once it is deleted)"""
+    # One snapshot, so an archive or promote between the two reads can't drop or repeat messages
+    async with get_db_snapshot() as cursor:
         await cursor.execute(
-            "UPDATE conversations SET updated_at = CURRENT_TIMESTAMP WHERE id = %s",
+            """SELECT a.codec, a.payload FROM message_archive a
+               JOIN conversations c ON c.id = a.conversation_id
+               WHERE a.conversation_id = %s AND c.deleted_at IS NULL""",
             (conversation_id,)
         )
+        archive = await cursor.fetchone()
+        
+        await cursor.execute(
+            """SELECT m.* FROM messages m
+               JOIN conversations c ON c.id = m.conversation_id
+               WHERE m.conversation_id = %s AND c.deleted_at IS NULL
+               ORDER BY m.created_at ASC, m.id ASC""",
+            (conversation_id,)
+        )
+        rows = await cursor.fetchall()
     
-    return message_id
+    messages = [decode_message_row(row) for row in rows]
+    if archive:
+        messages = unpack_archive(archive) + messages
+        messages.sort(key=lambda msg: (msg['created_at'], msg['id']))
+    return messages
 
-async def get_conversation_messages(conversation_id: str) -> List[Dict[str, Any]]:
-    """Get all messages for a conversation"""
+async def get_last_messages(user_id: str) -> Dict[str, Dict[str, Any]]:
+    """Newest hot message of each of a user's conversations, by conversation id"""
     async with get_db_connection() as cursor:
+        # One index probe per conversation; no window functions, so MySQL 5.7 works too
+        await cursor.execute(
+            """SELECT m.* FROM conversations c
+               JOIN messages m ON m.id = (
+                   SELECT newest.id FROM messages newest
+                   WHERE newest.conversation_id = c.id
+                   ORDER BY newest.created_at DESC, newest.id DESC
+                   LIMIT 1
+               )
+               WHERE c.user_id = %s AND c.deleted_at IS NULL""",
+            (user_id,)
+        )
+        rows = await cursor.fetchall()
+    return {row['conversation_id']: decode_message_row(row) for row in rows}
+
+async def get_conversation_messages_since(conversation_id: str, message_id: str) -> Optional[List[Dict[str, Any]]]:
+    """Messages after message_id in conversation order, None if it isn't one of the conversation's"""
+    async with get_db_connection() as cursor:
+        await cursor.execute(
+            """SELECT m.created_at, m.id FROM messages m
+               JOIN conversations c ON c.id = m.conversation_id
+               WHERE m.id = %s AND m.conversation_id = %s AND c.deleted_at IS NULL""",
+            (message_id, conversation_id)
+        )
+        anchor = await cursor.fetchone()
+        if anchor:
+            # Timestamps have one second resolution, the id breaks ties like the full listing does
+            await cursor.execute(
+                """SELECT * FROM messages
+                   WHERE conversation_id = %s AND (created_at > %s OR (created_at = %s AND id > %s))
+                   ORDER BY created_at ASC, id ASC""",
+                (conversation_id, anchor['created_at'], anchor['created_at'], anchor['id'])
+            )
+            return [decode_message_row(row) for row in await cursor.fetchall()]
+    
+    # Archived, or not in this conversation at all
+    messages = await get_conversation_messages(conversation_id)
+    ids = [msg['id'] for msg in messages]
+    return messages[ids.index(message_id) + 1:] if message_id in ids else None
+
+async def delete_conversation_messages(conversation_id: str):
+    """Delete all messages for a conversation"""
+    async with get_db_connection() as cursor:
+        await cursor.execute(
+            "DELETE FROM messages WHERE conversation_id = %s",
+            (conversation_id,)
+        )
+        await cursor.execute(
+            "DELETE FROM message_archive WHERE conversation_id = %s",
+            (conversation_id,)
+        )
+        # Enrichment starts over, the watermark counts messages from the first one
+        await cursor.execute(
+            """UPDATE conversations SET message_count = 0, memory_watermark = 0, summary = NULL,
+               updated_at = CURRENT_TIMESTAMP WHERE id = %s""",
+            (conversation_id,)
+        )
+
+# ============ ARCHIVE FUNCTIONS ============
+
+async def archive_conversation(conversation_id: str) -> int:
+    """
+    Move a conversation's messages into the archive, returns messages moved.
+    The newest message stays in the hot table so the conversation list can
+    preview it without opening the archive.
+    """
+    async with get_db_transaction() as cursor:
+        # Lock the conversation so a concurrent promote can't interleave
+        await cursor.execute(
+            "SELECT id FROM conversations WHERE id = %s AND archived = FALSE FOR UPDATE",
+            (conversation_id,)
+        )
+        if not await cursor.fetchone():
+            return 0
+        
         await cursor.execute(
             """SELECT * FROM messages 
                WHERE conversation_id = %s 
-               ORDER BY created_at ASC""",
+               ORDER BY created_at ASC, id ASC""",
+            (conversation_id,)
+        )
+        messages = [decode_message_row(row) for row in await cursor.fetchall()][:-1]
+        
+        if messages:
+            await cursor.execute(
+                """INSERT INTO message_archive (conversation_id, codec, payload, message_count)
+                   VALUES (%s, %s, %s, %s)""",
+                (conversation_id, ARCHIVE_CODEC, pack_archive(messages), len(messages))
+            )
+            ids = [msg['id'] for msg in messages]
+            placeholders = ", ".join(["%s"] * len(ids))
+            await cursor.execute(
+                f"DELETE FROM messages WHERE id IN ({placeholders})",
+                tuple(ids)
+            )
+        
+        # Flagged even with nothing to move, so the archiver doesn't pick it again;
+        # keep updated_at untouched so the conversation list order doesn't change
+        await cursor.execute(
+            "UPDATE conversations SET archived = TRUE, updated_at = updated_at WHERE id = %s",
+            (conversation_id,)
+        )
+    
+    return len(messages)
+
+async def promote_conversation(conversation_id: str) -> int:
+    """Move archived messages back to the hot table, returns messages restored"""
+    async with get_db_connection() as cursor:
+        await cursor.execute(
+            "SELECT 1 FROM conversations WHERE id = %s AND archived = TRUE AND deleted_at IS NULL",
             (conversation_id,)
         )
+        if not await cursor.fetchone():
+            return 0
+    
+    async with get_db_transaction() as cursor:
+        await cursor.execute(
+            "SELECT id FROM conversations WHERE id = %s AND archived = TRUE FOR UPDATE",
+            (conversation_id,)
+        )
+        if not await cursor.fetchone():
+            return 0
+        
+        await cursor.execute(
+            "SELECT codec, payload FROM message_archive WHERE conversation_id = %s",
+            (conversation_id,)
+        )
+        archive = await cursor.fetchone()
+        
+        rows = []
+        for msg in unpack_archive(archive) if archive else []:
+            codec, blob = encode_content(msg['content'], msg['encrypted'])
+            content = msg['content'] if codec == CODEC_NONE else ''
+            rows.append((
+                msg['id'], msg['conversation_id'], msg['role'], content,
+                msg['encrypted'], codec, blob, msg['created_at']
+            ))
+        
+        if rows:
+            await cursor.executemany(
+                """INSERT IGNORE INTO messages 
+                   (id, conversation_id, role, content, encrypted, content_codec, content_blob, created_at)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
+                rows
+            )
+        await cursor.execute(
+            "DELETE FROM message_archive WHERE conversation_id = %s",
+            (conversation_id,)
+        )
+        # Touch updated_at so the archiver doesn't take it back before the write lands
+        await cursor.execute(
+            "UPDATE conversations SET archived = FALSE, updated_at = CURRENT_TIMESTAMP WHERE id = %s",
+            (conversation_id,)
+        )
+    
+    return len(rows)
+
+async def archive_idle_conversations(idle_days: int, batch_size: int) -> int:
+    """Archive up to batch_size conversations idle for idle_days, returns count archived"""
+    async with get_db_connection() as cursor:
+        await cursor.execute(
+            """SELECT id FROM conversations 
+               WHERE archived = FALSE AND deleted_at IS NULL 
+               AND updated_at < NOW() - INTERVAL %s DAY 
+               ORDER BY updated_at ASC 
+               LIMIT %s""",
+            (idle_days, batch_size)
+        )
+        idle = await cursor.fetchall()
+    
+    for conv in idle:
+        await archive_conversation(conv['id'])
+    
+    return len(idle)
+
+# ============ SEARCH FUNCTIONS ============
+
+# Title hits are rarer and more descriptive than body hits, so rank them higher
+TITLE_MATCH_BOOST = 2.0
+
+async def search_user_messages(user_id: str, query: str, limit: int, offset: int) -> List[Dict[str, Any]]:
+    """
+    Full-text search over a user's conversation titles and message bodies.
+
+    Encrypted conversations and messages are skipped (their ciphertext is
+    meaningless to the index), as are compressed or archived bodies, which
+    are not stored in the indexed content column. With MESSAGE_COMPRESSION
+    on, long replies therefore drop out of search.
+    """
+    window = offset + limit
+    async with get_db_connection() as cursor:
+        # Ids break ties, so pages don't repeat or skip equally scored rows
+        await cursor.execute(
+            """(SELECT 'title' AS matched_in, c.id AS conversation_id, NULL AS message_id,
+                       c.title, c.persona_name, NULL AS role, c.title AS content,
+                       c.updated_at AS created_at,
+                       MATCH(c.title) AGAINST (%s IN NATURAL LANGUAGE MODE) * %s AS score
+                FROM conversations c
+                WHERE c.user_id = %s AND c.deleted_at IS NULL AND c.encrypted = FALSE
+                AND MATCH(c.title) AGAINST (%s IN NATURAL LANGUAGE MODE)
+                ORDER BY score DESC, c.updated_at DESC, c.id
+                LIMIT %s)
+               UNION ALL
+               (SELECT 'message' AS matched_in, c.id AS conversation_id, m.id AS message_id,
+                       c.title, c.persona_name, m.role, m.content,
+                       m.created_at,
+                       MATCH(m.content) AGAINST (%s IN NATURAL LANGUAGE MODE) AS score
+                FROM messages m
+                JOIN conversations c ON c.id = m.conversation_id
+                WHERE c.user_id = %s AND c.deleted_at IS NULL AND c.encrypted = FALSE
+                AND m.encrypted = FALSE
+                AND MATCH(m.content) AGAINST (%s IN NATURAL LANGUAGE MODE)
+                ORDER BY score DESC, m.created_at DESC, m.id
+                LIMIT %s)
+               ORDER BY score DESC, created_at DESC, conversation_id, message_id
+               LIMIT %s OFFSET %s""",
+            (
+                query, TITLE_MATCH_BOOST, user_id, query, window,
+                query, user_id, query, window,
+                limit, offset
+            )
+        )
         return await cursor.fetchall()
 
-async def delete_conversation_messages(conversation_id: str):
-    """Delete all messages for a conversation"""
+# ============ EXPORT FUNCTIONS ============
+
+async def iter_user_export(user_id: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream everything stored for a user as typed records.
+
+    Uses a server-side cursor so memory stays flat regardless of history size;
+    only one archived conversation payload is held at a time. All reads share
+    one snapshot, so the archiver can't move messages between them.
+    """
+    async with get_db_stream() as cursor:
+        async for row in _stream_rows(
+            cursor,
+            "SELECT * FROM users WHERE id = %s AND deleted_at IS NULL",
+            (user_id,)
+        ):
+            yield {'type': 'user', **row}
+        
+        async for row in _stream_rows(
+            cursor,
+            """SELECT * FROM conversations 
+               WHERE user_id = %s AND deleted_at IS NULL 
+               ORDER BY created_at ASC""",
+            (user_id,)
+        ):
+            yield {'type': 'conversation', **row}
+        
+        async for row in _stream_rows(
+            cursor,
+            """SELECT m.* FROM messages m 
+               JOIN conversations c ON c.id = m.conversation_id 
+               WHERE c.user_id = %s AND c.deleted_at IS NULL 
+               ORDER BY m.conversation_id, m.created_at ASC""",
+            (user_id,)
+        ):
+            yield {'type': 'message', **decode_message_row(row)}
+        
+        async for archive in _stream_rows(
+            cursor,
+            """SELECT a.codec, a.payload FROM message_archive a 
+               JOIN conversations c ON c.id = a.conversation_id 
+               WHERE c.user_id = %s AND c.deleted_at IS NULL""",
+            (user_id,)
+        ):
+            for row in unpack_archive(archive):
+                yield {'type': 'message', **row}
+        
+        async for row in _stream_rows(
+            cursor,
+            """SELECT id, user_id, content, category, created_at, updated_at 
+               FROM user_memories WHERE user_id = %s ORDER BY created_at ASC""",
+            (user_id,)
+        ):
+            yield {'type': 'memory', **row}
+
+# ============ PURGE FUNCTIONS ============
+
+async def get_deleted_conversation_ids(limit: int) -> List[str]:
+    """Get conversations waiting to be purged, oldest deletion first"""
     async with get_db_connection() as cursor:
         await cursor.execute(
-            "DELETE FROM messages WHERE conversation_id = %s",
+            """SELECT id FROM conversations 
+               WHERE deleted_at IS NOT NULL 
+               ORDER BY deleted_at ASC 
+               LIMIT %s""",
+            (limit,)
+        )
+        return [row['id'] for row in await cursor.fetchall()]
+
+async def count_pending_purges() -> Dict[str, int]:
+    """Count conversations and users waiting to be purged"""
+    async with get_db_connection() as cursor:
+        await cursor.execute("SELECT COUNT(*) AS n FROM conversations WHERE deleted_at IS NOT NULL")
+        conversations = (await cursor.fetchone())['n']
+        await cursor.execute("SELECT COUNT(*) AS n FROM users WHERE deleted_at IS NOT NULL")
+        users = (await cursor.fetchone())['n']
+    return {'conversations': conversations, 'users': users}
+
+async def purge_message_batch(conversation_id: str, batch_size: int) -> int:
+    """Delete up to batch_size messages of a conversation, returns rows deleted"""
+    async with get_db_connection() as cursor:
+        return await cursor.execute(
+            "DELETE FROM messages WHERE conversation_id = %s LIMIT %s",
+            (conversation_id, batch_size)
+        )
+
+async def purge_conversation_row(conversation_id: str):
+    """Delete a deleted conversation once its messages are gone"""
+    async with get_db_connection() as cursor:
+        await cursor.execute(
+            "DELETE FROM message_archive WHERE conversation_id = %s",
             (conversation_id,)
         )
+        await cursor.execute(
+            "DELETE FROM conversations WHERE id = %s AND deleted_at IS NOT NULL",
+            (conversation_id,)
+        )
+
+async def get_purgeable_user_ids(limit: int) -> List[str]:
+    """Get deleted users whose conversations have all been purged"""
+    async with get_db_connection() as cursor:
+        await cursor.execute(
+            """SELECT u.id FROM users u 
+               WHERE u.deleted_at IS NOT NULL 
+               AND NOT EXISTS (SELECT 1 FROM conversations c WHERE c.user_id = u.id) 
+               ORDER BY u.deleted_at ASC 
+               LIMIT %s""",
+            (limit,)
+        )
+        return [row['id'] for row in await cursor.fetchall()]
+
+async def purge_memory_batch(user_id: str, batch_size: int) -> int:
+    """Delete up to batch_size memories of a user, returns rows deleted"""
+    async with get_db_connection() as cursor:
+        return await cursor.execute(
+            "DELETE FROM user_memories WHERE user_id = %s LIMIT %s",
+            (user_id, batch_size)
+        )
+
+async def purge_user_row(user_id: str):
+    """Delete a deleted user once their conversations and memories are gone"""
+    async with get_db_connection() as cursor:
+        await cursor.execute(
+            "DELETE FROM users WHERE id = %s AND deleted_at IS NOT NULL",
+            (user_id,)
+        )
 
 # ============ MEMORY FUNCTIONS ============
 
-async def create_memory(user_id: str, content: str, category: str = 'general') -> str:
-    """Create a new user memory"""
-    memory_id = str(uuid.uuid4())
+async def _write_memory_signature(cursor, memory_id: str, user_id: str, signature: bytes):
+    """Replace a memory's LSH bucket rows"""
+    await cursor.execute("DELETE FROM memory_lsh_buckets WHERE memory_id = %s", (memory_id,))
+    await cursor.executemany(
+        """INSERT INTO memory_lsh_buckets (user_id, band, bucket, memory_id)
+           VALUES (%s, %s, %s, %s)""",
+        [(user_id, band, bucket, memory_id) for band, bucket in band_buckets(signature)]
+    )
+
+async def _find_duplicate_memory(cursor, user_id: str, content: str, signature: bytes) -> Optional[Dict[str, Any]]:
+    """Near-duplicate of content among the memories sharing an LSH bucket with it"""
+    buckets = band_buckets(signature)
+    await cursor.execute(
+        f"""SELECT DISTINCT m.id, m.content FROM memory_lsh_buckets b 
+            JOIN user_memories m ON m.id = b.memory_id 
+            WHERE b.user_id = %s AND (b.band, b.bucket) IN ({', '.join(['(%s, %s)'] * len(buckets))})""",
+        (user_id, *[value for pair in buckets for value in pair])
+    )
+    return closest_duplicate(content, await cursor.fetchall())
+
+async def create_memory(user_id: str, content: str, category: str = 'general') -> Dict[str, Any]:
+    """
+    Create a new user memory unless a near-duplicate already exists.
+
+    Returns {'id', 'content', 'status'}; status is 'created', 'merged' (the
+    existing memory took the new, more complete wording) or 'duplicate'.
+    """
+    signature = minhash_signature(content)
     
-    async with get_db_connection() as cursor:
+    async with get_db_transaction() as cursor:
+        duplicate = await _find_duplicate_memory(cursor, user_id, content, signature)
+        if duplicate:
+            merged = merge_memory_content(duplicate['content'], content)
+            if merged is None:
+                return {'id': duplicate['id'], 'content': duplicate['content'], 'status': 'duplicate'}
+            await cursor.execute(
+                """UPDATE user_memories 
+                   SET content = %s, minhash = %s, updated_at = CURRENT_TIMESTAMP 
+                   WHERE id = %s""",
+                (merged, signature, duplicate['id'])
+            )
+            await _write_memory_signature(cursor, duplicate['id'], user_id, signature)
+            return {'id': duplicate['id'], 'content': merged, 'status': 'merged'}
+        
+        memory_id = str(uuid.uuid4())
         await cursor.execute(
-            """INSERT INTO user_memories (id, user_id, content, category)
-               VALUES (%s, %s, %s, %s)""",
-            (memory_id, user_id, content, category)
+            """INSERT INTO user_memories (id, user_id, content, category, minhash)
+               VALUES (%s, %s, %s, %s, %s)""",
+            (memory_id, user_id, content, category, signature)
         )
+        await _write_memory_signature(cursor, memory_id, user_id, signature)
     
-    return memory_id
+    return {'id': memory_id, 'content': content, 'status': 'created'}
 
 async def get_user_memories(user_id: str) -> List[Dict[str, Any]]:
     """Get all memories for a user"""
     async with get_db_connection() as cursor:
         await cursor.execute(
-            """SELECT * FROM user_memories 
+            """SELECT id, user_id, content, category, created_at, updated_at 
+               FROM user_memories 
                WHERE user_id = %s 
                ORDER BY updated_at DESC""",
             (user_id,)
@@ -221,13 +840,20 @@ async def get_user_memories(user_id: str) -> List[Dict[str, Any]]:
 
 async def update_memory(memory_id: str, content: str):
     """Update a memory"""
-    async with get_db_connection() as cursor:
+    signature = minhash_signature(content)
+    
+    async with get_db_transaction() as cursor:
+        await cursor.execute("SELECT user_id FROM user_memories WHERE id = %s FOR UPDATE", (memory_id,))
+        row = await cursor.fetchone()
+        if not row:
+            return
         await cursor.execute(
             """UPDATE user_memories 
-               SET content = %s, updated_at = CURRENT_TIMESTAMP 
+               SET content = %s, minhash = %s, updated_at = CURRENT_TIMESTAMP 
                WHERE id = %s""",
-            (content, memory_id)
+            (content, signature, memory_id)
         )
+        await _write_memory_signature(cursor, memory_id, row['user_id'], signature)
 
 async def delete_memory(memory_id: str):
     """Delete a memory"""
@@ -237,6 +863,50 @@ async def delete_memory(memory_id: str):
             (memory_id,)
         )
 
+async def backfill_memory_signatures(batch_size: int) -> int:
+    """Sign up to batch_size memories written before deduplication, returns rows signed"""
+    async with get_db_transaction() as cursor:
+        await cursor.execute(
+            """SELECT id, user_id, content FROM user_memories 
+               WHERE minhash IS NULL 
+               LIMIT %s""",
+            (batch_size,)
+        )
+        rows = await cursor.fetchall()
+        for row in rows:
+            signature = minhash_signature(row['content'])
+            await cursor.execute(
+                "UPDATE user_memories SET minhash = %s, updated_at = updated_at WHERE id = %s",
+                (signature, row['id'])
+            )
+            await _write_memory_signature(cursor, row['id'], row['user_id'], signature)
+    return len(rows)
+
+async def save_conversation_enrichment(
+    conversation_id: str,
+    watermark: int,
+    summary: Optional[str],
+    title: Optional[str] = None,
+    old_title: Optional[str] = None
+):
+    """
+    Store a post-turn enrichment pass: the first `watermark` messages are
+    processed, summary replaces the rolling summary when given, and title
+    replaces the title only if it is still old_title (the user may have renamed it).
+    A watermark past message_count is from a pass that read messages cleared since.
+    """
+    async with get_db_connection() as cursor:
+        await cursor.execute(
+            """UPDATE conversations 
+               SET memory_watermark = CASE WHEN %s <= message_count 
+                   THEN GREATEST(memory_watermark, %s) ELSE memory_watermark END, 
+               summary = COALESCE(%s, summary), 
+               title = CASE WHEN %s IS NOT NULL AND title = %s THEN %s ELSE title END, 
+               updated_at = updated_at 
+               WHERE id = %s""",
+            (watermark, watermark, summary, title, old_title, title, conversation_id)
+        )
+
 # ============ SETTINGS FUNCTIONS ============
 
 async def get_user_settings(user_id: str) -> Optional[Dict[str, Any]]:
@@ -0,0 +1,230 @@
+"""
+Post-turn enrichment: one background model call per conversation pass that
+fills in the title, new memories and the rolling summary
+"""
+import os
+import re
+import json
+import asyncio
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from utilities.storage import (
+    get_conversation, get_conversation_messages, get_user_settings,
+    create_memory, save_conversation_enrichment
+)
+from utilities.memory_utils import retrieve_memories, index_memory
+from utilities.memory_filter_utils import should_extract, should_audit, record_audit
+from utilities.title_utils import extractive_title, TITLE_QUALITY, TITLE_MIN_SCORE
+from utilities.log_utils import get_logger
+
+logger = get_logger(__name__)
+
+# Completed turns in a conversation between enrichment passes (0 disables)
+MEMORY_EXTRACTION_TURNS = int(os.getenv('MEMORY_EXTRACTION_TURNS', '4'))
+# Unprocessed messages that force a pass even without a title or likely memories
+ENRICHMENT_MAX_MESSAGES = 20
+
+# Titles the client uses before the conversation has a real one
+PLACEHOLDER_TITLES = ('', 'New Chat')
+TITLE_MAX_CHARS = 60
+SUMMARY_MAX_CHARS = 1500
+
+Generator = Callable[[List[Dict]], Awaitable[str]]
+
+ENRICHMENT_PROMPT = """You maintain metadata for a chat between a USER and an AI character.
+Read the new messages and reply with ONLY a JSON object with these keys:
+
+"title": {title_rule}
+"memories": {memory_rule}
+"summary": the previous summary updated with the new messages, at most 5 sentences, written in the third person
+
+Previous summary:
+{summary}
+{memory_section}"""
+
+TITLE_RULE = "a short, concise title (3-6 words) for the conversation, without quotes"
+NO_TITLE_RULE = "null"
+MEMORY_RULE = ("new facts the USER explicitly stated about themselves (name, age, location, work, "
+               "relationships, preferences, goals), one short standalone statement each such as "
+               "\"User works as a nurse\". Never include facts about the AI character, never guess, "
+               "use [] when there is nothing new")
+NO_MEMORY_RULE = "[]"
+
+_THINK_RE = re.compile(r"<think>.*?</think>", re.DOTALL)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+
+def build_enrichment_prompt(
+    messages: List[Dict],
+    summary: Optional[str],
+    existing_memories: List[str],
+    needs_title: bool,
+    wants_memories: bool
+) -> List[Dict]:
+    """Prompt asking for title, memories and summary in one JSON reply"""
+    memory_section = ""
+    if wants_memories and existing_memories:
+        memory_section = "\nAlready known about the user (don't repeat these):\n" + "\n".join(
+            f"- {memory}" for memory in existing_memories
+        )
+    system_prompt = ENRICHMENT_PROMPT.format(
+        title_rule=TITLE_RULE if needs_title else NO_TITLE_RULE,
+        memory_rule=MEMORY_RULE if wants_memories else NO_MEMORY_RULE,
+        summary=summary or "(none yet)",
+        memory_section=memory_section
+    )
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": "New messages:\n\n" + "\n".join(
+            f"{msg['role']}: {msg['content']}" for msg in messages
+        )}
+    ]
+
+def parse_enrichment(response: str) -> Dict[str, Any]:
+    """
+    Pull title, memories and summary out of a model reply. Tolerates reasoning
+    blocks, code fences, surrounding prose and trailing commas; anything
+    missing or malformed comes back as None / [].
+    """
+    text = _THINK_RE.sub('', response or '')
+    data: Any = {}
+    start, end = text.find('{'), text.rfind('}')
+    if start != -1 and end > start:
+        raw = text[start:end + 1]
+        for candidate in (raw, _TRAILING_COMMA_RE.sub(r'\1', raw)):
+            try:
+                data = json.loads(candidate)
+                break
+            except ValueError:
+                continue
+    if not isinstance(data, dict):
+        data = {}
+
+    title = data.get('title')
+    title = title.strip().strip('"\'').rstrip('.').strip()[:TITLE_MAX_CHARS] if isinstance(title, str) else ''
+    memories = data.get('memories')
+    memories = [m.strip() for m in memories if isinstance(m, str) and m.strip()] if isinstance(memories, list) else []
+    summary = data.get('summary')
+    summary = summary.strip()[:SUMMARY_MAX_CHARS] if isinstance(summary, str) else ''
+    return {'title': title or None, 'memories': memories, 'summary': summary or None}
+
+async def enrich_conversation(conversation_id: str, generate: Generator) -> Dict[str, Any]:
+    """
+    Run one enrichment pass over the messages after the conversation's
+    watermark. The model is only called when the conversation still needs a
+    title, the new turns look like they contain memories, or enough
+    messages have piled up; otherwise the turns wait for a later pass so the
+    summary still covers them. Returns what was written.
+    """
+    conversation = await get_conversation(conversation_id)
+    if not conversation or conversation.get('encrypted'):
+        return {}
+
+    messages = await get_conversation_messages(conversation_id)
+    watermark = len(messages)
+    new_messages = [
+        {'role': msg['role'], 'content': msg['content']}
+        for msg in messages[conversation.get('memory_watermark') or 0:]
+        if not msg.get('encrypted')
+    ]
+    if not any(msg['role'] == 'user' for msg in new_messages):
+        return {}
+
+    user_id = conversation['user_id']
+    needs_title = conversation['title'].strip() in PLACEHOLDER_TITLES
+    local_title = None
+    if needs_title and not TITLE_QUALITY:
+        local_title, score = extractive_title(new_messages)
+        needs_title = score < TITLE_MIN_SCORE
+        if needs_title:
+            local_title = None
+    settings = await get_user_settings(user_id)
+    memory_enabled = bool(settings and settings.get('memory_enabled'))
+    likely_memories = memory_enabled and should_extract(new_messages)
+    audit = memory_enabled and not likely_memories and should_audit()
+    if not (needs_title or likely_memories or audit or len(new_messages) >= ENRICHMENT_MAX_MESSAGES):
+        if local_title:
+            # Only the title was due, and it didn't need the model
+            await save_conversation_enrichment(
+                conversation_id, conversation.get('memory_watermark') or 0, None,
+                title=local_title, old_title=conversation['title']
+            )
+            _untitled.discard(conversation_id)
+        return {'title': local_title, 'memories': 0, 'summary': None} if local_title else {}
+
+    new_messages = new_messages[-ENRICHMENT_MAX_MESSAGES:]
+    existing = []
+    if memory_enabled:
+        # Only memories related to the new turns are worth showing as "already known";
+        # near-duplicates that slip through are caught by create_memory
+        text = " ".join(msg['content'] for msg in new_messages if msg['role'] == 'user')
+        existing = await retrieve_memories(user_id, text, [])
+
+    response = await generate(build_enrichment_prompt(
+        new_messages, conversation.get('summary'), existing, needs_title, memory_enabled
+    ))
+    result = parse_enrichment(response)
+    if memory_enabled and not likely_memories:
+        # The filter would have skipped these turns, the model's answer tells us if that was right
+        record_audit(bool(result['memories']))
+
+    stored = 0
+    if memory_enabled:
+        for content in result['memories']:
+            memory = await create_memory(user_id, content)
+            if memory['status'] != 'duplicate':
+                index_memory(user_id, memory['id'], memory['content'])
+                stored += 1
+
+    title = local_title or (result['title'] if needs_title else None)
+    await save_conversation_enrichment(
+        conversation_id, watermark, result['summary'],
+        title=title, old_title=conversation['title']
+    )
+    if title:
+        _untitled.discard(conversation_id)
+    return {'title': title, 'memories': stored, 'summary': result['summary']}
+
+# ============ SCHEDULING ============
+
+# conversation_id -> completed turns since the last pass was scheduled
+_pending_turns: Counter = Counter()
+# Conversations created with a placeholder title, enriched after their first turn
+_untitled: Set[str] = set()
+# conversation_id -> running pass, at most one per conversation
+_enrichment_tasks: Dict[str, asyncio.Task] = {}
+
+async def _run_enrichment(conversation_id: str, generate: Generator):
+    try:
+        result = await enrich_conversation(conversation_id, generate)
+        if result.get('title') or result.get('memories'):
+            logger.info("Enriched conversation", extra={
+                "conversation_id": conversation_id, "title": result['title'], "memories": result['memories']
+            })
+    except Exception:
+        logger.exception("Conversation enrichment error", extra={"conversation_id": conversation_id})
+    finally:
+        _enrichment_tasks.pop(conversation_id, None)
+
+def note_untitled_conversation(conversation_id: str):
+    """Have the first completed turn of a conversation give it a title"""
+    if MEMORY_EXTRACTION_TURNS > 0:
+        _untitled.add(conversation_id)
+
+def note_completed_turn(conversation_id: str, generate: Generator):
+    """Count a completed turn and start an enrichment pass when one is due"""
+    if MEMORY_EXTRACTION_TURNS <= 0:
+        return
+    # Turns that finish during a pass still count towards the next one
+    _pending_turns[conversation_id] += 1
+    if conversation_id in _enrichment_tasks:
+        return
+    if _pending_turns[conversation_id] < MEMORY_EXTRACTION_TURNS and conversation_id not in _untitled:
+        return
+    del _pending_turns[conversation_id]
+    _enrichment_tasks[conversation_id] = asyncio.create_task(_run_enrichment(conversation_id, generate))
+
+def forget_conversation(conversation_id: str):
+    """Drop the scheduling state of a deleted conversation"""
+    _pending_turns.pop(conversation_id, None)
+    _untitled.discard(conversation_id)
@@ -0,0 +1,86 @@
+"""
+Response helpers: orjson serialization and gzip for large payloads
+"""
+import os
+import json
+from decimal import Decimal
+from datetime import date, datetime, time
+from typing import Any, Optional
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+from starlette.types import Message, Receive, Scope, Send
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the stdlib encoder is the fallback
+    orjson = None
+
+# Responses smaller than this go out uncompressed
+RESPONSE_GZIP_MIN_BYTES = int(os.getenv('RESPONSE_GZIP_MIN_BYTES', '1024'))
+# Same level as message compression: most of the ratio of 9 at a fraction of the CPU
+RESPONSE_GZIP_LEVEL = 6
+# Bodies that are compressed files already, sent as they are
+COMPRESSED_MEDIA_TYPES = {'application/gzip', 'application/zip', 'application/zstd'}
+
+def _default(value: Any) -> Any:
+    """Types orjson doesn't know, encoded the way jsonable_encoder would"""
+    if isinstance(value, Decimal):
+        # MySQL SUM()/AVG() come back as Decimal
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, bytes):
+        return value.decode()
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode='json')
+    if isinstance(value, (datetime, date, time)):
+        # Only reached on the stdlib path, orjson writes these itself
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode('utf-8')
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when it is installed"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def fast_json(content: Any, response: Optional[Response] = None) -> FastJSONResponse:
+    """
+    Serialize rows straight into a response, skipping FastAPI's
+    jsonable_encoder pass (most of the cost on long transcripts). Pass the
+    endpoint's Response parameter to keep headers set by dependencies.
+    """
+    if response is None:
+        return FastJSONResponse(content)
+    return FastJSONResponse(content, status_code=response.status_code or 200, headers=dict(response.headers))
+
+class _PassThroughGZipResponder(GZipResponder):
+    async def send_with_gzip(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            await super().send_with_gzip(message)
+            media_type = Headers(raw=message["headers"]).get("content-type", "").split(";")[0].strip()
+            # Handled like a body that already has a Content-Encoding
+            self.content_encoding_set = self.content_encoding_set or media_type in COMPRESSED_MEDIA_TYPES
+            return
+        await super().send_with_gzip(message)
+
+class SelectiveGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that doesn't compress COMPRESSED_MEDIA_TYPES a second time"""
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and "gzip" in Headers(scope=scope).get("Accept-Encoding", ""):
+            responder = _PassThroughGZipResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)
+            await responder(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
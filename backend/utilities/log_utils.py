@@ -0,0 +1,143 @@
+"""
+Structured logging: JSON lines tagged with the request's correlation ID,
+written to stdout by a background thread so the event loop never blocks on it.
+
+    logger = get_logger(__name__)
+    logger.info("chat request", extra={"persona": name, "sample": True})
+
+Fields passed in extra become keys of the JSON line. Lines marked
+"sample" are high volume and only LOG_SAMPLE_RATE of them are kept.
+"""
+import os
+import re
+import sys
+import json
+import uuid
+import queue
+import atexit
+import random
+import logging
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# json for log shippers, text for reading in a terminal
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()
+# Share of lines marked "sample" that are written
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '0.1'))
+# Log every prompt sent to the model in full (persona instructions, memories, history)
+LOG_PROMPTS = os.getenv('LOG_PROMPTS', 'false').lower() == 'true'
+
+REQUEST_ID_HEADER = 'x-request-id'
+# Client-supplied IDs are kept only if they look like an ID
+_REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+_request_id: ContextVar[Optional[str]] = ContextVar('request_id', default=None)
+
+# LogRecord attributes that are not extra fields
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id', 'sample'}
+
+_listener: Optional[QueueListener] = None
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if record.request_id:
+            entry['request_id'] = record.request_id
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRS)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+        return f"{line} {fields}" if fields else line
+
+class _ContextFilter(logging.Filter):
+    """Runs in the caller's thread and context: tags the request ID and drops unsampled lines"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, 'sample', False):
+            if random.random() >= LOG_SAMPLE_RATE:
+                return False
+            record.sample_rate = LOG_SAMPLE_RATE
+        record.request_id = _request_id.get()
+        return True
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge the arguments now (they may change later) but leave formatting,
+        # tracebacks included, to the writer thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+def setup_logging():
+    """Route all logging through a queue to a background writer; safe to call twice"""
+    global _listener
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(TextFormatter() if LOG_FORMAT == 'text' else JsonFormatter())
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _QueueHandler(log_queue)
+    handler.addFilter(_ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(LOG_LEVEL)
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    # Flush what is still queued on exit
+    atexit.register(stop_logging)
+
+def stop_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+class RequestIdMiddleware:
+    """Give every request a correlation ID (the caller's X-Request-ID or a new one) and echo it back"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        request_id = next(
+            (value.decode('latin-1') for key, value in scope['headers'] if key == REQUEST_ID_HEADER.encode()), ''
+        )
+        if not _REQUEST_ID_RE.match(request_id):
+            request_id = uuid.uuid4().hex
+
+        async def send_with_id(message):
+            if message['type'] == 'http.response.start':
+                message['headers'] = list(message.get('headers', [])) + [(REQUEST_ID_HEADER.encode(), request_id.encode())]
+            await send(message)
+
+        token = _request_id.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _request_id.reset(token)
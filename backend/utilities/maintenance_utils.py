@@ -0,0 +1,183 @@
+"""
+Background maintenance tasks
+"""
+import os
+import time
+import asyncio
+from typing import List, Dict, Any
+
+from utilities.storage import (
+    archive_idle_conversations,
+    get_deleted_conversation_ids, count_pending_purges,
+    purge_message_batch, purge_conversation_row,
+    get_purgeable_user_ids, purge_memory_batch, purge_user_row,
+    backfill_memory_signatures
+)
+from utilities.persona_utils import run_persona_watcher, PERSONA_WATCH_INTERVAL_SECONDS
+from utilities.log_utils import get_logger
+from utilities.metrics_utils import PURGE_BACKLOG, PURGED_ROWS
+
+logger = get_logger(__name__)
+
+# Conversations untouched for this many days move to the archive (0, the default, disables)
+ARCHIVE_IDLE_DAYS = int(os.getenv('ARCHIVE_IDLE_DAYS', '0'))
+# Conversations archived per pass
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', '50'))
+# Pause between archiver passes once the backlog is drained
+ARCHIVE_INTERVAL_SECONDS = int(os.getenv('ARCHIVE_INTERVAL_SECONDS', '3600'))
+
+# Rows removed per DELETE statement when purging deleted data
+PURGE_BATCH_SIZE = int(os.getenv('PURGE_BATCH_SIZE', '500'))
+# Pause between purge batches so other writers can take the locks
+PURGE_BATCH_PAUSE_SECONDS = float(os.getenv('PURGE_BATCH_PAUSE_SECONDS', '0.05'))
+# How often the purge worker checks for work when nobody wakes it up
+PURGE_INTERVAL_SECONDS = int(os.getenv('PURGE_INTERVAL_SECONDS', '60'))
+
+# Memories signed per batch when backfilling near-duplicate signatures
+MEMORY_BACKFILL_BATCH_SIZE = 200
+
+# Purge progress, exposed through get_purge_stats()
+_purge_stats: Dict[str, Any] = {
+    'conversations_purged': 0,
+    'users_purged': 0,
+    'messages_purged': 0,
+    'memories_purged': 0,
+    'batches': 0,
+    'current_conversation': None,
+    'current_conversation_messages_purged': 0,
+    'last_batch_ms': 0.0,
+}
+_purge_wakeup = asyncio.Event()
+
+async def run_archiver():
+    """Periodically move idle conversations into the archive tier"""
+    while True:
+        try:
+            archived = await archive_idle_conversations(ARCHIVE_IDLE_DAYS, ARCHIVE_BATCH_SIZE)
+            if archived:
+                logger.info("Archived idle conversations", extra={"conversations": archived})
+            if archived == ARCHIVE_BATCH_SIZE:
+                # More idle conversations are waiting, yield briefly and keep going
+                await asyncio.sleep(1)
+                continue
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Archiver error")
+        await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
+
+async def run_memory_backfill():
+    """Sign memories stored before near-duplicate detection, then exit"""
+    total = 0
+    try:
+        while True:
+            signed = await backfill_memory_signatures(MEMORY_BACKFILL_BATCH_SIZE)
+            total += signed
+            if signed < MEMORY_BACKFILL_BATCH_SIZE:
+                break
+            await asyncio.sleep(PURGE_BATCH_PAUSE_SECONDS)
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        logger.exception("Memory backfill error")
+    if total:
+        logger.info("Signed existing memories for duplicate detection", extra={"memories": total})
+
+def notify_purge_worker():
+    """Wake the purge worker after something was marked deleted"""
+    _purge_wakeup.set()
+
+async def _count_backlog() -> Dict[str, int]:
+    """Pending purges, also published as the purge_backlog gauge"""
+    pending = await count_pending_purges()
+    for kind, count in pending.items():
+        PURGE_BACKLOG.set(count, kind=kind)
+    return pending
+
+async def get_purge_stats() -> Dict[str, Any]:
+    """Purge worker progress plus the current backlog"""
+    pending = await _count_backlog()
+    return {
+        **_purge_stats,
+        'conversations_pending': pending['conversations'],
+        'users_pending': pending['users'],
+    }
+
+async def _timed_batch(batch) -> int:
+    start = time.perf_counter()
+    deleted = await batch
+    _purge_stats['batches'] += 1
+    _purge_stats['last_batch_ms'] = round((time.perf_counter() - start) * 1000, 2)
+    await asyncio.sleep(PURGE_BATCH_PAUSE_SECONDS)
+    return deleted
+
+async def purge_conversation(conversation_id: str):
+    """Remove a deleted conversation's messages in bounded batches, then the row"""
+    _purge_stats['current_conversation'] = conversation_id
+    _purge_stats['current_conversation_messages_purged'] = 0
+    while True:
+        deleted = await _timed_batch(purge_message_batch(conversation_id, PURGE_BATCH_SIZE))
+        _purge_stats['messages_purged'] += deleted
+        _purge_stats['current_conversation_messages_purged'] += deleted
+        PURGED_ROWS.inc(deleted, kind='messages')
+        if deleted < PURGE_BATCH_SIZE:
+            break
+    await purge_conversation_row(conversation_id)
+    _purge_stats['conversations_purged'] += 1
+    PURGED_ROWS.inc(kind='conversations')
+    _purge_stats['current_conversation'] = None
+
+async def purge_user(user_id: str):
+    """Remove a deleted user's memories in bounded batches, then the user"""
+    while True:
+        deleted = await _timed_batch(purge_memory_batch(user_id, PURGE_BATCH_SIZE))
+        _purge_stats['memories_purged'] += deleted
+        PURGED_ROWS.inc(deleted, kind='memories')
+        if deleted < PURGE_BATCH_SIZE:
+            break
+    # Settings are a single row and go with the user through ON DELETE CASCADE
+    await purge_user_row(user_id)
+    _purge_stats['users_purged'] += 1
+    PURGED_ROWS.inc(kind='users')
+
+async def run_purge_worker():
+    """Drain deleted conversations, then deleted users whose conversations are gone"""
+    while True:
+        _purge_wakeup.clear()
+        try:
+            await _count_backlog()
+            conversation_ids = await get_deleted_conversation_ids(PURGE_BATCH_SIZE)
+            for conversation_id in conversation_ids:
+                await purge_conversation(conversation_id)
+            
+            user_ids = await get_purgeable_user_ids(PURGE_BATCH_SIZE)
+            for user_id in user_ids:
+                await purge_user(user_id)
+            
+            if conversation_ids or user_ids:
+                logger.info("Purged deleted data", extra={"conversations": len(conversation_ids), "users": len(user_ids)})
+                continue
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Purge worker error")
+        
+        try:
+            await asyncio.wait_for(_purge_wakeup.wait(), timeout=PURGE_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+def start_background_tasks() -> List[asyncio.Task]:
+    """Start all enabled maintenance loops"""
+    tasks = [asyncio.create_task(run_purge_worker()), asyncio.create_task(run_memory_backfill())]
+    if ARCHIVE_IDLE_DAYS > 0:
+        tasks.append(asyncio.create_task(run_archiver()))
+    if PERSONA_WATCH_INTERVAL_SECONDS > 0:
+        tasks.append(asyncio.create_task(run_persona_watcher()))
+    return tasks
+
+async def stop_background_tasks(tasks: List[asyncio.Task]):
+    """Cancel maintenance loops and wait for them to exit"""
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,123 @@
+"""
+Local pre-filter for memory extraction: skips the LLM call on turns with no self-disclosure
+"""
+import os
+import re
+import random
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Set
+
+from utilities.log_utils import get_logger
+from utilities.metrics_utils import MEMORY_FILTER_DECISIONS, MEMORY_FILTER_AUDITS
+
+logger = get_logger(__name__)
+
+# Set to false to send every extraction to the model
+MEMORY_FILTER_ENABLED = os.getenv('MEMORY_FILTER_ENABLED', 'true').lower() == 'true'
+# Share of skipped turns still sent to the model to estimate false negatives
+MEMORY_FILTER_AUDIT_RATE = float(os.getenv('MEMORY_FILTER_AUDIT_RATE', '0.02'))
+
+_I_AM = r"(?:i am|i'm|im)"
+
+# First-person statements that usually carry a fact worth remembering. Each
+# pattern starts at one of the ANCHOR_WORDS, where matching is attempted.
+DISCLOSURE_PATTERNS = {
+    'name': r"\bmy name(?: is|'s)\b|\bcall me\b|\bi go by\b",
+    'age': rf"\b{_I_AM} \d{{1,3}}\b|\bmy birthday\b|\bi was born\b",
+    'identity': rf"\b{_I_AM} (?:a|an) \w+",
+    'job': r"\bi (?:work|worked|study|studied|teach|major in)\b"
+           r"|\bmy (?:job|boss|career|company|coworkers?|major|degree|school|college|university|class(?:es)?)\b",
+    'location': rf"\bi (?:live|lived|moved|grew up)\b|\b{_I_AM} from\b|\bmy (?:home ?town|city|country|house|apartment)\b",
+    'relationship': r"\bmy (?:wife|husband|partner|girlfriend|boyfriend|fianc[eé]e?|son|daughter|kids?|children|baby"
+                    r"|mom|mum|mother|dad|father|parents?|brothers?|sisters?|siblings?|family|friends?|best friend"
+                    r"|grand\w+|aunt|uncle|cousins?|dogs?|cats?|pets?)\b"
+                    rf"|\b{_I_AM} (?:married|single|divorced|engaged|pregnant|dating)\b",
+    'preference': r"\bi (?:really |absolutely )?(?:love|like|enjoy|hate|dislike|prefer|adore|can't stand)\b"
+                  r"|\bmy (?:favou?rite|hobby|hobbies|passion)\b|\b(?:i'm|im|i am) (?:into|a fan of)\b",
+    'possession': r"\bi (?:have|own|got|drive) (?:a|an|two|three|\d+)\b",
+    'habit': r"\bi (?:usually|always|never|often|used to)\b|\bi've been\b",
+    'goal': rf"\bi (?:want to|plan to|hope to|dream of)\b|\b{_I_AM} (?:planning|trying|going) to\b|\bmy (?:goal|dream|plan)\b",
+    'health': rf"\b{_I_AM} (?:allergic|vegan|vegetarian|diabetic|sick|pregnant)\b|\bi have (?:an? )?(?:allergy|condition|disability)\b",
+}
+
+Extractor = Callable[[List[Dict], List[str]], Awaitable[List[str]]]
+
+ANCHOR_WORDS = ('i', 'im', 'my', 'call')
+
+_ANCHOR_RE = re.compile(r"\b(?:%s)\b" % "|".join(ANCHOR_WORDS), re.IGNORECASE)
+_DISCLOSURE_RE = re.compile(
+    "|".join(f"(?P<{name}>{pattern})" for name, pattern in DISCLOSURE_PATTERNS.items()),
+    re.IGNORECASE
+)
+
+# Filter decisions, exposed through get_memory_filter_stats()
+_filter_stats: Dict[str, int] = {
+    'checked': 0,
+    'passed': 0,
+    'skipped': 0,
+    'audited': 0,
+    'audit_misses': 0,
+}
+# Running background audits, referenced so they aren't garbage collected
+_audit_tasks: Set[asyncio.Task] = set()
+
+def find_disclosure(text: str) -> str:
+    """Name of the first disclosure pattern found in the text, or '' if none"""
+    text = text.replace('’', "'")
+    for anchor in _ANCHOR_RE.finditer(text):
+        match = _DISCLOSURE_RE.match(text, anchor.start())
+        if match:
+            return match.lastgroup
+    return ''
+
+def should_extract(messages: List[Dict]) -> bool:
+    """True when a user message might contain a new fact about the user"""
+    if not MEMORY_FILTER_ENABLED:
+        return True
+    _filter_stats['checked'] += 1
+    if any(find_disclosure(msg.get('content', '')) for msg in messages if msg.get('role') == 'user'):
+        _filter_stats['passed'] += 1
+        MEMORY_FILTER_DECISIONS.inc(decision='passed')
+        return True
+    _filter_stats['skipped'] += 1
+    MEMORY_FILTER_DECISIONS.inc(decision='skipped')
+    return False
+
+def should_audit() -> bool:
+    """Whether a skipped extraction should be sent to the model anyway"""
+    return random.random() < MEMORY_FILTER_AUDIT_RATE
+
+def record_audit(found_memories: bool):
+    """Record what the model found on turns the filter would have skipped"""
+    _filter_stats['audited'] += 1
+    if found_memories:
+        _filter_stats['audit_misses'] += 1
+    MEMORY_FILTER_AUDITS.inc(outcome='missed' if found_memories else 'confirmed')
+
+async def audit_skipped(messages: List[Dict], existing_memories: List[str], extractor: Extractor) -> List[str]:
+    """Run the model on a skipped extraction and count it as a miss if it found anything"""
+    memories = await extractor(messages, existing_memories)
+    record_audit(bool(memories))
+    return memories
+
+async def _run_audit(messages: List[Dict], existing_memories: List[str], extractor: Extractor):
+    try:
+        await audit_skipped(messages, existing_memories, extractor)
+    except Exception as e:
+        logger.warning("Memory filter audit error", extra={"error": str(e)})
+
+def schedule_audit(messages: List[Dict], existing_memories: List[str], extractor: Extractor):
+    """Audit a skipped extraction in the background, the caller returns right away"""
+    task = asyncio.create_task(_run_audit(messages, existing_memories, extractor))
+    _audit_tasks.add(task)
+    task.add_done_callback(_audit_tasks.discard)
+
+def get_memory_filter_stats() -> Dict[str, Any]:
+    """Skip rate and estimated false-negative rate of the pre-filter"""
+    stats = dict(_filter_stats, enabled=MEMORY_FILTER_ENABLED, audit_rate=MEMORY_FILTER_AUDIT_RATE)
+    stats['skip_rate'] = round(stats['skipped'] / stats['checked'], 4) if stats['checked'] else 0.0
+    # Share of skipped extractions that would have produced memories
+    stats['estimated_false_negative_rate'] = (
+        round(stats['audit_misses'] / stats['audited'], 4) if stats['audited'] else None
+    )
+    return stats
@@ -0,0 +1,186 @@
+"""
+User memory retrieval: per-user BM25 index picking the memories relevant to a turn
+"""
+import os
+import math
+import heapq
+from collections import Counter, OrderedDict, defaultdict
+from typing import Dict, List, Optional, Set
+
+from utilities.search_utils import extract_terms
+from utilities.storage import get_user_memories
+
+# Memories injected into the prompt per turn
+MEMORY_TOP_K = int(os.getenv('MEMORY_TOP_K', '8'))
+# Recent history messages that contribute to the retrieval query
+MEMORY_QUERY_HISTORY = int(os.getenv('MEMORY_QUERY_HISTORY', '4'))
+# Users whose index is kept in memory (least recently used are dropped)
+MEMORY_INDEX_MAX_USERS = int(os.getenv('MEMORY_INDEX_MAX_USERS', '1000'))
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+class MemoryIndex:
+    """Incremental BM25 index over one user's memories"""
+
+    def __init__(self):
+        self._contents: Dict[str, str] = {}
+        self._term_freqs: Dict[str, Counter] = {}
+        self._lengths: Dict[str, int] = {}
+        self._postings: Dict[str, Set[str]] = defaultdict(set)
+        self._recency: Dict[str, int] = {}
+        self._total_length = 0
+        self._clock = 0
+
+    def __len__(self) -> int:
+        return len(self._contents)
+
+    def memory_ids(self) -> List[str]:
+        return list(self._contents)
+
+    def add(self, memory_id: str, content: str):
+        """Index a memory, replacing any previous version"""
+        if memory_id in self._contents:
+            self.remove(memory_id)
+        term_freqs = Counter(extract_terms(content))
+        self._contents[memory_id] = content
+        self._term_freqs[memory_id] = term_freqs
+        self._lengths[memory_id] = sum(term_freqs.values())
+        self._total_length += self._lengths[memory_id]
+        for term in term_freqs:
+            self._postings[term].add(memory_id)
+        self._clock += 1
+        self._recency[memory_id] = self._clock
+
+    def remove(self, memory_id: str):
+        """Drop a memory from the index"""
+        if memory_id not in self._contents:
+            return
+        for term in self._term_freqs[memory_id]:
+            postings = self._postings[term]
+            postings.discard(memory_id)
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._lengths.pop(memory_id)
+        del self._contents[memory_id]
+        del self._term_freqs[memory_id]
+        del self._recency[memory_id]
+
+    def top_k(self, query: Counter, k: int) -> List[str]:
+        """
+        Return the k most relevant memories for the query terms. Slots left
+        when fewer than k memories match are filled with the most recent ones.
+        """
+        if len(self._contents) <= k:
+            return [self._contents[memory_id] for memory_id in self._by_recency(list(self._contents), k)]
+
+        count = len(self._contents)
+        average_length = self._total_length / count or 1.0
+        scores: Dict[str, float] = defaultdict(float)
+        for term, query_freq in query.items():
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for memory_id in postings:
+                tf = self._term_freqs[memory_id][term]
+                norm = K1 * (1 - B + B * self._lengths[memory_id] / average_length)
+                scores[memory_id] += query_freq * idf * tf * (K1 + 1) / (tf + norm)
+
+        ranked = heapq.nlargest(k, scores, key=lambda memory_id: (scores[memory_id], self._recency[memory_id]))
+        if len(ranked) < k:
+            chosen = set(ranked)
+            ranked += self._by_recency([m for m in self._contents if m not in chosen], k - len(ranked))
+        return [self._contents[memory_id] for memory_id in ranked]
+
+    def _by_recency(self, memory_ids: List[str], k: int) -> List[str]:
+        return heapq.nlargest(k, memory_ids, key=self._recency.__getitem__)
+
+# user_id -> index, least recently used first
+_indexes: "OrderedDict[str, MemoryIndex]" = OrderedDict()
+# memory_id -> user_id, so updates and deletes by memory id find their index
+_owners: Dict[str, str] = {}
+# Bumped on every write so a load racing with a write can detect it
+_generations: Counter = Counter()
+
+def build_query(message: str, history: List[Dict]) -> Counter:
+    """Retrieval query from the current message (weighted double) and recent turns"""
+    query = Counter(extract_terms(message))
+    query.update(query)
+    for msg in history[-MEMORY_QUERY_HISTORY:]:
+        query.update(extract_terms(msg.get("content", "")))
+    return query
+
+async def get_memory_index(user_id: str) -> MemoryIndex:
+    """Get a user's index, building it from storage on first use"""
+    index = _indexes.get(user_id)
+    if index is not None:
+        _indexes.move_to_end(user_id)
+        return index
+
+    while True:
+        generation = _generations[user_id]
+        memories = await get_user_memories(user_id)
+        if _generations[user_id] == generation:
+            break
+
+    index = _indexes.get(user_id)
+    if index is None:
+        index = MemoryIndex()
+        # Rows come newest first, add oldest first so recency order matches
+        for memory in reversed(memories):
+            index.add(memory['id'], memory['content'])
+            _owners[memory['id']] = user_id
+        _indexes[user_id] = index
+        while len(_indexes) > MEMORY_INDEX_MAX_USERS:
+            evicted_user, evicted = _indexes.popitem(last=False)
+            for memory_id in evicted.memory_ids():
+                _owners.pop(memory_id, None)
+    return index
+
+def index_memory(user_id: str, memory_id: str, content: str):
+    """Add or replace a memory in its user's index, if that index is loaded"""
+    _generations[user_id] += 1
+    index = _indexes.get(user_id)
+    if index is not None:
+        index.add(memory_id, content)
+        _owners[memory_id] = user_id
+
+def reindex_memory(memory_id: str, content: str):
+    """Update a memory's indexed content"""
+    user_id = _owners.get(memory_id)
+    if user_id is not None:
+        index_memory(user_id, memory_id, content)
+
+def unindex_memory(memory_id: str):
+    """Remove a memory from its user's index"""
+    user_id = _owners.pop(memory_id, None)
+    if user_id is not None:
+        _generations[user_id] += 1
+        index = _indexes.get(user_id)
+        if index is not None:
+            index.remove(memory_id)
+
+def drop_memory_index(user_id: str):
+    """Forget a user's index entirely"""
+    _generations[user_id] += 1
+    index = _indexes.pop(user_id, None)
+    if index is not None:
+        for memory_id in index.memory_ids():
+            _owners.pop(memory_id, None)
+
+async def retrieve_memories(user_id: str, message: str, history: List[Dict], k: Optional[int] = None) -> List[str]:
+    """Top-k stored memories of a user for the current turn"""
+    index = await get_memory_index(user_id)
+    return index.top_k(build_query(message, history), k or MEMORY_TOP_K)
+
+def rank_memories(memories: List[str], message: str, history: List[Dict], k: Optional[int] = None) -> List[str]:
+    """Top-k of a client-supplied memory list, most recent assumed first"""
+    k = k or MEMORY_TOP_K
+    if len(memories) <= k:
+        return memories
+    index = MemoryIndex()
+    for position, content in reversed(list(enumerate(memories))):
+        index.add(str(position), content)
+    return index.top_k(build_query(message, history), k)
@@ -0,0 +1,266 @@
+"""
+In-process metrics in the Prometheus text format, served by GET /metrics.
+No client library or collector needed; everything is recorded on the event
+loop, so no locking.
+"""
+import time
+import asyncio
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from starlette.routing import Match
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from utilities.log_utils import get_logger
+
+logger = get_logger(__name__)
+
+# Seconds; covers everything from a cached read to a slow model reply
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Prompt sizes, in characters or tokens
+SIZE_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000)
+# Rough characters per token for English chat text; there is no tokenizer for these models here
+CHARS_PER_TOKEN = 4
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def samples(self) -> Iterable[Sample]:
+        return ()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self.samples():
+            label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+            lines.append(f"{name}{{{label_text}}} {_format_value(value)}" if label_text else f"{name} {_format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> Iterable[Sample]:
+        for key, value in self._values.items():
+            yield f"{self.name}_total", dict(zip(self.labelnames, key)), value
+
+class Gauge(Metric):
+    """Set directly, or read at scrape time from callback() -> {label values: value}"""
+    kind = 'gauge'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        callback: Optional[Callable[[], Dict[LabelValues, float]]] = None
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._callback = callback
+
+    def set(self, value: float, **labels: str):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str):
+        self.inc(-amount, **labels)
+
+    def samples(self) -> Iterable[Sample]:
+        values = self._values
+        if self._callback is not None:
+            try:
+                values = self._callback()
+            except Exception as e:
+                logger.warning("Metric not collected", extra={"metric": self.name, "error": str(e)})
+                values = {}
+        for key, value in values.items():
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        # label values -> (per-bucket counts, sum)
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        if key not in self._values:
+            self._values[key] = ([0] * len(self.buckets), [0.0])
+        counts, total = self._values[key]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        total[0] += value
+
+    @contextmanager
+    def time(self, **labels: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> Iterable[Sample]:
+        for key, (counts, total) in self._values.items():
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f"{self.name}_bucket", dict(labels, le=_format_value(bound)), cumulative
+            yield f"{self.name}_sum", labels, total[0]
+            yield f"{self.name}_count", labels, cumulative
+
+_registry: List[Metric] = []
+
+def render_metrics() -> str:
+    """Every registered metric in the Prometheus text exposition format"""
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# ============ METRICS ============
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route', ('method', 'route', 'status')
+)
+HTTP_IN_FLIGHT = Gauge('http_requests_in_flight', 'HTTP requests being handled', ('method', 'route'))
+
+PROVIDER_REQUEST_SECONDS = Histogram(
+    'provider_request_duration_seconds', 'Model provider call latency', ('provider', 'model', 'outcome')
+)
+PROVIDER_ERRORS = Counter('provider_errors', 'Failed model provider calls', ('provider', 'model', 'error'))
+PROVIDER_IN_FLIGHT = Gauge('provider_requests_in_flight', 'Model provider calls in progress', ('provider',))
+PROMPT_CHARS = Histogram(
+    'provider_prompt_chars', 'Prompt size in characters', ('provider',), buckets=SIZE_BUCKETS
+)
+PROMPT_TOKENS = Histogram(
+    'provider_prompt_tokens_estimated', f'Prompt size in tokens, estimated at {CHARS_PER_TOKEN} characters per token',
+    ('provider',), buckets=SIZE_BUCKETS
+)
+
+DB_QUERY_SECONDS = Histogram('db_query_duration_seconds', 'Storage call latency by function', ('backend', 'function'))
+DB_QUERY_ERRORS = Counter('db_query_errors', 'Storage calls that raised', ('backend', 'function'))
+DB_POOL_WAIT_SECONDS = Histogram(
+    'db_pool_wait_seconds', 'Time waiting for a pooled connection (MySQL) or the writer lock (SQLite)', ('backend',)
+)
+
+MEMORY_FILTER_DECISIONS = Counter(
+    'memory_filter_decisions', 'Memory extraction pre-filter decisions (passed to the model or skipped)', ('decision',)
+)
+MEMORY_FILTER_AUDITS = Counter(
+    'memory_filter_audits', 'Skipped turns checked by the model; outcome missed means it found memories', ('outcome',)
+)
+
+PURGE_BACKLOG = Gauge('purge_backlog', 'Deleted rows waiting for the purge worker', ('kind',))
+PURGED_ROWS = Counter('purged_rows', 'Rows removed by the purge worker', ('kind',))
+
+LOOP_STALL_SECONDS = Histogram(
+    'event_loop_stall_seconds', 'Times a callback held the event loop past LOOP_STALL_THRESHOLD_MS'
+)
+
+def _executor_queue_depth() -> Dict[LabelValues, float]:
+    # run_in_executor(None, ...) jobs waiting for a free worker thread
+    executor = getattr(asyncio.get_running_loop(), '_default_executor', None)
+    queue = getattr(executor, '_work_queue', None)
+    return {(): float(queue.qsize()) if queue is not None else 0.0}
+
+EXECUTOR_QUEUE_DEPTH = Gauge(
+    'executor_queue_depth', 'Jobs waiting in the default thread pool (g4f calls)', callback=_executor_queue_depth
+)
+
+@contextmanager
+def track_provider_call(provider: str, model: str, messages: List[Dict]):
+    """Record prompt size, latency, errors and concurrency of one model call"""
+    chars = sum(len(str(msg.get('content', ''))) for msg in messages)
+    PROMPT_CHARS.observe(chars, provider=provider)
+    PROMPT_TOKENS.observe(chars / CHARS_PER_TOKEN, provider=provider)
+    PROVIDER_IN_FLIGHT.inc(provider=provider)
+    start = time.perf_counter()
+    outcome = 'ok'
+    try:
+        yield
+    except Exception as e:
+        outcome = 'error'
+        PROVIDER_ERRORS.inc(provider=provider, model=model, error=type(e).__name__)
+        raise
+    finally:
+        PROVIDER_IN_FLIGHT.dec(provider=provider)
+        PROVIDER_REQUEST_SECONDS.observe(time.perf_counter() - start, provider=provider, model=model, outcome=outcome)
+
+class MetricsMiddleware:
+    """Per-route latency and in-flight requests, labelled by the route's path template"""
+
+    def __init__(self, app: ASGIApp, routes: Sequence = ()):
+        self.app = app
+        self.routes = routes
+
+    def _route(self, scope: Scope) -> str:
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+        # Unknown paths share one label so scanners can't blow up the series count
+        return 'unmatched'
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        method, route = scope['method'], self._route(scope)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(method=method, route=route)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec(method=method, route=route)
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=method, route=route, status=str(status))
@@ -0,0 +1,85 @@
+"""
+MinHash signatures and LSH buckets for near-duplicate memory detection
+"""
+import os
+import random
+import struct
+import hashlib
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from utilities.search_utils import extract_terms
+
+# Memories at least this similar (Jaccard over normalized words) are duplicates
+MEMORY_DUPLICATE_THRESHOLD = float(os.getenv('MEMORY_DUPLICATE_THRESHOLD', '0.7'))
+
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS  # candidates from ~0.5 similarity up
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_SIGNATURE = struct.Struct('<%dI' % NUM_PERMUTATIONS)
+# Fixed seed: signatures are stored, so they must be identical across processes
+_rng = random.Random(0x6B726979)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERMUTATIONS)]
+
+def stem(word: str) -> str:
+    """Very light suffix stripping so 'likes'/'liked'/'liking' compare equal"""
+    for suffix in ('ing', 'ed', 'es', 's'):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            return word[:-len(suffix)]
+    return word
+
+def shingles(content: str) -> Set[str]:
+    """Normalized word set a memory is compared on"""
+    return {stem(term) for term in extract_terms(content)}
+
+def _token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+
+def minhash_signature(content: str) -> bytes:
+    """NUM_PERMUTATIONS 32-bit minimums, packed little-endian"""
+    hashes = [_token_hash(token) for token in shingles(content)]
+    if not hashes:
+        return _SIGNATURE.pack(*([_MAX_HASH] * NUM_PERMUTATIONS))
+    return _SIGNATURE.pack(*(
+        min(((a * h + b) % _PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    ))
+
+def band_buckets(signature: bytes) -> List[Tuple[int, int]]:
+    """(band, bucket) pairs; memories sharing any pair are candidates"""
+    width = ROWS_PER_BAND * 4
+    return [
+        (band, int.from_bytes(
+            hashlib.blake2b(signature[band * width:(band + 1) * width], digest_size=8).digest(),
+            'little', signed=True
+        ))
+        for band in range(BANDS)
+    ]
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+def closest_duplicate(content: str, candidates: Iterable[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Most similar candidate row at or above MEMORY_DUPLICATE_THRESHOLD"""
+    words = shingles(content)
+    if not words:
+        return None
+    best, best_score = None, MEMORY_DUPLICATE_THRESHOLD
+    for candidate in candidates:
+        score = jaccard(words, shingles(candidate['content']))
+        if score >= best_score:
+            best, best_score = candidate, score
+    return best
+
+def merge_memory_content(existing: str, new: str) -> Optional[str]:
+    """
+    Content to keep when a new memory duplicates an existing one: the new
+    text if it adds words the existing one lacks, otherwise None (skip).
+    """
+    if shingles(new) - shingles(existing) and len(new) > len(existing):
+        return new
+    return None
@@ -0,0 +1,216 @@
+"""
+Persona catalogue search: in-memory inverted index with prefix and one-typo matching
+"""
+import json
+import heapq
+import base64
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from utilities.search_utils import extract_terms
+
+# How much a match in each field counts
+FIELD_WEIGHTS = (('name', 3.0), ('category', 2.0), ('summary', 1.0))
+# Matches on a prefix or with a typo count less than the exact word
+PREFIX_FACTOR = 0.7
+FUZZY_FACTOR = 0.5
+# Shorter query terms only match exactly or as a prefix
+FUZZY_MIN_LENGTH = 4
+PREFIX_MIN_LENGTH = 2
+# Vocabulary terms one query prefix may expand to
+PREFIX_MAX_TERMS = 100
+# Batches at least this big are appended and sorted once instead of inserted in order
+BULK_ADD_SIZE = 64
+
+SortKey = Tuple[str, str]
+
+def _sort_key(name: str) -> SortKey:
+    return (name.lower(), name)
+
+def _deletions(term: str) -> Set[str]:
+    """Every string one character shorter than the term"""
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+def encode_cursor(score: float, name: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([score, name]).encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    """Inverse of encode_cursor; raises ValueError for anything it didn't produce"""
+    try:
+        score, name = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return float(score), str(name)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+class PersonaIndex:
+    """
+    Inverted index over persona name, category and summary. Personas are
+    added and removed one at a time as the registry changes. Query terms
+    match whole words, word prefixes and words one edit away (found through
+    a deletion index, so no scan of the vocabulary).
+    """
+
+    def __init__(self):
+        self._docs: Dict[str, Tuple[str, Dict[str, float]]] = {}
+        self._postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        # deletion of a vocabulary term -> terms it came from
+        self._deletes: Dict[str, Set[str]] = defaultdict(set)
+        self._vocabulary: List[str] = []
+        self._vocabulary_dirty = False
+        # Browse order, overall and per category
+        self._sorted: List[SortKey] = []
+        self._by_category: Dict[str, List[SortKey]] = defaultdict(list)
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, name: str, summary: str, category: str):
+        """Index a persona, replacing any previous version"""
+        self.add_many([(name, summary, category)])
+
+    def add_many(self, personas: Iterable[Tuple[str, str, str]]):
+        """Index (name, summary, category) records, replacing previous versions"""
+        personas = list(personas)
+        bulk = len(personas) >= BULK_ADD_SIZE
+        for name, summary, category in personas:
+            self._add(name, summary, category, bulk)
+        if bulk:
+            self._sorted.sort()
+            for keys in self._by_category.values():
+                keys.sort()
+
+    def _add(self, name: str, summary: str, category: str, bulk: bool):
+        if name in self._docs:
+            self.remove(name)
+        fields = {'name': name, 'category': category, 'summary': summary}
+        weights: Dict[str, float] = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS:
+            for term in set(extract_terms(fields[field])):
+                weights[term] += weight
+        category_key = category.lower()
+        self._docs[name] = (category_key, dict(weights))
+        for term, weight in weights.items():
+            if term not in self._postings:
+                self._add_term(term)
+            self._postings[term][name] = weight
+        for keys in (self._sorted, self._by_category[category_key]):
+            if bulk:
+                keys.append(_sort_key(name))
+            else:
+                insort(keys, _sort_key(name))
+
+    def remove(self, name: str):
+        """Drop a persona from the index"""
+        if name not in self._docs:
+            return
+        category_key, weights = self._docs.pop(name)
+        for term in weights:
+            postings = self._postings[term]
+            postings.pop(name, None)
+            if not postings:
+                del self._postings[term]
+                self._remove_term(term)
+        for keys in (self._sorted, self._by_category[category_key]):
+            position = bisect_left(keys, _sort_key(name))
+            if position < len(keys) and keys[position] == _sort_key(name):
+                del keys[position]
+        if not self._by_category[category_key]:
+            del self._by_category[category_key]
+
+    def _add_term(self, term: str):
+        self._vocabulary_dirty = True
+        if len(term) >= FUZZY_MIN_LENGTH:
+            for deletion in _deletions(term):
+                self._deletes[deletion].add(term)
+
+    def _remove_term(self, term: str):
+        self._vocabulary_dirty = True
+        if len(term) >= FUZZY_MIN_LENGTH:
+            for deletion in _deletions(term):
+                terms = self._deletes.get(deletion)
+                if terms is not None:
+                    terms.discard(term)
+                    if not terms:
+                        del self._deletes[deletion]
+
+    def _prefix_terms(self, prefix: str) -> List[str]:
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+        start = bisect_left(self._vocabulary, prefix)
+        end = bisect_left(self._vocabulary, prefix + '\uffff', start)
+        return self._vocabulary[start:min(end, start + PREFIX_MAX_TERMS)]
+
+    def _fuzzy_terms(self, term: str) -> Set[str]:
+        """Vocabulary terms one insertion, deletion, substitution or adjacent swap away"""
+        matches = set(self._deletes.get(term, ()))
+        for deletion in _deletions(term):
+            if deletion in self._postings:
+                matches.add(deletion)
+            matches.update(self._deletes.get(deletion, ()))
+        matches.discard(term)
+        return matches
+
+    def _term_scores(self, term: str) -> Dict[str, float]:
+        """name -> best score of the term against the persona's words"""
+        scores: Dict[str, float] = dict(self._postings.get(term, {}))
+        variants: List[Tuple[str, float]] = []
+        if len(term) >= PREFIX_MIN_LENGTH:
+            variants.extend((match, PREFIX_FACTOR) for match in self._prefix_terms(term) if match != term)
+        if len(term) >= FUZZY_MIN_LENGTH:
+            variants.extend((match, FUZZY_FACTOR) for match in self._fuzzy_terms(term))
+        for match, factor in variants:
+            for name, weight in self._postings[match].items():
+                if weight * factor > scores.get(name, 0.0):
+                    scores[name] = weight * factor
+        return scores
+
+    def search(
+        self,
+        query: str = "",
+        category: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> Tuple[List[str], Optional[str]]:
+        """
+        Persona names matching every query term, best first, or every
+        persona by name when the query is empty. Returns one page and the
+        cursor of the next one (None on the last page).
+        """
+        category_key = category.lower() if category else None
+        after = decode_cursor(cursor) if cursor else None
+        terms = extract_terms(query)
+        if not terms:
+            keys = self._by_category.get(category_key, []) if category_key else self._sorted
+            start = bisect_right(keys, _sort_key(after[1])) if after else 0
+            end = len(keys) if limit is None else start + limit
+            names = [name for _, name in keys[start:end]]
+            next_cursor = encode_cursor(0.0, names[-1]) if names and end < len(keys) else None
+            return names, next_cursor
+
+        scores: Optional[Dict[str, float]] = None
+        for term in dict.fromkeys(terms):
+            term_scores = self._term_scores(term)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {name: score + term_scores[name] for name, score in scores.items() if name in term_scores}
+            if not scores:
+                return [], None
+        after_key = (-after[0], _sort_key(after[1])) if after else None
+        ranked = (
+            (-score, _sort_key(name)) for name, score in scores.items()
+            if (not category_key or self._docs[name][0] == category_key)
+        )
+        if after_key:
+            ranked = (key for key in ranked if key > after_key)
+        if limit is None:
+            page, more = sorted(ranked), False
+        else:
+            # Only the page (and one more to know there is a next) needs ordering
+            page = heapq.nsmallest(limit + 1, ranked)
+            more = len(page) > limit
+            page = page[:limit]
+        next_cursor = encode_cursor(-page[-1][0], page[-1][1][1]) if more else None
+        return [key[1] for _, key in page], next_cursor
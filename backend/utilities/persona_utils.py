@@ -0,0 +1,436 @@
+"""
+Persona store and in-memory registry. Each persona is a pair of files,
+instructions/{name}.txt and its {name}.meta.json record, written atomically;
+the registry is loaded at startup and kept in sync by a polling watcher.
+"""
+import os
+import re
+import json
+import asyncio
+import hashlib
+import secrets
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+from utilities.persona_search_utils import PersonaIndex
+from utilities.log_utils import get_logger
+
+logger = get_logger(__name__)
+
+INSTRUCTIONS_DIR = "instructions"
+# Legacy summaries, only read for personas whose record has no tagline
+SUMMARIES_FILE = "summaries.json"
+# Sidecar next to instructions/{name}.txt holding metadata worked out once
+METADATA_SUFFIX = ".meta.json"
+# Seconds between checks for added, edited or removed persona files (0 disables)
+PERSONA_WATCH_INTERVAL_SECONDS = float(os.getenv('PERSONA_WATCH_INTERVAL_SECONDS', '5'))
+
+NO_SUMMARY = "No description available"
+
+# gender -> (label, subject, object)
+PRONOUNS = {
+    'female': ("she/her", "she", "her"),
+    'male': ("he/him", "he", "him"),
+    'neutral': ("they/them", "they", "them"),
+}
+
+# name -> {name, instructions, summary, category, gender, pronouns, version}
+_personas: Dict[str, Dict[str, Any]] = {}
+# Bumped whenever any persona changes; each persona keeps the version it last changed at
+_registry_version = 0
+# Versions restart with the process, this keeps cache tags from one run out of the next
+_registry_epoch = secrets.token_hex(4)
+# What the last refresh saw on disk: name -> (instructions mtime_ns, sidecar mtime_ns), plus the summaries file
+_file_mtimes: Dict[str, Tuple[int, Optional[int]]] = {}
+_summaries_mtime: Optional[int] = None
+_summaries: Dict[str, str] = {}
+# Rebuilt on the next listing after a change
+_listing: Optional[List[Dict[str, str]]] = None
+# Search index over the registry, updated persona by persona
+_index = PersonaIndex()
+_loaded = False
+
+# Names become file names, so no path separators or leading dots
+_NAME_RE = re.compile(r"^[^\x00-\x1f\\/:*?\"<>|.][^\x00-\x1f\\/:*?\"<>|]{0,63}$")
+
+def categorize_persona(name: str) -> str:
+    """Categorize persona based on name"""
+    name_lower = name.lower()
+
+    if any(word in name_lower for word in ['mia', 'khalifa', 'beast', 'sharonraj']):
+        return "Celebrity"
+    elif any(word in name_lower for word in ['yumi', 'lina', 'barbie', 'kira']):
+        return "Anime"
+    elif any(word in name_lower for word in ['therapist', 'interviewer']):
+        return "Professional"
+    elif any(word in name_lower for word in ['badgpt', 'evil', 'shinigami']):
+        return "Dark"
+    elif any(word in name_lower for word in ['developer', 'writer']):
+        return "Assistant"
+    else:
+        return "General"
+
+def extract_gender(persona_instructions: str) -> str:
+    """Extract gender from persona instructions"""
+    # Check for explicit GENDER field first
+    lines = persona_instructions.split('\n')
+    for line in lines[:10]:  # Check first 10 lines
+        if line.strip().upper().startswith('GENDER:'):
+            gender = line.split(':', 1)[1].strip().upper()
+            if gender == 'MALE':
+                return 'male'
+            elif gender == 'FEMALE':
+                return 'female'
+            elif gender == 'NEUTRAL':
+                return 'neutral'
+
+    # Fallback: analyze text content
+    text_lower = persona_instructions.lower()
+
+    # Check for explicit gender mentions
+    male_indicators = ['male', 'man', 'boy', 'guy', 'he/him', 'his', 'father', 'boyfriend', 'husband', 'brother', 'son']
+    female_indicators = ['female', 'woman', 'girl', 'lady', 'she/her', 'hers', 'mother', 'girlfriend', 'wife', 'sister', 'daughter']
+
+    male_count = sum(1 for word in male_indicators if word in text_lower)
+    female_count = sum(1 for word in female_indicators if word in text_lower)
+
+    if male_count > female_count:
+        return 'male'
+    elif female_count > male_count:
+        return 'female'
+    else:
+        return 'neutral'
+
+def _mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def metadata_path(name: str) -> str:
+    return os.path.join(INSTRUCTIONS_DIR, f"{name}{METADATA_SUFFIX}")
+
+def build_persona_metadata(
+    name: str,
+    instructions: str,
+    tagline: Optional[str] = None,
+    category: Optional[str] = None
+) -> Dict[str, Any]:
+    """Metadata record for a persona; category falls back to the name heuristic"""
+    content = instructions.encode('utf-8')
+    gender = extract_gender(instructions)
+    return {
+        "name": name,
+        "category": category or categorize_persona(name),
+        "gender": gender,
+        "pronouns": PRONOUNS[gender][0],
+        "tagline": tagline,
+        "content_hash": hashlib.sha256(content).hexdigest(),
+        "size": len(content),
+    }
+
+def _atomic_write(path: str, text: str):
+    """Write through a temp file and rename, readers see the old or the new file, never half of one"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.tmp-', suffix='.part')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def write_persona_metadata(metadata: Dict[str, Any]):
+    _atomic_write(metadata_path(metadata["name"]), json.dumps(metadata, indent=2))
+
+def _read_persona_metadata(name: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(metadata_path(name), 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+        return metadata if isinstance(metadata, dict) else None
+    except (OSError, ValueError):
+        return None
+
+def _scan_instructions() -> Dict[str, Tuple[int, Optional[int]]]:
+    if not os.path.isdir(INSTRUCTIONS_DIR):
+        return {}
+    mtimes = {
+        entry.name: entry.stat().st_mtime_ns
+        for entry in os.scandir(INSTRUCTIONS_DIR)
+        if entry.is_file()
+    }
+    return {
+        filename[:-4]: (mtime, mtimes.get(filename[:-4] + METADATA_SUFFIX))
+        for filename, mtime in mtimes.items()
+        if filename.endswith('.txt')
+    }
+
+def _load_summaries() -> Dict[str, str]:
+    try:
+        with open(SUMMARIES_FILE, 'r', encoding='utf-8') as f:
+            summaries = json.load(f)
+        return summaries if isinstance(summaries, dict) else {}
+    except (OSError, ValueError) as e:
+        if os.path.exists(SUMMARIES_FILE):
+            logger.warning("Persona summaries not reloaded", extra={"error": str(e)})
+        return _summaries
+
+def _load_persona(name: str, summaries: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    """
+    Read a persona and its sidecar. A missing sidecar, or one describing
+    older instructions, is rebuilt (keeping its category and tagline) and
+    written back, which also backfills personas created before sidecars.
+    """
+    try:
+        with open(os.path.join(INSTRUCTIONS_DIR, f"{name}.txt"), 'r', encoding='utf-8') as f:
+            instructions = f.read()
+    except OSError as e:
+        # Removed between the scan and the read, the next refresh drops it
+        logger.warning("Persona not reloaded", extra={"persona": name, "error": str(e)})
+        return None
+
+    metadata = _read_persona_metadata(name)
+    if not metadata or metadata.get("content_hash") != hashlib.sha256(instructions.encode('utf-8')).hexdigest():
+        previous = metadata or {}
+        metadata = build_persona_metadata(
+            name, instructions,
+            tagline=previous.get("tagline") or summaries.get(name),
+            category=previous.get("category")
+        )
+        try:
+            write_persona_metadata(metadata)
+            logger.info("Wrote persona metadata", extra={"persona": name})
+        except OSError as e:
+            logger.warning("Persona metadata not written", extra={"persona": name, "error": str(e)})
+
+    return _persona_entry(name, instructions, metadata, summaries)
+
+def _persona_entry(
+    name: str,
+    instructions: str,
+    metadata: Dict[str, Any],
+    summaries: Optional[Dict[str, str]] = None
+) -> Dict[str, Any]:
+    gender = metadata["gender"] if metadata.get("gender") in PRONOUNS else 'neutral'
+    summaries = _summaries if summaries is None else summaries
+    return {
+        "name": name,
+        "instructions": instructions,
+        "summary": metadata.get("tagline") or summaries.get(name) or NO_SUMMARY,
+        "category": metadata.get("category") or categorize_persona(name),
+        "gender": gender,
+        "pronouns": PRONOUNS[gender],
+        "tagline": metadata.get("tagline"),
+    }
+
+def _mark_changed(names: List[str]):
+    global _registry_version, _listing
+    _registry_version += 1
+    for name in names:
+        if name in _personas:
+            _personas[name]["version"] = _registry_version
+        else:
+            _index.remove(name)
+    _index.add_many(
+        (name, _personas[name]["summary"], _personas[name]["category"])
+        for name in names if name in _personas
+    )
+    _listing = None
+
+def _scan_changes(
+    known: Dict[str, Tuple[int, Optional[int]]],
+    summaries_mtime: Optional[int],
+    summaries: Dict[str, str]
+) -> Dict[str, Any]:
+    """
+    Disk half of a refresh: compare the files with `known` (what the
+    registry last saw) and read only the personas that changed. Touches no
+    registry state, so the watcher can run it in a worker thread.
+    """
+    files = _scan_instructions()
+    current_summaries_mtime = _mtime(SUMMARIES_FILE)
+    summaries_changed = current_summaries_mtime != summaries_mtime
+    if summaries_changed:
+        summaries = _load_summaries() if current_summaries_mtime is not None else {}
+
+    loaded = {}
+    for name, mtimes in files.items():
+        if known.get(name) != mtimes:
+            persona = _load_persona(name, summaries)
+            if persona:
+                # The sidecar may just have been written, don't reload for that
+                loaded[name] = (persona, (mtimes[0], _mtime(metadata_path(name))))
+    return {
+        'known': known,
+        'removed': [name for name in known if name not in files],
+        'loaded': loaded,
+        'summaries': summaries if summaries_changed else None,
+        'summaries_mtime': current_summaries_mtime,
+    }
+
+def _apply_changes(scan: Dict[str, Any]) -> int:
+    """
+    Registry half of a refresh, on the event loop. Personas saved while the
+    scan ran are left as save_persona wrote them. Returns how many changed.
+    """
+    global _summaries_mtime, _summaries, _loaded
+    known = scan['known']
+    changed = []
+    for name in scan['removed']:
+        if _file_mtimes.get(name) == known[name]:
+            _personas.pop(name, None)
+            del _file_mtimes[name]
+            changed.append(name)
+    for name, (persona, mtimes) in scan['loaded'].items():
+        if _file_mtimes.get(name) == known.get(name):
+            _personas[name] = persona
+            _file_mtimes[name] = mtimes
+            changed.append(name)
+    if scan['summaries'] is not None:
+        _summaries = scan['summaries']
+        _summaries_mtime = scan['summaries_mtime']
+        for name, persona in _personas.items():
+            summary = persona["tagline"] or _summaries.get(name) or NO_SUMMARY
+            if name not in scan['loaded'] and persona["summary"] != summary:
+                persona["summary"] = summary
+                changed.append(name)
+
+    if changed or not _loaded:
+        _mark_changed(changed)
+        _loaded = True
+    return len(changed)
+
+def refresh_personas() -> int:
+    """
+    Bring the registry in line with the files on disk. Only personas whose
+    instructions or sidecar changed are read again. Returns how many
+    personas changed. Blocks on disk I/O; the watcher uses
+    refresh_personas_async.
+    """
+    return _apply_changes(_scan_changes(dict(_file_mtimes), _summaries_mtime, _summaries))
+
+async def refresh_personas_async() -> int:
+    """refresh_personas with the scan and reads in a worker thread, so requests keep being served"""
+    scan = await asyncio.to_thread(_scan_changes, dict(_file_mtimes), _summaries_mtime, _summaries)
+    return _apply_changes(scan)
+
+def save_persona(name: str, instructions: str, tagline: str, category: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Create or replace a persona. Only its own two files are written, each
+    atomically, record first so the instructions never appear without it;
+    the registry entry is updated in place. Raises ValueError for names
+    that can't be file names.
+    """
+    if not _loaded:
+        refresh_personas()
+    saved = _write_persona(name, instructions, tagline, category)
+    return _register_saved(name, instructions, *saved)
+
+async def save_persona_async(name: str, instructions: str, tagline: str, category: Optional[str] = None) -> Dict[str, Any]:
+    """save_persona with the file writes in a worker thread, the registry is updated on the loop"""
+    if not _loaded:
+        await refresh_personas_async()
+    saved = await asyncio.to_thread(_write_persona, name, instructions, tagline, category)
+    return _register_saved(name, instructions, *saved)
+
+def _write_persona(
+    name: str,
+    instructions: str,
+    tagline: str,
+    category: Optional[str]
+) -> Tuple[Dict[str, Any], Tuple[int, Optional[int]]]:
+    """Disk half of a save: write both files, return the metadata and their mtimes"""
+    if not _NAME_RE.match(name):
+        raise ValueError(f"Invalid persona name '{name}'")
+    metadata = build_persona_metadata(name, instructions, tagline=tagline, category=category)
+    write_persona_metadata(metadata)
+    path = os.path.join(INSTRUCTIONS_DIR, f"{name}.txt")
+    _atomic_write(path, instructions)
+    return metadata, (_mtime(path), _mtime(metadata_path(name)))
+
+def _register_saved(
+    name: str,
+    instructions: str,
+    metadata: Dict[str, Any],
+    mtimes: Tuple[int, Optional[int]]
+) -> Dict[str, Any]:
+    _personas[name] = _persona_entry(name, instructions, metadata)
+    _file_mtimes[name] = mtimes
+    _mark_changed([name])
+    return _personas[name]
+
+def load_personas() -> int:
+    """Load every persona into the registry; returns the number loaded"""
+    refresh_personas()
+    logger.info("Loaded personas", extra={"personas": len(_personas), "registry_version": _registry_version})
+    return len(_personas)
+
+def get_persona(name: str) -> Optional[Dict[str, Any]]:
+    """Registry entry for a persona, or None if it doesn't exist"""
+    if not _loaded:
+        refresh_personas()
+    return _personas.get(name)
+
+def list_personas() -> List[Dict[str, str]]:
+    """Name, summary and category of every persona"""
+    global _listing
+    if not _loaded:
+        refresh_personas()
+    if _listing is None:
+        _listing = [
+            {"name": p["name"], "summary": p["summary"], "category": p["category"]}
+            for p in _personas.values()
+        ]
+    return _listing
+
+def search_personas(
+    query: str = "",
+    category: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None
+) -> Tuple[List[Dict[str, str]], Optional[str]]:
+    """
+    One page of the catalogue, best matches first (by name without a
+    query), plus the cursor of the next page. Raises ValueError for a bad cursor.
+    """
+    if not _loaded:
+        refresh_personas()
+    names, next_cursor = _index.search(query, category, cursor, limit)
+    return [
+        {"name": name, "summary": _personas[name]["summary"], "category": _personas[name]["category"]}
+        for name in names
+    ], next_cursor
+
+def get_persona_registry_version() -> int:
+    """Version of the registry as a whole, bumped on every change"""
+    return _registry_version
+
+def persona_cache_tag(name: Optional[str] = None) -> Optional[str]:
+    """
+    Tag that changes whenever the catalogue, or the named persona, changes.
+    None for a persona that doesn't exist.
+    """
+    if not _loaded:
+        refresh_personas()
+    if name is None:
+        return f"{_registry_epoch}.{_registry_version}"
+    persona = _personas.get(name)
+    return f"{_registry_epoch}.{persona['version']}" if persona else None
+
+async def run_persona_watcher():
+    """Poll the persona files and refresh the registry when they change"""
+    while True:
+        await asyncio.sleep(PERSONA_WATCH_INTERVAL_SECONDS)
+        try:
+            changed = await refresh_personas_async()
+            if changed:
+                logger.info("Reloaded personas", extra={"personas": changed, "registry_version": _registry_version})
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Persona watcher error")
@@ -0,0 +1,184 @@
+"""
+In-process diagnostics for latency spikes:
+  SamplingProfiler - samples every thread's stack on an interval and returns
+                     the counts in the collapsed-stack format flamegraph.pl,
+                     speedscope and inferno read
+  LoopStallTracer  - watchdog thread that notices when the event loop has not
+                     run for longer than a threshold and captures the stack of
+                     whatever is holding it
+Both run on their own threads and only read frames, so the overhead is one
+stack walk per sample.
+"""
+import os
+import sys
+import time
+import asyncio
+import threading
+import contextvars
+import traceback
+from collections import Counter, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+
+from utilities.log_utils import get_logger
+from utilities.metrics_utils import LOOP_STALL_SECONDS
+
+logger = get_logger(__name__)
+
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', '10'))
+PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', '60'))
+# Trace callbacks holding the event loop longer than this from startup (0 disables)
+LOOP_STALL_THRESHOLD_MS = float(os.getenv('LOOP_STALL_THRESHOLD_MS', '0'))
+# Stalls kept for GET /debug/loop-stalls
+LOOP_STALL_HISTORY = 100
+# Deepest stack kept per sample
+MAX_STACK_DEPTH = 128
+
+class ProfilerBusy(RuntimeError):
+    """Only one profile runs at a time"""
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def collapse_stack(frame) -> List[str]:
+    """Frame labels from the outermost call in"""
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+class SamplingProfiler:
+    """Samples the stack of every other thread every interval seconds"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples = 0
+        self._counts: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = ";".join([names.get(ident, str(ident))] + collapse_stack(frame))
+                self._counts[stack] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        """One "frame;frame;frame count" line per distinct stack"""
+        return "".join(f"{stack} {count}\n" for stack, count in self._counts.most_common())
+
+_profile_lock = asyncio.Lock()
+
+async def run_profile(seconds: float, interval: float) -> SamplingProfiler:
+    """Sample for the given seconds; raises ProfilerBusy if a profile is already running"""
+    if _profile_lock.locked():
+        raise ProfilerBusy("A profile is already running")
+    async with _profile_lock:
+        profiler = SamplingProfiler(interval)
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            await asyncio.to_thread(profiler.stop)
+    logger.info("Profile taken", extra={"seconds": seconds, "samples": profiler.samples})
+    return profiler
+
+class LoopStallTracer:
+    """
+    The loop reschedules a tick every threshold/2. When a tick is overdue by
+    more than the threshold, the watchdog captures the loop thread's stack,
+    which at that moment is the callback holding the loop. The stall is
+    recorded with its full duration once the loop runs the tick again.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, threshold: float):
+        self.loop = loop
+        self.threshold = threshold
+        self.stalls: Deque[Dict[str, Any]] = deque(maxlen=LOOP_STALL_HISTORY)
+        self._interval = threshold / 2
+        self._expected = time.monotonic() + self._interval
+        self._pending: Optional[Dict[str, Any]] = None
+        self._loop_thread: Optional[int] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._stop = threading.Event()
+        self._watchdog = threading.Thread(target=self._watch, name="loop-stall-watchdog", daemon=True)
+
+    def start(self):
+        """Call from the event loop thread"""
+        self._loop_thread = threading.get_ident()
+        self._schedule()
+        self._watchdog.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._handle:
+            self._handle.cancel()
+        self._watchdog.join()
+
+    def _schedule(self):
+        self._expected = time.monotonic() + self._interval
+        # Own context, so stall logs don't carry the request id of whoever started the tracer
+        self._handle = self.loop.call_later(self._interval, self._tick, context=contextvars.Context())
+
+    def _tick(self):
+        blocked = time.monotonic() - self._expected
+        stall, self._pending = self._pending, None
+        if stall is not None:
+            stall['duration_ms'] = round(blocked * 1000, 1)
+            self.stalls.append(stall)
+            LOOP_STALL_SECONDS.observe(blocked)
+            logger.warning("Event loop blocked", extra={
+                "duration_ms": stall['duration_ms'], "stack": stall['stack'][-1] if stall['stack'] else None
+            })
+        self._schedule()
+
+    def _watch(self):
+        while not self._stop.wait(self._interval / 2):
+            if self._pending is not None or time.monotonic() - self._expected <= self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            self._pending = {
+                'detected_at': datetime.now().isoformat(timespec='milliseconds'),
+                'stack': [line.rstrip() for line in traceback.format_stack(frame)],
+                'duration_ms': None,
+            }
+
+_stall_tracer: Optional[LoopStallTracer] = None
+
+def set_loop_stall_threshold(threshold_ms: float) -> Optional[LoopStallTracer]:
+    """(Re)start the stall tracer on the running loop at this threshold; 0 stops it"""
+    global _stall_tracer
+    if _stall_tracer is not None:
+        _stall_tracer.stop()
+        _stall_tracer = None
+    if threshold_ms > 0:
+        _stall_tracer = LoopStallTracer(asyncio.get_running_loop(), threshold_ms / 1000)
+        _stall_tracer.start()
+        logger.info("Loop stall tracer started", extra={"threshold_ms": threshold_ms})
+    return _stall_tracer
+
+def get_loop_stalls() -> Dict[str, Any]:
+    if _stall_tracer is None:
+        return {'enabled': False, 'threshold_ms': 0, 'stalls': []}
+    return {
+        'enabled': True,
+        'threshold_ms': _stall_tracer.threshold * 1000,
+        'stalls': list(_stall_tracer.stalls),
+    }
@@ -0,0 +1,159 @@
+"""
+Provider record/replay: every model call goes through provider_call, which in
+PROVIDER_MODE
+  live   - calls the provider (default)
+  record - calls the provider and appends request, reply or error and latency
+           to the cassette file
+  replay - answers from the cassette, waiting the recorded latency scaled by
+           PROVIDER_REPLAY_LATENCY, without touching the network
+so our own code can be measured offline with the provider held constant.
+"""
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from utilities.log_utils import get_logger
+
+logger = get_logger(__name__)
+
+MODE_LIVE = 'live'
+MODE_RECORD = 'record'
+MODE_REPLAY = 'replay'
+
+PROVIDER_MODE = os.getenv('PROVIDER_MODE', MODE_LIVE).lower()
+PROVIDER_CASSETTE = os.getenv('PROVIDER_CASSETTE', os.path.join('cassettes', 'default.jsonl'))
+# 1 waits as long as the recording, 0 answers immediately
+PROVIDER_REPLAY_LATENCY = float(os.getenv('PROVIDER_REPLAY_LATENCY', '1.0'))
+
+if PROVIDER_MODE not in (MODE_LIVE, MODE_RECORD, MODE_REPLAY):
+    raise ValueError(f"Unknown PROVIDER_MODE '{PROVIDER_MODE}', expected live, record or replay")
+
+# Prompt parts that change on every call and must not affect matching
+_VOLATILE = (
+    (re.compile(r'CURRENT DATE & TIME: [^\n]*'), 'CURRENT DATE & TIME: <now>'),
+)
+
+class CassetteMiss(LookupError):
+    """Replay found no recording for the request"""
+
+class ReplayedProviderError(RuntimeError):
+    """A provider failure that was recorded and is being replayed"""
+
+def _normalize(text: str) -> str:
+    for pattern, placeholder in _VOLATILE:
+        text = pattern.sub(placeholder, text)
+    return text
+
+def request_key(provider: str, model: str, messages: List[Dict], params: Dict[str, Any]) -> str:
+    """Stable hash of a request, ignoring the volatile parts of the prompt"""
+    canonical = {
+        'provider': provider,
+        'model': model,
+        'messages': [{'role': m.get('role'), 'content': _normalize(str(m.get('content', '')))} for m in messages],
+        'params': params,
+    }
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def _last_user_message(messages: List[Dict]) -> str:
+    return next((str(m.get('content', '')) for m in reversed(messages) if m.get('role') == 'user'), '')
+
+class Cassette:
+    """Recorded calls in a JSON-lines file, one call per line"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._by_key: Dict[str, List[Dict]] = defaultdict(list)
+        # (provider, model, last user message) -> recordings, for prompts whose history differs
+        self._by_turn: Dict[tuple, List[Dict]] = defaultdict(list)
+        # Same request recorded several times replays its recordings in turn
+        self._next: Dict[Any, int] = defaultdict(int)
+        self._loaded = False
+        self._write_lock = asyncio.Lock()
+
+    def _index(self, entry: Dict):
+        self._by_key[entry['key']].append(entry)
+        self._by_turn[(entry['provider'], entry['model'], entry['turn'])].append(entry)
+
+    def load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    self._index(json.loads(line))
+        logger.info("Loaded provider cassette", extra={"path": self.path, "requests": len(self._by_key)})
+
+    def find(self, key: str, provider: str, model: str, turn: str) -> Dict:
+        self.load()
+        lookup = key if key in self._by_key else (provider, model, turn)
+        entries = self._by_key.get(key) or self._by_turn.get(lookup)
+        if not entries:
+            raise CassetteMiss(f"No recording in {self.path} for {provider}/{model} request {key[:12]}")
+        entry = entries[self._next[lookup] % len(entries)]
+        self._next[lookup] += 1
+        return entry
+
+    def _append(self, line: str):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+    async def add(self, entry: Dict):
+        self.load()
+        self._index(entry)
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        async with self._write_lock:
+            await asyncio.to_thread(self._append, line)
+
+_cassette = Cassette(PROVIDER_CASSETTE)
+
+async def provider_call(
+    provider: str,
+    model: str,
+    messages: List[Dict],
+    params: Dict[str, Any],
+    call: Callable[[], Awaitable[str]]
+) -> str:
+    """Run call() (the live provider request), or record or replay it per PROVIDER_MODE"""
+    if PROVIDER_MODE == MODE_LIVE:
+        return await call()
+
+    key = request_key(provider, model, messages, params)
+    turn = _last_user_message(messages)
+    if PROVIDER_MODE == MODE_REPLAY:
+        entry = _cassette.find(key, provider, model, turn)
+        await asyncio.sleep(entry['latency_s'] * PROVIDER_REPLAY_LATENCY)
+        if entry['error']:
+            raise ReplayedProviderError(f"{entry['error']['type']}: {entry['error']['message']}")
+        return entry['response']
+
+    async def record(response: Optional[str], error: Optional[Dict[str, str]]):
+        await _cassette.add({
+            'key': key,
+            'provider': provider,
+            'model': model,
+            'turn': turn,
+            'request': {'messages': messages, 'params': params},
+            'response': response,
+            'error': error,
+            'latency_s': round(time.perf_counter() - start, 4),
+            'recorded_at': datetime.now().isoformat(timespec='seconds'),
+        })
+
+    start = time.perf_counter()
+    try:
+        response = await call()
+    except Exception as e:
+        await record(None, {'type': type(e).__name__, 'message': str(e)})
+        raise
+    await record(response, None)
+    return response
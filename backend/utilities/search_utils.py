@@ -0,0 +1,60 @@
+"""
+Search result helpers: query terms and highlighted snippets
+"""
+import re
+import html
+from typing import List
+
+SNIPPET_CHARS = 160
+
+_TAG_RE = re.compile(r'<[^>]+>')
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+# Words too common to rank on; matching them means scoring nearly every message
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been
+before being below between both but by can could did do does doing down during
+each few for from further had has have having he her here hers herself him
+himself his how i if in into is it its itself just me more most my myself no
+nor not now of off on once only or other our ours ourselves out over own same
+she should so some such than that the their theirs them themselves then there
+these they this those through to too under until up very was we were what when
+where which while who whom why will with would you your yours yourself
+yourselves im ive dont youre thats its com www
+""".split())
+
+def extract_terms(query: str) -> List[str]:
+    """Split a search query into lowercase terms, dropping stopwords"""
+    terms = (term.lower() for term in _TERM_RE.findall(query))
+    return [term for term in terms if term not in STOPWORDS]
+
+def highlight_snippet(content: str, terms: List[str], max_chars: int = SNIPPET_CHARS) -> str:
+    """
+    Build an HTML-safe snippet around the first matching term, with every
+    term occurrence wrapped in <mark></mark>.
+    """
+    text = ' '.join(_TAG_RE.sub('', content).split())
+    if not terms:
+        return html.escape(text[:max_chars])
+    
+    pattern = re.compile('|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+    match = pattern.search(text)
+    start = 0
+    if match and len(text) > max_chars:
+        start = max(0, min(match.start() - max_chars // 3, len(text) - max_chars))
+    window = text[start:start + max_chars]
+    
+    parts = []
+    last = 0
+    for m in pattern.finditer(window):
+        parts.append(html.escape(window[last:m.start()]))
+        parts.append(f"<mark>{html.escape(m.group(0))}</mark>")
+        last = m.end()
+    parts.append(html.escape(window[last:]))
+    
+    snippet = ''.join(parts)
+    if start > 0:
+        snippet = '…' + snippet
+    if start + max_chars < len(text):
+        snippet += '…'
+    return snippet
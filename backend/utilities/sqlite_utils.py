@@ -0,0 +1,887 @@
+"""
+SQLite Database Utilities
+
+Embedded drop-in for db_utils (STORAGE_BACKEND=sqlite) for single-box and
+test deployments. Same function signatures and row shapes as the MySQL
+backend; runs in WAL mode with one writer connection and a few readers.
+"""
+import os
+import time
+import uuid
+import asyncio
+import sqlite3
+import aiosqlite
+from typing import Optional, List, Dict, Any, AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from utilities.compression_utils import (
+    encode_content, decode_message_row, pack_archive, unpack_archive,
+    CODEC_NONE, ARCHIVE_CODEC
+)
+from utilities.search_utils import extract_terms
+from utilities.minhash_utils import (
+    minhash_signature, band_buckets, closest_duplicate, merge_memory_content
+)
+from utilities.metrics_utils import DB_POOL_WAIT_SECONDS
+from utilities.log_utils import get_logger
+
+logger = get_logger(__name__)
+
+# Database file (':memory:' gives a throwaway database, handy for tests)
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'kriyan_ai.db')
+# Read-only connections served round-robin; writes go through one connection
+SQLITE_READERS = int(os.getenv('SQLITE_READERS', '4'))
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'schema_sqlite.sql')
+
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",  # 64 MB page cache
+    "PRAGMA mmap_size = 268435456",  # 256 MB
+)
+
+# Timestamps round-trip as datetime like they do through aiomysql
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_converter('TIMESTAMP', lambda value: datetime.fromisoformat(value.decode()))
+
+_writer: Optional[aiosqlite.Connection] = None
+_readers: List[aiosqlite.Connection] = []
+_next_reader = 0
+_write_lock = asyncio.Lock()
+# Connections kept for _snapshot(), checked out one caller at a time
+_snapshot_conns: List[aiosqlite.Connection] = []
+
+async def _connect() -> aiosqlite.Connection:
+    conn = await aiosqlite.connect(
+        SQLITE_PATH,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        isolation_level=None  # autocommit, transactions are explicit
+    )
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        await conn.execute(pragma)
+    return conn
+
+# Columns added after the first release, for database files created before them:
+# (table, column, ALTER statement, statements that fill in existing rows...)
+MIGRATIONS = (
+    ('user_memories', 'minhash', "ALTER TABLE user_memories ADD COLUMN minhash BLOB"),
+    ('conversations', 'memory_watermark', "ALTER TABLE conversations ADD COLUMN memory_watermark INTEGER NOT NULL DEFAULT 0"),
+    ('conversations', 'summary', "ALTER TABLE conversations ADD COLUMN summary TEXT"),
+    ('conversations', 'message_count', "ALTER TABLE conversations ADD COLUMN message_count INTEGER NOT NULL DEFAULT 0",
+     """UPDATE conversations SET message_count =
+        (SELECT COUNT(*) FROM messages WHERE messages.conversation_id = conversations.id)
+        + COALESCE((SELECT message_count FROM message_archive WHERE message_archive.conversation_id = conversations.id), 0)"""),
+)
+
+async def _migrate(conn: aiosqlite.Connection):
+    for table, column, *statements in MIGRATIONS:
+        async with conn.execute(f"PRAGMA table_info({table})") as cursor:
+            columns = {row['name'] for row in await cursor.fetchall()}
+        if column not in columns:
+            for statement in statements:
+                await conn.execute(statement)
+
+async def init_db_pool():
+    """Open the writer and reader connections and apply the schema"""
+    global _writer, _readers
+    if _writer is None:
+        _writer = await _connect()
+        with open(SCHEMA_FILE, 'r', encoding='utf-8') as f:
+            await _writer.executescript(f.read())
+        await _migrate(_writer)
+        if SQLITE_PATH == ':memory:':
+            # Every connection to :memory: is a separate database
+            _readers = [_writer]
+        else:
+            _readers = [await _connect() for _ in range(max(1, SQLITE_READERS))]
+        logger.info("SQLite database opened", extra={"path": SQLITE_PATH, "readers": len(_readers)})
+
+async def close_db_pool():
+    """Close all connections"""
+    global _writer, _readers
+    if _writer:
+        for conn in _readers:
+            if conn is not _writer:
+                await conn.close()
+        for conn in _snapshot_conns:
+            await conn.close()
+        _snapshot_conns.clear()
+        await _writer.close()
+        _writer = None
+        _readers = []
+        logger.info("SQLite database closed")
+
+async def _reader() -> aiosqlite.Connection:
+    global _next_reader
+    if _writer is None:
+        await init_db_pool()
+    _next_reader = (_next_reader + 1) % len(_readers)
+    return _readers[_next_reader]
+
+@asynccontextmanager
+async def _transaction():
+    """Serialize writers and run the block in one IMMEDIATE transaction"""
+    if _writer is None:
+        await init_db_pool()
+
+    start = time.perf_counter()
+    async with _write_lock:
+        DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - start, backend='sqlite')
+        await _writer.execute("BEGIN IMMEDIATE")
+        try:
+            yield _writer
+            await _writer.execute("COMMIT")
+        except BaseException:
+            await _writer.execute("ROLLBACK")
+            raise
+
+@asynccontextmanager
+async def _snapshot():
+    """
+    A connection holding one read transaction, so several statements see the
+    same data. Not one of the shared readers: a transaction left open there
+    would hide newer writes from everyone else reading through it.
+    """
+    if _writer is None:
+        await init_db_pool()
+
+    if SQLITE_PATH == ':memory:':
+        # The writer is the only connection, and it can't have two transactions open
+        async with _write_lock:
+            await _writer.execute("BEGIN")
+            try:
+                yield _writer
+            finally:
+                await _writer.execute("COMMIT")
+        return
+
+    conn = _snapshot_conns.pop() if _snapshot_conns else await _connect()
+    await conn.execute("BEGIN")
+    try:
+        yield conn
+    finally:
+        await conn.execute("COMMIT")
+        if len(_snapshot_conns) < SQLITE_READERS:
+            _snapshot_conns.append(conn)
+        else:
+            await conn.close()
+
+async def _fetchone(query: str, args: tuple = ()) -> Optional[Dict[str, Any]]:
+    conn = await _reader()
+    async with conn.execute(query, args) as cursor:
+        row = await cursor.fetchone()
+    return dict(row) if row else None
+
+async def _fetchall(query: str, args: tuple = ()) -> List[Dict[str, Any]]:
+    conn = await _reader()
+    async with conn.execute(query, args) as cursor:
+        return [dict(row) for row in await cursor.fetchall()]
+
+async def _execute(query: str, args: tuple = ()) -> int:
+    async with _transaction() as conn:
+        async with conn.execute(query, args) as cursor:
+            return cursor.rowcount
+
+# ============ USER FUNCTIONS ============
+
+async def create_user(user_id: str, email: str, display_name: str, photo_url: Optional[str] = None):
+    """Create a new user, or start a deleted one over as a new account"""
+    async with _transaction() as conn:
+        async with conn.execute("SELECT deleted_at FROM users WHERE id = ?", (user_id,)) as cursor:
+            existing = await cursor.fetchone()
+        if existing and existing['deleted_at']:
+            # Signed back in before the purge finished: nothing of the old account
+            # carries over, its conversations stay deleted for the purge worker
+            await conn.execute("DELETE FROM user_memories WHERE user_id = ?", (user_id,))
+            await conn.execute("DELETE FROM user_settings WHERE user_id = ?", (user_id,))
+            await conn.execute(
+                """UPDATE users SET display_name = ?, photo_url = ?, subscription = 'free',
+                   encryption_key_backup = NULL, encryption_key_salt = NULL, deleted_at = NULL,
+                   created_at = strftime('%Y-%m-%d %H:%M:%f', 'now'),
+                   updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now')
+                   WHERE id = ?""",
+                (display_name, photo_url, user_id)
+            )
+            return
+
+        await conn.execute(
+            """INSERT INTO users (id, email, display_name, photo_url, subscription)
+               VALUES (?, ?, ?, ?, 'free')
+               ON CONFLICT (id) DO UPDATE SET
+               display_name = excluded.display_name,
+               photo_url = excluded.photo_url,
+               updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now')""",
+            (user_id, email, display_name, photo_url)
+        )
+
+async def get_user(user_id: str) -> Optional[Dict[str, Any]]:
+    """Get user by ID"""
+    return await _fetchone(
+        "SELECT * FROM users WHERE id = ? AND deleted_at IS NULL",
+        (user_id,)
+    )
+
+async def mark_user_deleted(user_id: str):
+    """Hide a user and all their conversations, the purge worker removes the data"""
+    async with _transaction() as conn:
+        await conn.execute(
+            "UPDATE users SET deleted_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE id = ? AND deleted_at IS NULL",
+            (user_id,)
+        )
+        await conn.execute(
+            """UPDATE conversations SET deleted_at = strftime('%Y-%m-%d %H:%M:%f', 'now')
+               WHERE user_id = ? AND deleted_at IS NULL""",
+            (user_id,)
+        )
+
+async def update_user(user_id: str, updates: Dict[str, Any]):
+    """Update user profile"""
+    if not updates:
+        return
+
+    set_clause = ", ".join([f"{key} = ?" for key in updates.keys()])
+    query = f"UPDATE users SET {set_clause}, updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE id = ?"
+    await _execute(query, (*updates.values(), user_id))
+
+# ============ CONVERSATION FUNCTIONS ============
+
+async def create_conversation(
+    user_id: str,
+    persona_name: str,
+    title: str,
+    model: str,
+    encrypted: bool = False
+) -> str:
+    """Create a new conversation"""
+    conversation_id = str(uuid.uuid4())
+    await _execute(
+        """INSERT INTO conversations (id, user_id, persona_name, title, model, encrypted)
+           VALUES (?, ?, ?, ?, ?, ?)""",
+        (conversation_id, user_id, persona_name, title, model, encrypted)
+    )
+    return conversation_id
+
+async def get_conversation(conversation_id: str) -> Optional[Dict[str, Any]]:
+    """Get conversation by ID"""
+    return await _fetchone(
+        "SELECT * FROM conversations WHERE id = ? AND deleted_at IS NULL",
+        (conversation_id,)
+    )
+
+async def get_conversation_version(conversation_id: str) -> Optional[Dict[str, Any]]:
+    """The columns that change whenever the conversation or its messages do, by primary key"""
+    return await _fetchone(
+        """SELECT updated_at, message_count, title, is_pinned, memory_watermark
+           FROM conversations WHERE id = ? AND deleted_at IS NULL""",
+        (conversation_id,)
+    )
+
+async def get_user_conversations(user_id: str) -> List[Dict[str, Any]]:
+    """Get all conversations for a user"""
+    return await _fetchall(
+        """SELECT * FROM conversations
+           WHERE user_id = ? AND deleted_at IS NULL
+           ORDER BY updated_at DESC""",
+        (user_id,)
+    )
+
+async def update_conversation(conversation_id: str, updates: Dict[str, Any]):
+    """Update conversation"""
+    if not updates:
+        return
+
+    set_clause = ", ".join([f"{key} = ?" for key in updates.keys()])
+    query = f"UPDATE conversations SET {set_clause}, updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE id = ?"
+    await _execute(query, (*updates.values(), conversation_id))
+
+async def delete_conversation(conversation_id: str):
+    """Hide a conversation right away, the purge worker removes its messages"""
+    await _execute(
+        """UPDATE conversations SET deleted_at = strftime('%Y-%m-%d %H:%M:%f', 'now')
+           WHERE id = ? AND deleted_at IS NULL""",
+        (conversation_id,)
+    )
+
+# ============ MESSAGE FUNCTIONS ============
+
+async def add_message(
+    conversation_id: str,
+    role: str,
+    content: str,
+    encrypted: bool = False
+) -> Optional[str]:
+    """Add a message to a conversation, None if it doesn't exist or was deleted"""
+    message_id = str(uuid.uuid4())
+    codec, blob = encode_content(content, encrypted)
+
+    # Writing to a cold conversation brings it back to the hot table
+    await promote_conversation(conversation_id)
+
+    async with _transaction() as conn:
+        async with conn.execute(
+            """UPDATE conversations SET updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now'),
+               message_count = message_count + 1 WHERE id = ? AND deleted_at IS NULL""",
+            (conversation_id,)
+        ) as cursor:
+            if not cursor.rowcount:
+                return None
+        await conn.execute(
+            """INSERT INTO messages (id, conversation_id, role, content, encrypted, content_codec, content_blob)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (message_id, conversation_id, role, content if codec == CODEC_NONE else '', encrypted, codec, blob)
+        )
+
+    return message_id
+
+async def get_conversation_messages(conversation_id: str) -> List[Dict[str, Any]]:
+    """Get all messages for a conversation, including archived ones (none once it is deleted)"""
+    # One snapshot, so an archive or promote between the two reads can't drop or repeat messages
+    async with _snapshot() as conn:
+        async with conn.execute(
+            """SELECT a.codec, a.payload FROM message_archive a
+               JOIN conversations c ON c.id = a.conversation_id
+               WHERE a.conversation_id = ? AND c.deleted_at IS NULL""",
+            (conversation_id,)
+        ) as cursor:
+            archive = await cursor.fetchone()
+        async with conn.execute(
+            """SELECT m.* FROM messages m
+               JOIN conversations c ON c.id = m.conversation_id
+               WHERE m.conversation_id = ? AND c.deleted_at IS NULL
+               ORDER BY m.created_at ASC, m.id ASC""",
+            (conversation_id,)
+        ) as cursor:
+            rows = [dict(row) for row in await cursor.fetchall()]
+
+    messages = [decode_message_row(row) for row in rows]
+    if archive:
+        messages = unpack_archive(archive) + messages
+        messages.sort(key=lambda msg: (msg['created_at'], msg['id']))
+    return messages
+
+async def get_last_messages(user_id: str) -> Dict[str, Dict[str, Any]]:
+    """Newest hot message of each of a user's conversations, by conversation id"""
+    rows = await _fetchall(
+        """SELECT * FROM (
+               SELECT m.*, ROW_NUMBER() OVER (
+                   PARTITION BY m.conversation_id ORDER BY m.created_at DESC, m.id DESC
+               ) AS position
+               FROM messages m
+               JOIN conversations c ON c.id = m.conversation_id
+               WHERE c.user_id = ? AND c.deleted_at IS NULL
+           )
+           WHERE position = 1""",
+        (user_id,)
+    )
+    return {row['conversation_id']: decode_message_row(row) for row in rows}
+
+async def get_conversation_messages_since(conversation_id: str, message_id: str) -> Optional[List[Dict[str, Any]]]:
+    """Messages after message_id in conversation order, None if it isn't one of the conversation's"""
+    anchor = await _fetchone(
+        """SELECT m.created_at, m.id FROM messages m
+           JOIN conversations c ON c.id = m.conversation_id
+           WHERE m.id = ? AND m.conversation_id = ? AND c.deleted_at IS NULL""",
+        (message_id, conversation_id)
+    )
+    if not anchor:
+        # Archived, or not in this conversation at all
+        messages = await get_conversation_messages(conversation_id)
+        ids = [msg['id'] for msg in messages]
+        return messages[ids.index(message_id) + 1:] if message_id in ids else None
+
+    rows = await _fetchall(
+        """SELECT * FROM messages
+           WHERE conversation_id = ? AND (created_at > ? OR (created_at = ? AND id > ?))
+           ORDER BY created_at ASC, id ASC""",
+        (conversation_id, anchor['created_at'], anchor['created_at'], anchor['id'])
+    )
+    return [decode_message_row(row) for row in rows]
+
+async def delete_conversation_messages(conversation_id: str):
+    """Delete all messages for a conversation"""
+    async with _transaction() as conn:
+        await conn.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+        await conn.execute("DELETE FROM message_archive WHERE conversation_id = ?", (conversation_id,))
+        # Enrichment starts over, the watermark counts messages from the first one
+        await conn.execute(
+            """UPDATE conversations SET message_count = 0, memory_watermark = 0, summary = NULL,
+               updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE id = ?""",
+            (conversation_id,)
+        )
+
+# ============ ARCHIVE FUNCTIONS ============
+
+async def archive_conversation(conversation_id: str) -> int:
+    """
+    Move a conversation's messages into the archive, returns messages moved.
+    The newest message stays in the hot table so the conversation list can
+    preview it without opening the archive.
+    """
+    async with _transaction() as conn:
+        async with conn.execute(
+            "SELECT id FROM conversations WHERE id = ? AND archived = 0",
+            (conversation_id,)
+        ) as cursor:
+            if not await cursor.fetchone():
+                return 0
+
+        async with conn.execute(
+            "SELECT * FROM messages WHERE conversation_id = ? ORDER BY created_at ASC, id ASC",
+            (conversation_id,)
+        ) as cursor:
+            messages = [decode_message_row(dict(row)) for row in await cursor.fetchall()][:-1]
+
+        if messages:
+            await conn.execute(
+                """INSERT INTO message_archive (conversation_id, codec, payload, message_count)
+                   VALUES (?, ?, ?, ?)""",
+                (conversation_id, ARCHIVE_CODEC, pack_archive(messages), len(messages))
+            )
+            await conn.executemany("DELETE FROM messages WHERE id = ?", [(msg['id'],) for msg in messages])
+
+        # Flagged even with nothing to move, so the archiver doesn't pick it again
+        await conn.execute("UPDATE conversations SET archived = 1 WHERE id = ?", (conversation_id,))
+
+    return len(messages)
+
+async def promote_conversation(conversation_id: str) -> int:
+    """Move archived messages back to the hot table, returns messages restored"""
+    if not await _fetchone(
+        "SELECT 1 FROM conversations WHERE id = ? AND archived = 1 AND deleted_at IS NULL",
+        (conversation_id,)
+    ):
+        return 0
+
+    async with _transaction() as conn:
+        async with conn.execute(
+            "SELECT 1 FROM conversations WHERE id = ? AND archived = 1",
+            (conversation_id,)
+        ) as cursor:
+            if not await cursor.fetchone():
+                return 0
+        async with conn.execute(
+            "SELECT codec, payload FROM message_archive WHERE conversation_id = ?",
+            (conversation_id,)
+        ) as cursor:
+            archive = await cursor.fetchone()
+
+        rows = []
+        for msg in unpack_archive(dict(archive)) if archive else []:
+            codec, blob = encode_content(msg['content'], msg['encrypted'])
+            content = msg['content'] if codec == CODEC_NONE else ''
+            rows.append((
+                msg['id'], msg['conversation_id'], msg['role'], content,
+                msg['encrypted'], codec, blob, msg['created_at']
+            ))
+
+        await conn.executemany(
+            """INSERT OR IGNORE INTO messages
+               (id, conversation_id, role, content, encrypted, content_codec, content_blob, created_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            rows
+        )
+        await conn.execute("DELETE FROM message_archive WHERE conversation_id = ?", (conversation_id,))
+        # Touch updated_at so the archiver doesn't take it back before the write lands
+        await conn.execute(
+            """UPDATE conversations SET archived = 0,
+               updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE id = ?""",
+            (conversation_id,)
+        )
+
+    return len(rows)
+
+async def archive_idle_conversations(idle_days: int, batch_size: int) -> int:
+    """Archive up to batch_size conversations idle for idle_days, returns count archived"""
+    idle = await _fetchall(
+        """SELECT id FROM conversations
+           WHERE archived = 0 AND deleted_at IS NULL
+           AND updated_at < strftime('%Y-%m-%d %H:%M:%f', 'now', '-' || ? || ' days')
+           ORDER BY updated_at ASC
+           LIMIT ?""",
+        (idle_days, batch_size)
+    )
+
+    for conv in idle:
+        await archive_conversation(conv['id'])
+
+    return len(idle)
+
+# ============ SEARCH FUNCTIONS ============
+
+# Title hits are rarer and more descriptive than body hits, so rank them higher
+TITLE_MATCH_BOOST = 2.0
+# Terms in more than this share of messages are too common to rank on: BM25
+# has to score every matching row, which dominates latency on large histories
+COMMON_TERM_RATIO = 0.05
+# Below this many matching rows BM25 is cheap, so no term counts as common
+COMMON_TERM_MIN_DOCS = 5000
+# Seconds the message count used for COMMON_TERM_RATIO is reused
+MESSAGE_COUNT_TTL_SECONDS = 60
+
+_message_count = (0, 0.0)
+
+def _fts_query(terms: List[str]) -> str:
+    return " OR ".join(f'"{term}"' for term in terms)
+
+async def _count_messages() -> int:
+    """Rows in the (global) FTS index, cached for MESSAGE_COUNT_TTL_SECONDS"""
+    global _message_count
+    count, counted_at = _message_count
+    if time.monotonic() - counted_at > MESSAGE_COUNT_TTL_SECONDS:
+        count = (await _fetchone("SELECT COUNT(*) AS n FROM messages"))['n']
+        _message_count = (count, time.monotonic())
+    return count
+
+async def _rankable_terms(terms: List[str]) -> List[str]:
+    """
+    Drop terms that match too large a share of all messages. The index is
+    shared by every user, so what BM25 has to score is the term's row count
+    across all of them. If every term is that common, all are kept.
+    """
+    limit = max(COMMON_TERM_MIN_DOCS, await _count_messages() * COMMON_TERM_RATIO)
+    placeholders = ", ".join("?" for _ in terms)
+    counts = await _fetchall(
+        f"SELECT term, doc FROM messages_fts_vocab WHERE term IN ({placeholders})",
+        tuple(terms)
+    )
+    doc_counts = {row['term']: row['doc'] for row in counts}
+    rankable = [term for term in terms if doc_counts.get(term, 0) <= limit]
+    return rankable or terms
+
+async def search_user_messages(user_id: str, query: str, limit: int, offset: int) -> List[Dict[str, Any]]:
+    """
+    Full-text search over a user's conversation titles and message bodies.
+
+    Like the MySQL backend: any-term matching ranked by BM25, skipping
+    encrypted, deleted and archived content. Compressed bodies keep no
+    plain text either, so with MESSAGE_COMPRESSION on, long replies drop
+    out of search.
+
+    Recall differs from MySQL when a query mixes common and selective
+    terms: message bodies are matched on the selective terms only (see
+    _rankable_terms), so "python error" finds messages containing "error"
+    but not ones that only mention "python". Titles match on every term.
+    """
+    terms = extract_terms(query)
+    if not terms:
+        return []
+    window = offset + limit
+    message_match = _fts_query(await _rankable_terms(terms))
+
+    # Ids break ties, so pages don't repeat or skip equally scored rows
+    rows = await _fetchall(
+        """SELECT * FROM (
+               SELECT * FROM (
+                   SELECT 'title' AS matched_in, c.id AS conversation_id, NULL AS message_id,
+                          c.title, c.persona_name, NULL AS role, c.title AS content,
+                          c.updated_at AS created_at,
+                          -bm25(conversations_fts) * ? AS score
+                   FROM conversations_fts
+                   JOIN conversations c ON c.rowid = conversations_fts.rowid
+                   WHERE conversations_fts MATCH ?
+                   AND c.user_id = ? AND c.deleted_at IS NULL AND c.encrypted = 0
+                   ORDER BY score DESC, c.updated_at DESC, c.id
+                   LIMIT ?
+               )
+               UNION ALL
+               SELECT * FROM (
+                   SELECT 'message' AS matched_in, c.id AS conversation_id, m.id AS message_id,
+                          c.title, c.persona_name, m.role, m.content,
+                          m.created_at,
+                          -bm25(messages_fts) AS score
+                   FROM messages_fts
+                   JOIN messages m ON m.rowid = messages_fts.rowid
+                   JOIN conversations c ON c.id = m.conversation_id
+                   WHERE messages_fts MATCH ?
+                   AND c.user_id = ? AND c.deleted_at IS NULL AND c.encrypted = 0
+                   AND m.encrypted = 0
+                   ORDER BY score DESC, m.created_at DESC, m.id
+                   LIMIT ?
+               )
+           )
+           ORDER BY score DESC, created_at DESC, conversation_id, message_id
+           LIMIT ? OFFSET ?""",
+        (
+            TITLE_MATCH_BOOST, _fts_query(terms), user_id, window,
+            message_match, user_id, window,
+            limit, offset
+        )
+    )
+    # Declared types are lost through the UNION, parse timestamps by hand
+    for row in rows:
+        if isinstance(row['created_at'], str):
+            row['created_at'] = datetime.fromisoformat(row['created_at'])
+    return rows
+
+# ============ EXPORT FUNCTIONS ============
+
+async def _stream_rows(conn: aiosqlite.Connection, query: str, args: tuple) -> AsyncIterator[Dict[str, Any]]:
+    async with conn.execute(query, args) as cursor:
+        async for row in cursor:
+            yield dict(row)
+
+async def iter_user_export(user_id: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream everything stored for a user as typed records. All reads share
+    one snapshot, so the archiver can't move messages between them.
+    """
+    async with _snapshot() as conn:
+        async for row in _stream_rows(
+            conn,
+            "SELECT * FROM users WHERE id = ? AND deleted_at IS NULL",
+            (user_id,)
+        ):
+            yield {'type': 'user', **row}
+
+        async for row in _stream_rows(
+            conn,
+            """SELECT * FROM conversations
+               WHERE user_id = ? AND deleted_at IS NULL
+               ORDER BY created_at ASC""",
+            (user_id,)
+        ):
+            yield {'type': 'conversation', **row}
+
+        async for row in _stream_rows(
+            conn,
+            """SELECT m.* FROM messages m
+               JOIN conversations c ON c.id = m.conversation_id
+               WHERE c.user_id = ? AND c.deleted_at IS NULL
+               ORDER BY m.conversation_id, m.created_at ASC""",
+            (user_id,)
+        ):
+            yield {'type': 'message', **decode_message_row(row)}
+
+        async for archive in _stream_rows(
+            conn,
+            """SELECT a.codec, a.payload FROM message_archive a
+               JOIN conversations c ON c.id = a.conversation_id
+               WHERE c.user_id = ? AND c.deleted_at IS NULL""",
+            (user_id,)
+        ):
+            for row in unpack_archive(archive):
+                yield {'type': 'message', **row}
+
+        async for row in _stream_rows(
+            conn,
+            """SELECT id, user_id, content, category, created_at, updated_at
+               FROM user_memories WHERE user_id = ? ORDER BY created_at ASC""",
+            (user_id,)
+        ):
+            yield {'type': 'memory', **row}
+
+# ============ PURGE FUNCTIONS ============
+
+async def get_deleted_conversation_ids(limit: int) -> List[str]:
+    """Get conversations waiting to be purged, oldest deletion first"""
+    rows = await _fetchall(
+        """SELECT id FROM conversations
+           WHERE deleted_at IS NOT NULL
+           ORDER BY deleted_at ASC
+           LIMIT ?""",
+        (limit,)
+    )
+    return [row['id'] for row in rows]
+
+async def count_pending_purges() -> Dict[str, int]:
+    """Count conversations and users waiting to be purged"""
+    conversations = await _fetchone("SELECT COUNT(*) AS n FROM conversations WHERE deleted_at IS NOT NULL")
+    users = await _fetchone("SELECT COUNT(*) AS n FROM users WHERE deleted_at IS NOT NULL")
+    return {'conversations': conversations['n'], 'users': users['n']}
+
+async def purge_message_batch(conversation_id: str, batch_size: int) -> int:
+    """Delete up to batch_size messages of a conversation, returns rows deleted"""
+    return await _execute(
+        """DELETE FROM messages WHERE rowid IN
+           (SELECT rowid FROM messages WHERE conversation_id = ? LIMIT ?)""",
+        (conversation_id, batch_size)
+    )
+
+async def purge_conversation_row(conversation_id: str):
+    """Delete a deleted conversation once its messages are gone"""
+    async with _transaction() as conn:
+        await conn.execute("DELETE FROM message_archive WHERE conversation_id = ?", (conversation_id,))
+        await conn.execute(
+            "DELETE FROM conversations WHERE id = ? AND deleted_at IS NOT NULL",
+            (conversation_id,)
+        )
+
+async def get_purgeable_user_ids(limit: int) -> List[str]:
+    """Get deleted users whose conversations have all been purged"""
+    rows = await _fetchall(
+        """SELECT u.id FROM users u
+           WHERE u.deleted_at IS NOT NULL
+           AND NOT EXISTS (SELECT 1 FROM conversations c WHERE c.user_id = u.id)
+           ORDER BY u.deleted_at ASC
+           LIMIT ?""",
+        (limit,)
+    )
+    return [row['id'] for row in rows]
+
+async def purge_memory_batch(user_id: str, batch_size: int) -> int:
+    """Delete up to batch_size memories of a user, returns rows deleted"""
+    return await _execute(
+        """DELETE FROM user_memories WHERE rowid IN
+           (SELECT rowid FROM user_memories WHERE user_id = ? LIMIT ?)""",
+        (user_id, batch_size)
+    )
+
+async def purge_user_row(user_id: str):
+    """Delete a deleted user once their conversations and memories are gone"""
+    await _execute("DELETE FROM users WHERE id = ? AND deleted_at IS NOT NULL", (user_id,))
+
+# ============ MEMORY FUNCTIONS ============
+
+async def _write_memory_signature(conn: aiosqlite.Connection, memory_id: str, user_id: str, signature: bytes):
+    """Replace a memory's LSH bucket rows"""
+    await conn.execute("DELETE FROM memory_lsh_buckets WHERE memory_id = ?", (memory_id,))
+    await conn.executemany(
+        """INSERT INTO memory_lsh_buckets (user_id, band, bucket, memory_id)
+           VALUES (?, ?, ?, ?)""",
+        [(user_id, band, bucket, memory_id) for band, bucket in band_buckets(signature)]
+    )
+
+async def _find_duplicate_memory(conn: aiosqlite.Connection, user_id: str, content: str, signature: bytes) -> Optional[Dict[str, Any]]:
+    """Near-duplicate of content among the memories sharing an LSH bucket with it"""
+    buckets = band_buckets(signature)
+    async with conn.execute(
+        f"""SELECT DISTINCT m.id, m.content FROM memory_lsh_buckets b
+            JOIN user_memories m ON m.id = b.memory_id
+            WHERE b.user_id = ? AND (b.band, b.bucket) IN ({', '.join(['(?, ?)'] * len(buckets))})""",
+        (user_id, *[value for pair in buckets for value in pair])
+    ) as cursor:
+        candidates = [dict(row) for row in await cursor.fetchall()]
+    return closest_duplicate(content, candidates)
+
+async def create_memory(user_id: str, content: str, category: str = 'general') -> Dict[str, Any]:
+    """
+    Create a new user memory unless a near-duplicate already exists.
+
+    Returns {'id', 'content', 'status'}; status is 'created', 'merged' (the
+    existing memory took the new, more complete wording) or 'duplicate'.
+    """
+    signature = minhash_signature(content)
+    async with _transaction() as conn:
+        duplicate = await _find_duplicate_memory(conn, user_id, content, signature)
+        if duplicate:
+            merged = merge_memory_content(duplicate['content'], content)
+            if merged is None:
+                return {'id': duplicate['id'], 'content': duplicate['content'], 'status': 'duplicate'}
+            await conn.execute(
+                """UPDATE user_memories
+                   SET content = ?, minhash = ?, updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now')
+                   WHERE id = ?""",
+                (merged, signature, duplicate['id'])
+            )
+            await _write_memory_signature(conn, duplicate['id'], user_id, signature)
+            return {'id': duplicate['id'], 'content': merged, 'status': 'merged'}
+
+        memory_id = str(uuid.uuid4())
+        await conn.execute(
+            """INSERT INTO user_memories (id, user_id, content, category, minhash)
+               VALUES (?, ?, ?, ?, ?)""",
+            (memory_id, user_id, content, category, signature)
+        )
+        await _write_memory_signature(conn, memory_id, user_id, signature)
+    return {'id': memory_id, 'content': content, 'status': 'created'}
+
+async def get_user_memories(user_id: str) -> List[Dict[str, Any]]:
+    """Get all memories for a user"""
+    return await _fetchall(
+        """SELECT id, user_id, content, category, created_at, updated_at
+           FROM user_memories
+           WHERE user_id = ?
+           ORDER BY updated_at DESC""",
+        (user_id,)
+    )
+
+async def update_memory(memory_id: str, content: str):
+    """Update a memory"""
+    signature = minhash_signature(content)
+    async with _transaction() as conn:
+        async with conn.execute("SELECT user_id FROM user_memories WHERE id = ?", (memory_id,)) as cursor:
+            row = await cursor.fetchone()
+        if not row:
+            return
+        await conn.execute(
+            """UPDATE user_memories
+               SET content = ?, minhash = ?, updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now')
+               WHERE id = ?""",
+            (content, signature, memory_id)
+        )
+        await _write_memory_signature(conn, memory_id, row['user_id'], signature)
+
+async def delete_memory(memory_id: str):
+    """Delete a memory"""
+    await _execute("DELETE FROM user_memories WHERE id = ?", (memory_id,))
+
+async def backfill_memory_signatures(batch_size: int) -> int:
+    """Sign up to batch_size memories written before deduplication, returns rows signed"""
+    async with _transaction() as conn:
+        async with conn.execute(
+            "SELECT id, user_id, content FROM user_memories WHERE minhash IS NULL LIMIT ?",
+            (batch_size,)
+        ) as cursor:
+            rows = await cursor.fetchall()
+        for row in rows:
+            signature = minhash_signature(row['content'])
+            await conn.execute("UPDATE user_memories SET minhash = ? WHERE id = ?", (signature, row['id']))
+            await _write_memory_signature(conn, row['id'], row['user_id'], signature)
+    return len(rows)
+
+async def save_conversation_enrichment(
+    conversation_id: str,
+    watermark: int,
+    summary: Optional[str],
+    title: Optional[str] = None,
+    old_title: Optional[str] = None
+):
+    """
+    Store a post-turn enrichment pass: the first `watermark` messages are
+    processed, summary replaces the rolling summary when given, and title
+    replaces the title only if it is still old_title (the user may have renamed it).
+    A watermark past message_count is from a pass that read messages cleared since.
+    """
+    await _execute(
+        """UPDATE conversations
+           SET memory_watermark = CASE WHEN ? <= message_count
+               THEN MAX(memory_watermark, ?) ELSE memory_watermark END,
+           summary = COALESCE(?, summary),
+           title = CASE WHEN ? IS NOT NULL AND title = ? THEN ? ELSE title END
+           WHERE id = ?""",
+        (watermark, watermark, summary, title, old_title, title, conversation_id)
+    )
+
+# ============ SETTINGS FUNCTIONS ============
+
+async def get_user_settings(user_id: str) -> Optional[Dict[str, Any]]:
+    """Get user settings"""
+    result = await _fetchone("SELECT * FROM user_settings WHERE user_id = ?", (user_id,))
+
+    # Create default settings if not exists
+    if not result:
+        await _execute(
+            """INSERT OR IGNORE INTO user_settings (user_id, memory_enabled)
+               VALUES (?, 0)""",
+            (user_id,)
+        )
+        return {'user_id': user_id, 'memory_enabled': False, 'theme': 'dark'}
+
+    return result
+
+async def update_user_settings(user_id: str, settings: Dict[str, Any]):
+    """Update user settings"""
+    if not settings:
+        return
+
+    # Ensure settings exist first
+    await get_user_settings(user_id)
+
+    set_clause = ", ".join([f"{key} = ?" for key in settings.keys()])
+    query = f"UPDATE user_settings SET {set_clause}, updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE user_id = ?"
+    await _execute(query, (*settings.values(), user_id))
@@ -0,0 +1,79 @@
+"""
+Storage backend selection
+
+Every backend module implements the functions in STORAGE_INTERFACE with the
+same signatures and row shapes. Pick one with STORAGE_BACKEND:
+  mysql  - utilities/db_utils.py (aiomysql, default)
+  sqlite - utilities/sqlite_utils.py (aiosqlite, embedded, WAL mode)
+"""
+import os
+import time
+import inspect
+import functools
+import importlib
+
+from utilities.metrics_utils import DB_QUERY_SECONDS, DB_QUERY_ERRORS
+
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'mysql').lower()
+
+BACKEND_MODULES = {
+    'mysql': 'utilities.db_utils',
+    'sqlite': 'utilities.sqlite_utils',
+}
+
+STORAGE_INTERFACE = (
+    # Lifecycle
+    'init_db_pool', 'close_db_pool',
+    # Users
+    'create_user', 'get_user', 'update_user', 'mark_user_deleted',
+    # Conversations
+    'create_conversation', 'get_conversation', 'get_conversation_version', 'get_user_conversations',
+    'update_conversation', 'delete_conversation', 'save_conversation_enrichment',
+    # Messages
+    'add_message', 'get_conversation_messages', 'get_conversation_messages_since', 'get_last_messages',
+    'delete_conversation_messages',
+    # Archive
+    'archive_conversation', 'promote_conversation', 'archive_idle_conversations',
+    # Search and export
+    'search_user_messages', 'iter_user_export',
+    # Purge
+    'get_deleted_conversation_ids', 'count_pending_purges',
+    'purge_message_batch', 'purge_conversation_row',
+    'get_purgeable_user_ids', 'purge_memory_batch', 'purge_user_row',
+    # Memories
+    'create_memory', 'get_user_memories', 'update_memory', 'delete_memory',
+    'backfill_memory_signatures',
+    # Settings
+    'get_user_settings', 'update_user_settings',
+)
+
+if STORAGE_BACKEND not in BACKEND_MODULES:
+    raise ValueError(f"Unknown STORAGE_BACKEND '{STORAGE_BACKEND}', expected one of {sorted(BACKEND_MODULES)}")
+
+backend = importlib.import_module(BACKEND_MODULES[STORAGE_BACKEND])
+
+_missing = [name for name in STORAGE_INTERFACE if not hasattr(backend, name)]
+if _missing:
+    raise ImportError(f"Storage backend '{STORAGE_BACKEND}' is missing: {', '.join(_missing)}")
+
+def _timed(name, func):
+    """Record latency and failures of a storage coroutine under its function name"""
+    if not inspect.iscoroutinefunction(func):
+        # Async generators (iter_user_export) are consumed by the caller at its own pace
+        return func
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            DB_QUERY_ERRORS.inc(backend=STORAGE_BACKEND, function=name)
+            raise
+        finally:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - start, backend=STORAGE_BACKEND, function=name)
+    return wrapper
+
+# Re-export the selected backend's implementation of the interface
+globals().update({name: _timed(name, getattr(backend, name)) for name in STORAGE_INTERFACE})
+__all__ = list(STORAGE_INTERFACE)
@@ -0,0 +1,132 @@
+"""
+Local extractive conversation titles (RAKE keyword scoring over the opening messages)
+"""
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+from utilities.search_utils import STOPWORDS
+from utilities.minhash_utils import stem
+
+# Always ask the model for titles instead of trying the local titler first
+TITLE_QUALITY = os.getenv('TITLE_QUALITY', 'false').lower() == 'true'
+# Local titles scoring below this fall back to the model
+TITLE_MIN_SCORE = float(os.getenv('TITLE_MIN_SCORE', '4.0'))
+
+PREVIEW_MESSAGES = 4
+PREVIEW_CHARS = 300
+MIN_TITLE_WORDS = 3
+MAX_TITLE_WORDS = 6
+MAX_PHRASE_WORDS = 4
+
+# Chat filler on top of the search stopwords; these never make a good title word
+CHAT_STOPWORDS = frozenset("""
+hi hello hey hiya yo please pls thanks thank thx ok okay yes yeah yep no nope
+sure can could would should tell want wanna need know like just really also
+get got let lets help something anything everything thing things think going
+go make give show much many well good great nice cool hmm lol haha oh ah um
+maybe actually still even today now right way kind sort bit lot little new
+one ones say said see look talk chat ask question answer explain describe
+write give us you'll i'll i'd i'm it's that's what's let's there's can't
+don't isn't won't hasn't haven't didn't doesn't without instead keep keeps
+anymore lately tomorrow yesterday day days week weeks month months year years
+two three four five six seven eight nine ten better best stop feel idk last
+first next
+""".split())
+TITLE_STOPWORDS = STOPWORDS | CHAT_STOPWORDS
+
+# Short words left lowercase inside a title
+_MINOR_WORDS = frozenset("a an and as at but by for in of on or the to vs via with".split())
+_TOKEN_RE = re.compile(r"[A-Za-z0-9][\w'-]*|[^\w\s]")
+_MARKUP_RE = re.compile(r"[*_`#>~]+|https?://\S+")
+
+def _phrases(text: str) -> List[List[str]]:
+    """Candidate phrases: runs of content words split at stopwords and punctuation"""
+    phrases, current = [], []
+    for token in _TOKEN_RE.findall(_MARKUP_RE.sub(' ', text)):
+        word = token.lower()
+        if not token[0].isalnum() or word in TITLE_STOPWORDS or word.isdigit() or len(word) < 2:
+            if current:
+                phrases.append(current)
+            current = []
+            continue
+        current.append(token)
+    if current:
+        phrases.append(current)
+    return [phrase[:MAX_PHRASE_WORDS] for phrase in phrases]
+
+def _title_case(words: List[str]) -> str:
+    cased = []
+    for i, word in enumerate(words):
+        if word.isupper() and len(word) > 1:
+            cased.append(word)  # Keep acronyms
+        elif i and word.lower() in _MINOR_WORDS:
+            cased.append(word.lower())
+        else:
+            cased.append(word[0].upper() + word[1:])
+    return " ".join(cased)
+
+def extractive_title(messages: List[Dict]) -> Tuple[str, float]:
+    """
+    Title the conversation from its opening messages without a model call.
+
+    Phrases come from the user's messages (the assistant's replies only
+    confirm which words matter). Returns (title, score); the score is the
+    RAKE score of the best phrase, low when there is little to go on.
+    """
+    # The persona's greeting says nothing about what the user came for
+    first_user = next((i for i, msg in enumerate(messages) if msg.get('role') == 'user'), 0)
+    preview = [msg for msg in messages[first_user:first_user + PREVIEW_MESSAGES] if msg.get('content')]
+    user_phrases = [
+        phrase for msg in preview if msg.get('role') == 'user'
+        for phrase in _phrases(msg['content'][:PREVIEW_CHARS])
+    ]
+    other_phrases = [
+        phrase for msg in preview if msg.get('role') != 'user'
+        for phrase in _phrases(msg['content'][:PREVIEW_CHARS])
+    ]
+    candidates = user_phrases or other_phrases
+    if not candidates:
+        return "", 0.0
+
+    # RAKE word scores: degree / frequency, with assistant text weighted half
+    frequency: Counter = Counter()
+    degree: Dict[str, float] = defaultdict(float)
+    for weight, phrases in ((1.0, user_phrases), (0.5, other_phrases)):
+        for phrase in phrases:
+            for token in phrase:
+                word = token.lower()
+                frequency[word] += weight
+                degree[word] += weight * len(phrase)
+    # Words the reply picks up again are the topic, not incidental detail
+    confirmed = {stem(token.lower()) for phrase in other_phrases for token in phrase}
+
+    def word_score(word: str) -> float:
+        score = degree[word] / frequency[word]
+        return score * 2 if user_phrases and stem(word) in confirmed else score
+
+    scored: Dict[str, Tuple[float, int, List[str]]] = {}
+    for position, phrase in enumerate(candidates):
+        key = " ".join(token.lower() for token in phrase)
+        if key not in scored:
+            scored[key] = (sum(word_score(token.lower()) for token in phrase), position, phrase)
+
+    ranked = sorted(scored.values(), key=lambda item: (-item[0], item[1]))
+    chosen, used, count = [], set(), 0
+    for score, position, phrase in ranked:
+        words = [token for token in phrase if token.lower() not in used]
+        if not words or count + len(words) > MAX_TITLE_WORDS:
+            continue
+        chosen.append((position, words))
+        used.update(token.lower() for token in words)
+        count += len(words)
+        if count >= MIN_TITLE_WORDS:
+            break
+
+    # Read in the order the phrases appeared
+    words = [token for _, phrase_words in sorted(chosen) for token in phrase_words]
+    if len(words) < 2:
+        # A single word is a label, not a title
+        return _title_case(words), 0.0
+    return _title_case(words), round(ranked[0][0], 2)
@@ -225,31 +225,9 @@ const Chat = () => {
 
     setIsSaving(true);
     try {
-      // Generate AI title ONLY for NEW conversations (when there's no conversation ID yet)
-      // For existing conversations, reuse the existing title to avoid API spam
-      let title = conversationTitle || 'New Chat';
-      
-      // Only generate a new title if this is a new conversation (no ID yet)
-      if (!currentConversationId && userMessages.length > 0) {
-        try {
-          // Filter out the initial bot greeting - only include messages after first user message
-          const firstUserIndex = msgsToSave.findIndex(m => m.role === 'user');
-          const relevantMessages = firstUserIndex >= 0 ? msgsToSave.slice(firstUserIndex) : msgsToSave;
-          
-          // Use AI to generate a meaningful title from the user's conversation
-          title = await api.generateTitle(relevantMessages.map(m => ({ role: m.role, content: m.content })));
-          
-          // Store title in state for sharing
-          setConversationTitle(title);
-        } catch (error) {
-          console.error('Failed to generate title:', error);
-          // Fallback: Create a short summary from first user message
-          const firstUserMessage = userMessages[0]?.content || 'New Chat';
-          const words = firstUserMessage.trim().split(' ');
-          title = words.length <= 6 ? firstUserMessage.slice(0, 50) : words.slice(0, 6).join(' ') + '...';
-          setConversationTitle(title);
-        }
-      }
+      // New conversations start as 'New Chat'; the server names them after the
+      // first exchange, in the same background pass that extracts memories
+      const title = conversationTitle || 'New Chat';
       
       const conversationData: any = {
         personaName,
@@ -275,6 +253,8 @@ const Chat = () => {
       }
 
       if (currentConversationId) {
+        // Don't overwrite the title the server generated in the background
+        if (title === 'New Chat') delete conversationData.title;
         await updateConversation(currentConversationId, user.uid, conversationData);
       } else {
         const newId = await saveConversation(user.uid, conversationData);
@@ -315,6 +295,7 @@ const Chat = () => {
         persona: personaName,
         message: textToSend,
         history, // Send all previous messages (user + assistant)
+        user_id: user?.uid, // Server adds the stored memories relevant to this turn
       });
 
       const assistantMessage: Message = {
@@ -373,6 +354,7 @@ const Chat = () => {
         persona: personaName,
         message: previousUserMessage.content,
         history,
+        user_id: user?.uid,
       });
 
       const newMessage: Message = {
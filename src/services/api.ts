@@ -15,6 +15,7 @@ export interface PersonaDetail {
   instructions: string;
   summary: string;
   category: string;
+  version: number;
 }
 
 export interface ModelInfo {
@@ -32,6 +33,7 @@ export interface ChatRequest {
   model?: string;
   temperature?: number;
   user_memories?: string[];
+  user_id?: string;
 }
 
 export interface ChatResponse {
@@ -57,8 +59,13 @@ export const api = {
     return response.json();
   },
 
-  async getPersonas(): Promise<PersonaSummary[]> {
-    const response = await fetch(`${API_BASE_URL}/personas`);
+  async getPersonas(params: { q?: string; category?: string; cursor?: string; limit?: number } = {}): Promise<PersonaSummary[]> {
+    const query = new URLSearchParams();
+    Object.entries(params).forEach(([key, value]) => {
+      if (value !== undefined && value !== '') query.set(key, String(value));
+    });
+    const suffix = query.toString() ? `?${query}` : '';
+    const response = await fetch(`${API_BASE_URL}/personas${suffix}`);
     if (!response.ok) {
       throw new Error(`Failed to fetch personas: ${response.status}`);
     }
@@ -232,23 +239,6 @@ export const api = {
     return response.json();
   },
 
-  async extractMemories(
-    messages: Array<{ role: string; content: string }>,
-    existingMemories: string[]
-  ): Promise<{ memories: string[] }> {
-    const response = await fetch(`${API_BASE_URL}/extract-memories`, {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-      },
-      body: JSON.stringify({ messages, existing_memories: existingMemories }),
-    });
-    if (!response.ok) {
-      throw new Error(`Failed to extract memories: ${response.status}`);
-    }
-    return response.json();
-  },
-
   // ============ USER MANAGEMENT ============
   async createUser(uid: string, email: string, displayName: string, photoURL?: string): Promise<{ success: boolean; message: string }> {
     const response = await fetch(`${API_BASE_URL}/user/create`, {
@@ -334,7 +324,7 @@ export const api = {
   },
 
   // ============ MEMORY MANAGEMENT ============
-  async createMemory(userId: string, content: string, category: string = 'general'): Promise<{ success: boolean; memoryId: string }> {
+  async createMemory(userId: string, content: string, category: string = 'general'): Promise<{ success: boolean; memoryId: string; status: 'created' | 'merged' | 'duplicate' }> {
     const response = await fetch(`${API_BASE_URL}/memory/create`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },